@@ -0,0 +1,909 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for trf. Each benchmark uses a throwaway trf home in a temporary
+directory so the real database is never touched. Run, e.g.,
+
+    python benchmarks.py forecast
+
+or without arguments to run them all.
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def load_trf():
+    """
+    Import trf.trf with a temporary home, open its database and return the
+    module.
+    """
+    os.environ['TRFHOME'] = tempfile.mkdtemp(prefix='trf-bench-')
+    argv = sys.argv
+    sys.argv = sys.argv[:1]
+    try:
+        from trf import trf
+        trf.startup()
+    finally:
+        sys.argv = argv
+    return trf
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def make_trackers(trf, n: int, num_completions: int = 12, first_id: int = 1):
+    random.seed(n)
+    trackers = []
+    start = datetime(2024, 1, 1)
+    for doc_id in range(first_id, first_id + n):
+        tracker = trf.Tracker(f"tracker {doc_id}", doc_id)
+        dt = start + timedelta(minutes=random.randint(0, 60*24*30))
+        completions = []
+        for _ in range(random.randint(0, num_completions)):
+            dt += timedelta(days=random.randint(3, 20), minutes=random.randint(0, 60*24))
+            completions.append((dt, timedelta(hours=random.choice([0, 0, 0, -6, 6]))))
+        tracker.record_completions(completions)
+        trackers.append(tracker)
+    return trackers
+
+
+def bench_forecast(trf):
+    """
+    TrackerManager.refresh_info: compute_info() per tracker versus the batch
+    engine in trf/forecast.py, with the time the engine spends packing the
+    forecast windows and computing the statistics shown separately.
+    """
+    from trf.forecast import refresh_forecasts, pack_windows, batch_statistics, load_numpy
+    if load_numpy() is None:
+        print("forecast: numpy is not installed, skipping")
+        return
+    for n in (10_000, 100_000):
+        trackers = make_trackers(trf, n)
+        loop, _ = timed(lambda: [t.compute_info() for t in trackers])
+        batch, _ = timed(refresh_forecasts, trackers)
+        pack, packed = timed(pack_windows, trackers)
+        stats, _ = timed(batch_statistics, *packed)
+        print(f"forecast {n:>7} trackers: compute_info {loop:7.3f}s, batch {batch:7.3f}s "
+              f"(pack {pack:.3f}s, statistics {stats:.3f}s), speedup {loop/batch:4.1f}x")
+
+
+def populate(trf, n: int):
+    """
+    Add n trackers with random histories to the benchmark database.
+    """
+    tm = trf.tracker_manager
+    with tm.batch():
+        for tracker in make_trackers(trf, n):
+            tm.update_tracker(tracker.doc_id, tracker)
+    return tm
+
+
+def bench_render(trf, n: int = 100_000, flips: int = 50):
+    """
+    Frame time of TrackerManager.list_trackers for page flips, first with the
+    row cache empty and then revisiting the same pages.
+    """
+    tm = populate(trf, n)
+    for sort_by in ('next', 'subject'):
+        tm.sort_by = sort_by
+        for label in ('cold', 'cached'):
+            times = []
+            for page in range(flips):
+                tm.active_page = page * 7
+                elapsed, _ = timed(tm.list_trackers)
+                times.append(elapsed)
+            times.sort()
+            print(f"render {n:>7} trackers, sort {sort_by:<7} {label:<6}: "
+                  f"median {1000*times[len(times)//2]:6.2f}ms, max {1000*times[-1]:6.2f}ms per page")
+
+
+def bench_eta(trf, n: int = 100_000, changes: int = 10):
+    """
+    Changing η from the settings dialog with n trackers: saving the setting,
+    and so the number of forecasts recomputed, and then listing the page
+    with the new bounds.
+    """
+    from trf.core import Tracker
+    tm = populate(trf, n)
+    tm.list_trackers()
+    computed = []
+    compute_info = Tracker.compute_info
+
+    def counted(tracker):
+        computed.append(tracker.doc_id)
+        return compute_info(tracker)
+
+    Tracker.compute_info = counted
+    saves, lists = [], []
+    try:
+        for i in range(changes):
+            saves.append(timed(tm.update_settings, {'η': 1 + i % 3})[0])
+            lists.append(timed(tm.list_trackers)[0])
+    finally:
+        Tracker.compute_info = compute_info
+    saves.sort()
+    lists.sort()
+    print(f"eta {n:>7} trackers: save median {1000*saves[len(saves)//2]:.2f}ms, "
+          f"list median {1000*lists[len(lists)//2]:.2f}ms, {len(computed)} forecasts recomputed "
+          f"for {changes} changes")
+
+
+def bench_due(trf, n: int = 100_000, ticks: int = 1000):
+    """
+    The due states of n trackers: building them from the stored forecasts,
+    the memory they use, a tick with nothing due and the cost per crossing
+    as the clock moves forward a day at a time.
+    """
+    from trf.due import DueStates
+    tm = populate(trf, n)
+    start = datetime(2024, 1, 1)
+    eta = tm.settings['η']
+    due = DueStates()
+    elapsed, _ = timed(due.build, tm.forecasts.items(), eta, start)
+    memory = (sys.getsizeof(due._bounds) + sys.getsizeof(due._states) + sys.getsizeof(due._heap)
+              + sum(sys.getsizeof(key) for key in due._heap))
+    print(f"due {n:>7} trackers: build {elapsed:.3f}s, {memory / len(due):.0f} bytes per tracker")
+    idle = timed(lambda: [due.advance(start) for _ in range(ticks)])[0]
+    print(f"due idle tick: {1e6 * idle / ticks:.2f}us")
+    now, crossings, total = start, 0, 0.0
+    for day in range(120):
+        now += timedelta(days=1)
+        elapsed, changes = timed(due.advance, now)
+        crossings += len(changes)
+        total += elapsed
+    print(f"due {crossings} crossings over 120 days: {1e6 * total / max(crossings, 1):.2f}us per crossing, "
+          f"counts {due.summary()}")
+
+
+def bench_agenda(trf, n: int = 100_000, queries: int = 50):
+    """
+    The trackers that may be due within 72 hours of random starts among n
+    trackers: the time to the first doc_id and to all k of them.
+    """
+    tm = populate(trf, n)
+    random.seed(n)
+    eta = tm.settings['η']
+    firsts, totals, found = [], [], 0
+    for _ in range(queries):
+        start = datetime(2024, 1, 1) + timedelta(hours=random.randint(0, 24 * 180))
+        tm.connection.cacheMinimize()
+        begin = time.perf_counter()
+        doc_ids = tm.agenda_trackers(start, start + timedelta(hours=72))
+        first = next(doc_ids, None)
+        firsts.append(time.perf_counter() - begin)
+        k = (first is not None) + sum(1 for _ in doc_ids)
+        totals.append(time.perf_counter() - begin)
+        found += k
+    firsts.sort()
+    totals.sort()
+    print(f"agenda {n:>7} trackers, 72h, eta {eta}: first median {1000*firsts[len(firsts)//2]:.2f}ms, "
+          f"all median {1000*totals[len(totals)//2]:.2f}ms for {found // queries} trackers on average")
+    # built when the interface starts
+    tm.due_states()
+    elapsed, text = timed(tm.format_agenda, start, start + timedelta(hours=72))
+    print(f"agenda view: {1000*elapsed:.1f}ms for {text.count(chr(10)) - 1} rows")
+
+
+def bench_backup(trf, n: int = 20_000, days: int = 28, per_day: int = 50):
+    """
+    Daily backup I/O over several weeks of use: full archives every day, as
+    before, versus the daily maintenance, see backup_and_pack(), which
+    packs the database when a full backup is due and otherwise makes an
+    incremental archive. A few completions are recorded each simulated day.
+    Since the simulated days pass in moments, everything but the current
+    revisions is discarded when packing, as much as a pack ever frees.
+    """
+    from trf.backup import open_snapshot, write_zip, read_manifest, backup_names, full_backup_due
+    tm = populate(trf, n)
+    db_file = os.path.join(trf.trf_home, 'trf.fs')
+    backup_dir = os.path.join(trf.trf_home, 'backup')
+    scratch = tempfile.mkdtemp(prefix='trf-bench-full-')
+    start = datetime(2024, 6, 1, 12)
+    full = {'read': 0, 'written': 0}
+    incremental = {'read': 0, 'written': 0}
+    packed = {'read': 0, 'written': 0}
+    kinds = []
+    for day in range(days):
+        dt = start + timedelta(days=day)
+        with tm.batch():
+            for doc_id in random.sample(range(1, n + 1), per_day):
+                tm.record_completion(doc_id, (dt, timedelta(0)))
+        os.utime(db_file, (dt.timestamp(), dt.timestamp()))
+        name = dt.strftime('%y%m%d')
+
+        f, size = open_snapshot(db_file, trf.storage)
+        with f:
+            full['read'] += write_zip(os.path.join(scratch, f"{name}.zip"), [('trf.fs', f, size)], 'stored')
+        full['written'] += os.path.getsize(os.path.join(scratch, f"{name}.zip"))
+
+        # as backup_and_pack(), keeping the simulated day as the time
+        # trf.fs was modified
+        if full_backup_due(trf.trf_home, 7):
+            before, after = trf.pack_database(trf.db, trf.trf_home, 0, trf.logger)
+            packed['read'] += before
+            packed['written'] += after
+            os.utime(db_file, (dt.timestamp(), dt.timestamp()))
+        trf.rotate_backups(trf.trf_home, trf.logger, trf.storage, 'deflate', 6, 7)
+        backup_zip = os.path.join(backup_dir, f"{name}.zip")
+        manifest = read_manifest(backup_zip)
+        kinds.append(manifest['kind'][0])
+        incremental['read'] += manifest['end'] - manifest['start']
+        incremental['written'] += os.path.getsize(backup_zip)
+    retained = sum(os.path.getsize(os.path.join(backup_dir, f"{name}.zip")) for name in backup_names(backup_dir))
+    print(f"backup {days} days, trf.fs {os.path.getsize(db_file)} bytes, archives {''.join(kinds)} (f full, d delta)")
+    maintenance = {key: incremental[key] + packed[key] for key in incremental}
+    for label, io in (('full daily', full), ('incremental', incremental), ('pack', packed),
+                      ('maintenance', maintenance)):
+        print(f"backup {label:<11}: read {io['read']/days/1e6:8.3f}MB, written {io['written']/days/1e6:8.3f}MB per day")
+    print(f"backup retained: {retained/1e6:.3f}MB in {len(backup_names(backup_dir))} archives")
+
+
+def run_in_terminal(args: list) -> str:
+    """
+    Run args with a pseudo terminal as stdin and stdout, since the
+    interface needs one to render, and return everything it printed.
+    """
+    import pty
+    import subprocess
+    master, slave = pty.openpty()
+    proc = subprocess.Popen(args, stdin=slave, stdout=slave, stderr=slave)
+    os.close(slave)
+    output = []
+    while True:
+        try:
+            chunk = os.read(master, 1 << 16)
+        except OSError:
+            break
+        if not chunk:
+            break
+        output.append(chunk)
+    proc.wait()
+    os.close(master)
+    return b''.join(output).decode(errors='replace')
+
+
+def bench_startup(trf, runs: int = 5, budget: float = 0.5):
+    """
+    Time to first frame of 'trf --startup-profile' in a fresh process, with
+    the median time of each startup step, checked against a budget in
+    seconds.
+    """
+    home = tempfile.mkdtemp(prefix='trf-bench-startup-')
+    steps = {}
+    for _ in range(runs):
+        output = run_in_terminal([sys.executable, '-m', 'trf', '--startup-profile', home])
+        for line in output.splitlines():
+            parts = line.rsplit(None, 2)
+            if line.startswith('startup ') and len(parts) == 3 and parts[0] != 'startup step':
+                steps.setdefault(parts[0][len('startup '):].strip(), []).append(float(parts[1]))
+    if 'first frame' not in steps:
+        print("startup: no frame was rendered")
+        return
+    for label, times in steps.items():
+        times.sort()
+        print(f"startup {label:<18}: median {times[len(times)//2]:7.1f}ms")
+    total = 0
+    for times in steps.values():
+        total += times[len(times)//2]
+    status = "within" if total <= 1000 * budget else "OVER"
+    print(f"startup time to first frame: {total:.1f}ms, {status} the {1000*budget:.0f}ms budget")
+
+
+def bench_cli(trf, n: int = 10_000, runs: int = 10):
+    """
+    Per invocation latency of the headless commands in trf/cli.py on a
+    database of n trackers, and a check that none of them imports
+    prompt_toolkit.
+    """
+    import subprocess
+    from trf.core import TrackerStore
+    home = tempfile.mkdtemp(prefix='trf-bench-cli-')
+    store = TrackerStore.open(os.path.join(home, 'trf.fs'))
+    with store.batch():
+        for tracker in make_trackers(trf, n):
+            store.update_tracker(tracker.doc_id, tracker)
+        store.root['next_id'] = n + 1
+    store.close()
+    commands = {
+        'show': ['show', '17'],
+        'due': ['due', '--within', '3d'],
+        'record': ['record', 'tracker 42', 'now'],
+        'pack': ['pack'],
+    }
+    for label, args in commands.items():
+        command = [sys.executable, '-m', 'trf', '--home', home] + args
+        times = []
+        for _ in range(runs):
+            elapsed, result = timed(subprocess.run, command, capture_output=True, text=True)
+            if result.returncode:
+                print(f"cli {label}: failed\n{result.stderr}")
+                return
+            times.append(elapsed)
+        times.sort()
+        imports = subprocess.run([sys.executable, '-X', 'importtime'] + command[1:], capture_output=True, text=True).stderr
+        status = "imports prompt_toolkit" if 'prompt_toolkit' in imports else "no prompt_toolkit"
+        print(f"cli {label:<6} {n:>7} trackers: median {1000*times[len(times)//2]:6.1f}ms, "
+              f"max {1000*times[-1]:6.1f}ms per invocation, {len(result.stdout.splitlines())} lines, {status}")
+
+
+def bench_core(trf, n: int = 1000, threads: int = 4, per_thread: int = 200, runs: int = 5):
+    """
+    Import time of trf.core in a fresh interpreter, checking that it pulls in
+    neither the interface nor the database libraries, and completions
+    recorded from several threads, each with its own TrackerStore.connect().
+    """
+    import subprocess
+    import threading
+    from ZODB.POSException import ConflictError
+    from trf.core import TrackerStore
+    code = "import sys, time; t = time.perf_counter(); import trf.core; print(time.perf_counter() - t, 'prompt_toolkit' in sys.modules, 'ZODB' in sys.modules)"
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        elapsed, ui, zodb = result.stdout.split()
+        times.append(float(elapsed))
+    times.sort()
+    print(f"core import trf.core: median {1000*times[len(times)//2]:6.1f}ms, "
+          f"prompt_toolkit {'imported' if ui == 'True' else 'not imported'}, "
+          f"ZODB {'imported' if zodb == 'True' else 'not imported'}")
+
+    home = tempfile.mkdtemp(prefix='trf-bench-core-')
+    store = TrackerStore.open(os.path.join(home, 'trf.fs'))
+    with store.batch():
+        for tracker in make_trackers(trf, n):
+            store.update_tracker(tracker.doc_id, tracker)
+        store.root['next_id'] = n + 1
+    conflicts = []
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        local = store.connect()
+        retries = 0
+        for i in range(per_thread):
+            doc_id = rng.randint(1, n)
+            dt = datetime(2025, 1, 1) + timedelta(hours=seed * per_thread + i)
+            while True:
+                try:
+                    local.record_completion(doc_id, (dt, timedelta(0)))
+                    break
+                except ConflictError:
+                    local.transaction.abort()
+                    retries += 1
+        # those retried by the store itself, see retried() in trf/core.py
+        conflicts.append(retries + local.num_conflicts)
+        local.close()
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    store.connection.sync()
+    recorded = sum(dt >= datetime(2025, 1, 1) for t in store.trackers.values() for dt, td in t.history)
+    store.close()
+    print(f"core {threads} threads x {per_thread} completions: {elapsed:.3f}s, "
+          f"{threads*per_thread/elapsed:.0f} per second, {sum(conflicts)} conflicts retried, "
+          f"{recorded} of {threads*per_thread} recorded")
+
+
+def bench_history(trf, lengths: tuple = (10, 1_000, 10_000), records: int = 200):
+    """
+    The cost of recording a completion, in order and out of order, for
+    trackers with long histories: the time per record_completion, which
+    updates the forecast window, and the bytes each commit appends to
+    trf.fs.
+    """
+    from trf.core import TrackerStore
+    home = tempfile.mkdtemp(prefix='trf-bench-history-')
+    store = TrackerStore.open(os.path.join(home, 'trf.fs'))
+    start = datetime(2000, 1, 1)
+    for length in lengths:
+        doc_id = store.add_tracker(f"{length} completions")
+        store.trackers[doc_id].record_completions([(start + timedelta(hours=i), timedelta(0)) for i in range(length)])
+        store.update_tracker(doc_id, store.trackers[doc_id])
+        for label in ('in order', 'earlier'):
+            times = []
+            written = 0
+            for i in range(records):
+                if label == 'in order':
+                    dt = start + timedelta(hours=length + i)
+                else:
+                    dt = start + timedelta(hours=random.randint(0, length), minutes=30)
+                elapsed, _ = timed(store.record_completion, doc_id, (dt, timedelta(0)))
+                times.append(elapsed)
+                written += store.last_commit_bytes
+            times.sort()
+            print(f"history {length:>6} completions, {label:<8}: median {1000*times[len(times)//2]:6.3f}ms "
+                  f"per completion, {written/records:8.0f} bytes per commit")
+    store.close()
+
+
+def bench_encoding(trf, n: int = 10_000, lengths: tuple = (12, 120)):
+    """
+    The size of n trackers with the given numbers of completions: the bytes
+    their commit appends to trf.fs and the memory allocated when all of them
+    are loaded again, as when the list view is refreshed.
+    """
+    import tracemalloc
+    from trf.core import TrackerStore
+    start = datetime(2020, 1, 1, 8, 0, 17)
+    for length in lengths:
+        home = tempfile.mkdtemp(prefix='trf-bench-encoding-')
+        db_path = os.path.join(home, 'trf.fs')
+        store = TrackerStore.open(db_path)
+        with store.batch():
+            for doc_id in range(1, n + 1):
+                tracker = trf.Tracker(f"tracker {doc_id}", doc_id)
+                tracker.record_completions([(start + timedelta(days=7*i, minutes=doc_id), timedelta(hours=i % 3))
+                                            for i in range(length)])
+                store.update_tracker(doc_id, tracker)
+        written = store.last_commit_bytes
+        store.close()
+
+        store = TrackerStore.open(db_path)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        last = [tracker.history[-1] for tracker in store.trackers.values()]
+        loaded = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        store.close()
+        print(f"encoding {n} trackers x {length:>3} completions: trf.fs {written/1e6:7.2f}MB, "
+              f"loaded {loaded/1e6:7.2f}MB, {len(last)} trackers")
+
+
+def bench_parse(trf, n: int = 50_000):
+    """
+    Throughput in lines per second of Tracker.parse_completions for the
+    formats trf writes and for free-form dates, which go to dateutil, with
+    the datetimes of the first kind also parsed by dateutil alone, building
+    a parserinfo for each as parse_dt used to, for comparison.
+    """
+    from dateutil.parser import parse, parserinfo
+    Tracker = trf.Tracker
+    random.seed(n)
+    completions = [
+        (datetime(2020, 1, 1) + timedelta(minutes=random.randint(0, 60*24*365*5)),
+         timedelta(minutes=random.choice([0, 0, -360, 360, 1500])))
+        for _ in range(n)]
+    kinds = {
+        'long': [Tracker.format_completion(c) for c in completions],
+        'short': [f"{Tracker.format_dt(dt)}, {Tracker.format_td(td)}" for dt, td in completions],
+        'free-form': [f"{dt.strftime('%b %d %Y %I:%M%p')}, {Tracker.format_td(td)}" for dt, td in completions],
+    }
+    for label, lines in kinds.items():
+        elapsed, (ok, parsed) = timed(Tracker.parse_completions, '\n'.join(lines))
+        status = "all correct" if ok and parsed == completions else "MISMATCH"
+        print(f"parse {label:<9} {n:>7} lines: {n/elapsed:9.0f} lines per second, {status}")
+    elapsed, _ = timed(lambda: [parse(line.split(', ')[0], parserinfo=parserinfo(dayfirst=False, yearfirst=True)) for line in kinds['long']])
+    print(f"parse dateutil  {n:>7} lines: {n/elapsed:9.0f} lines per second (datetimes only)")
+
+
+def run_measured(args: list, seconds: float = None) -> tuple[float, float, int]:
+    """
+    Run args and return the elapsed time, the peak resident memory in MB
+    and the exit status. With seconds, the process is killed after that
+    long.
+    """
+    import signal
+    import subprocess
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if seconds is not None:
+        time.sleep(seconds)
+        proc.send_signal(signal.SIGKILL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = status
+    return time.perf_counter() - start, usage.ru_maxrss / 1024, status
+
+
+def bench_transfer(trf, sizes: tuple = (10_000, 100_000), per_tracker: int = 10):
+    """
+    'trf import' and 'trf export' of trackers with per_tracker completions
+    each, with the peak memory of each command, and an import that is
+    killed part way through and then run again to resume it.
+    """
+    import json
+    for n in sizes:
+        home = tempfile.mkdtemp(prefix='trf-bench-transfer-')
+        source = os.path.join(home, 'source.jsonl')
+        start = datetime(2020, 1, 1)
+        with open(source, 'w') as f:
+            for doc_id in range(1, n + 1):
+                history = [[(start + timedelta(days=7*i + doc_id % 5)).isoformat(), 0] for i in range(per_tracker)]
+                f.write(json.dumps({'id': doc_id, 'name': f"tracker {doc_id}", 'created': start.isoformat(),
+                                    'modified': start.isoformat(), 'history': history}) + '\n')
+        trf_cmd = [sys.executable, '-m', 'trf', '--home', home]
+        from trf.core import TrackerStore
+        TrackerStore.open(os.path.join(home, 'trf.fs')).close()
+        completions = n * per_tracker
+        import_elapsed, memory, _ = run_measured(trf_cmd + ['import', source])
+        print(f"transfer import {completions:>8} completions: {import_elapsed:6.2f}s, {completions/import_elapsed:8.0f} per second, peak {memory:6.1f}MB")
+        for fmt in ('jsonl', 'csv'):
+            target = os.path.join(home, f"export.{fmt}")
+            elapsed, memory, _ = run_measured(trf_cmd + ['export', target])
+            with open(target) as f:
+                records = sum(1 for _ in f) - (fmt == 'csv')
+            status = "complete" if records == n else f"ONLY {records} of {n} trackers"
+            print(f"transfer export {fmt:<5} {completions:>8} completions: {elapsed:6.2f}s, peak {memory:6.1f}MB, {status}")
+
+    # interrupt an import, then resume it
+    home = tempfile.mkdtemp(prefix='trf-bench-resume-')
+    trf_cmd = [sys.executable, '-m', 'trf', '--home', home]
+    TrackerStore.open(os.path.join(home, 'trf.fs')).close()
+    run_measured(trf_cmd + ['import', source], seconds=import_elapsed / 2)
+    store = TrackerStore.open(os.path.join(home, 'trf.fs'), read_only=True)
+    partial = len(store.trackers)
+    store.close()
+    run_measured(trf_cmd + ['import', source])
+    store = TrackerStore.open(os.path.join(home, 'trf.fs'), read_only=True)
+    total = len(store.trackers)
+    names = len({t.name for t in store.trackers.values()})
+    store.close()
+    status = "resumed" if total == names == n else "FAILED"
+    print(f"transfer resume: {partial} of {n} trackers before the kill, {total} after resuming, {status}")
+
+
+def bench_search(trf, n: int = 100_000, queries: int = 200):
+    """
+    The jump prompt: building the name index of n trackers, then the time
+    of each lookup as names are typed a character at a time, and of keeping
+    the index up to date as trackers are added, renamed and deleted.
+    """
+    from trf.search import NameIndex
+    random.seed(n)
+    words = ['fill', 'bird', 'feeders', 'change', 'oil', 'water', 'plants', 'call', 'mom', 'pay',
+             'rent', 'renew', 'passport', 'clean', 'gutters', 'filter', 'replace', 'battery', 'smoke', 'alarm']
+    names = [(doc_id, ' '.join(random.sample(words, random.randint(1, 4))) + f" {doc_id}")
+             for doc_id in range(1, n + 1)]
+    elapsed, index = timed(NameIndex, names)
+    print(f"search build {n:>7} names: {elapsed:.3f}s")
+    typed = []
+    for _, name in random.sample(names, queries // 10):
+        typed.extend(name[:i] for i in range(1, 11))
+    typed.extend(['atery', 'ird fee', 'smoke alarm 9', 'xyzzy'])
+    times = []
+    for query in typed:
+        elapsed, found = timed(index.search, query, 13)
+        times.append(elapsed)
+    times.sort()
+    print(f"search lookup {n:>7} names: median {1000*times[len(times)//2]:.3f}ms, "
+          f"max {1000*times[-1]:.3f}ms over {len(typed)} keystrokes")
+    tm = trf.tracker_manager
+    tm.search_trackers('x')
+    updates = []
+    for i in range(100):
+        updates.append(timed(tm.add_tracker, f"{random.choice(words)} new {i}")[0])
+        doc_id = tm.search_trackers(f"new {i}", 1)[0]
+        updates.append(timed(tm.rename_tracker, doc_id, f"renamed {i}")[0])
+        updates.append(timed(tm.delete_tracker, doc_id)[0])
+    updates.sort()
+    print(f"search update add/rename/delete: median {1000*updates[len(updates)//2]:.2f}ms including the commit")
+
+def bench_scheduler(trf, seconds: float = 3.0, interval: float = 0.1, requests: int = 10_000):
+    """
+    The scheduler on an event loop of its own: the latency of a job run
+    every interval seconds while a worker job compresses data, one job that
+    blocks the loop to show that its overrun is reported, and the redraws
+    for requests invalidate() calls made from the worker thread.
+    """
+    import asyncio
+    import zlib
+    from trf.scheduler import Scheduler
+    redraws = []
+    scheduler = Scheduler(invalidate=lambda: redraws.append(time.perf_counter()))
+
+    def compress():
+        data = random.randbytes(1 << 20)
+        for _ in range(requests):
+            scheduler.invalidate()
+        end = time.perf_counter() + seconds / 2
+        while time.perf_counter() < end:
+            zlib.compress(data, 9)
+
+    async def run():
+        scheduler.start()
+        scheduler.call_every(interval, lambda: None, name='tick')
+        scheduler.call_later(seconds / 3, lambda: time.sleep(0.2), name='blocking')
+        await scheduler.run_in_executor(compress, name='compress')
+        await asyncio.sleep(seconds / 2)
+        scheduler.stop()
+
+    asyncio.run(run())
+    for line in scheduler.report().splitlines():
+        print(f"scheduler {line}")
+
+
+# lists pages of the store in the trf home argv[1] with the cache limited to
+# argv[2] objects, or unlimited if 0, and writes the results to argv[4]
+BROWSE = """
+import json, sys, time
+from trf.core import init_db
+from trf.trf import TrackerManager
+home, cache_size, pages, results = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), sys.argv[4]
+tm = TrackerManager(*init_db(home + '/trf.fs'))
+tm.update_settings({'cache_size': cache_size or 10**9, 'cache_mb': 0 if not cache_size else tm.settings['cache_mb']})
+num_pages = (tm.num_trackers() + 25) // 26
+step = max(num_pages // pages, 1)
+start = time.perf_counter()
+listed = 0
+for first in range(0, num_pages, step):
+    # a jump followed by a few flips forward
+    for page in range(first, min(first + 4, num_pages)):
+        tm.active_page = page
+        tm.list_trackers()
+        listed += 1
+stats = tm.cache_stats()
+stats['ms_per_page'] = 1000 * (time.perf_counter() - start) / listed
+# ru_maxrss would include the memory of the benchmark process at the fork
+try:
+    with open('/proc/self/status') as f:
+        stats['peak_mb'] = next(int(line.split()[1]) for line in f if line.startswith('VmHWM')) / 1024
+except (OSError, StopIteration):
+    import resource
+    stats['peak_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+with open(results, 'w') as f:
+    json.dump(stats, f)
+"""
+
+
+def bench_memory(trf, sizes: tuple = (10_000, 100_000, 300_000), pages: int = 250):
+    """
+    Peak memory of listing pages spread over stores of increasing size with
+    the cache limited by the cache_size setting and, for comparison, with no
+    limit, together with the frame time and the tracker cache hit rate.
+    """
+    import json
+    from trf.core import TrackerStore
+    for n in sizes:
+        home = tempfile.mkdtemp(prefix='trf-bench-memory-')
+        store = TrackerStore.open(os.path.join(home, 'trf.fs'))
+        for first_id in range(1, n + 1, 10_000):
+            with store.batch():
+                for tracker in make_trackers(trf, min(10_000, n + 1 - first_id), first_id=first_id):
+                    store.update_tracker(tracker.doc_id, tracker)
+            store.release()
+        store.root['next_id'] = n + 1
+        store.close()
+        results = os.path.join(home, 'results.json')
+        for label, cache_size in (('limited', 2000), ('unlimited', 0)):
+            run_measured([sys.executable, '-c', BROWSE, home, str(cache_size), str(pages), results])
+            with open(results) as f:
+                stats = json.load(f)
+            print(f"memory {n:>7} trackers, cache {label:<9}: peak {stats['peak_mb']:6.1f}MB, "
+                  f"{stats['trackers']:>7} trackers in memory, {stats['ms_per_page']:5.2f}ms per page, "
+                  f"{stats['hit_rate']:.0%} hits")
+
+
+# records argv[3] completions, at datetimes starting from argv[2] hours
+# after 2025-01-01, on the first 40 trackers of the shared store in the trf
+# home argv[1], adding a tracker after every 10th, and prints the number of
+# conflicts retried. Each pauses for up to 100ms between changes, as clients
+# that are not only writing would.
+WRITER = """
+import random, sys, time
+from datetime import datetime, timedelta
+from trf.core import TrackerStore
+home, first, count = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+store = TrackerStore.open(home + '/trf.fs', server=True)
+for i in range(count):
+    store.record_completion(1 + (first + i) % 40, (datetime(2025, 1, 1) + timedelta(hours=first + i), timedelta(0)))
+    if i % 10 == 9:
+        store.add_tracker(f'added {first + i}')
+    time.sleep(random.uniform(0, 0.1))
+print(store.num_conflicts)
+store.close()
+"""
+
+
+def bench_server(trf, n: int = 1000, writers: int = 4, per_writer: int = 100):
+    """
+    Several processes recording completions on the same few trackers, and
+    adding trackers, at the same time through a local server, see
+    trf/server.py, and a check that no completion is lost, that every
+    added tracker has its own doc_id and that the forecast index matches
+    the merged histories. Then a check that completions recorded on one
+    tracker by two clients at once are merged without a retry and leave
+    the tracker once in each index.
+    """
+    import subprocess
+    from trf.core import TrackerStore
+    from trf.history import encode_dt, encode_td
+    from trf.server import socket_path, is_running
+    home = tempfile.mkdtemp(prefix='trf-bench-server-')
+    store = TrackerStore.open(os.path.join(home, 'trf.fs'))
+    with store.batch():
+        for tracker in make_trackers(trf, n):
+            store.update_tracker(tracker.doc_id, tracker)
+        store.root['next_id'] = n + 1
+    store.close()
+    server = subprocess.Popen([sys.executable, '-m', 'trf.server', home])
+    try:
+        while not is_running(socket_path(home)):
+            time.sleep(0.05)
+        start = time.perf_counter()
+        procs = [subprocess.Popen([sys.executable, '-c', WRITER, home, str(w * per_writer), str(per_writer)],
+                                  stdout=subprocess.PIPE, text=True) for w in range(writers)]
+        conflicts = sum(int(proc.communicate()[0] or 0) for proc in procs)
+        elapsed = time.perf_counter() - start
+        failed = sum(proc.returncode != 0 for proc in procs)
+        store = TrackerStore.open(os.path.join(home, 'trf.fs'))
+        recorded = sum(encode_dt(dt) >= encode_dt(datetime(2025, 1, 1))
+                       for doc_id in range(1, 41) for dt, td in store.trackers[doc_id].history)
+        added = [t for t in store.trackers.values() if t.name.startswith('added ')]
+        names = {t.name for t in added}
+        mismatched = 0
+        for doc_id, (forecast, spread) in store.forecasts.items():
+            info = store.trackers[doc_id].info
+            mismatched += (forecast, spread) != (encode_dt(info['next_expected_completion']), encode_td(info['spread']))
+        ok = (not failed and recorded == writers * per_writer and len(added) == len(names) == writers * (per_writer // 10)
+              and store.root['next_id'] == n + 1 + len(added) and not mismatched)
+        store.close()
+
+        first = TrackerStore.open(os.path.join(home, 'trf.fs'), server=True)
+        second = TrackerStore.open(os.path.join(home, 'trf.fs'), server=True)
+        doc_id = n
+        # the second client's view is from before the first client's commit
+        second.trackers[doc_id].history.latest(1)
+        first.record_completion(doc_id, (datetime(2026, 1, 1), timedelta(0)))
+        try:
+            # in a batch since retried() would otherwise sync before it
+            with second.batch():
+                second.record_completion(doc_id, (datetime(2026, 1, 2), timedelta(0)))
+            merged = second.num_conflicts == 0
+        except Exception:
+            merged = False
+        first.close()
+        second.close()
+        store = TrackerStore.open(os.path.join(home, 'trf.fs'))
+        tracker = store.trackers[doc_id]
+        both = sum(encode_dt(dt) >= encode_dt(datetime(2026, 1, 1)) for dt, td in tracker.history) == 2
+        once = all(sum(index.doc_id(key) == doc_id for key in index.keys()) == 1 for index in store.indexes.values())
+        once = once and sum(d == doc_id for d, _ in store.forecasts.items()) == 1 and not tracker.merged_keys
+        ok = ok and merged and both and once
+        store.close()
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"server {writers} writers x {per_writer} completions: {elapsed:.2f}s, "
+          f"{writers*per_writer/elapsed:.0f} per second, {conflicts} conflicts retried, "
+          f"{recorded} of {writers*per_writer} recorded, {len(added)} trackers added, "
+          f"{mismatched} forecasts mismatched, {failed} writers failed, "
+          f"same tracker {'merged' if merged and both else 'NOT merged'}"
+          f"{'' if once else ' with stale index keys'}: {'ok' if ok else 'FAILED'}")
+
+
+def bench_refresh(trf, n: int = 20_000, rounds: int = 50, idle: int = 10_000):
+    """
+    The list of one client kept up to date with the changes made by another
+    client of a shared database, see TrackerStore.sync(): the cost of
+    looking for changes when there are none, and of taking in a change,
+    which only updates the trackers changed, with a check that the pages of
+    every sort order, the due states and the name index then match those
+    built from scratch.
+    """
+    import subprocess
+    from concurrent.futures import ThreadPoolExecutor
+    from trf.core import TrackerStore, init_db
+    from trf.due import DueStates
+    from trf.server import socket_path, is_running
+    home = tempfile.mkdtemp(prefix='trf-bench-refresh-')
+    db_path = os.path.join(home, 'trf.fs')
+    store = TrackerStore.open(db_path)
+    with store.batch():
+        for tracker in make_trackers(trf, n):
+            store.update_tracker(tracker.doc_id, tracker)
+        store.root['next_id'] = n + 1
+    store.close()
+    server = subprocess.Popen([sys.executable, '-m', 'trf.server', home])
+    try:
+        while not is_running(socket_path(home)):
+            time.sleep(0.05)
+        viewer = trf.TrackerManager(*init_db(db_path, server=True))
+        # another client with transactions of its own, as in another process
+        other = ThreadPoolExecutor(1)
+        writer = other.submit(TrackerStore.open, db_path, server=True).result()
+        # so that the samples of the sort indexes are not released with the
+        # indexes and so have to be kept up to date
+        viewer.update_settings({'cache_size': 10 * n})
+        viewer.due_states()
+        viewer.search_trackers('tracker')
+        viewer.list_trackers()
+        elapsed, _ = timed(lambda: [viewer.sync() for _ in range(idle)])
+        print(f"refresh check {n:>6} trackers: {1e6*elapsed/idle:.1f}µs when nothing has changed")
+        random.seed(n)
+        times = []
+        relists = 0
+        mismatched = set()
+        for i in range(rounds):
+            doc_id = random.choice(list(writer.trackers.keys()))
+            kind = i % 5
+            if kind == 0:
+                other.submit(writer.record_completion, doc_id, (datetime.now(), timedelta(0))).result()
+            elif kind == 1:
+                other.submit(writer.add_tracker, f"added {i}").result()
+            elif kind == 2:
+                other.submit(writer.rename_tracker, doc_id, f"renamed {i}").result()
+            else:
+                other.submit(writer.delete_tracker, doc_id).result()
+            while viewer.storage.lastTransaction() != writer.storage.lastTransaction():
+                time.sleep(0.001)
+            if kind == 4:
+                # a commit of the viewer's own shows the writer's first, in
+                # a batch since retried() would otherwise sync before it
+                with viewer.batch():
+                    viewer.update_settings({'cache_size': 10 * n + i})
+            elapsed, changed = timed(viewer.sync)
+            times.append(elapsed)
+            if viewer.page_changed(changed):
+                relists += 1
+                viewer.list_trackers()
+            if kind == 3:
+                # before the next round takes the samples again
+                for mode, index in viewer.indexes.items():
+                    expected = list(index.doc_ids())
+                    if any(index.page(start, 26) != expected[start:start + 26]
+                           for start in range(0, len(expected), 26)):
+                        mismatched.add(mode)
+        times.sort()
+        mismatched = sorted(mismatched)
+        viewer.due.advance()
+        fresh = DueStates()
+        fresh.build(viewer.forecasts.items(), viewer.settings.get('η'), datetime.now())
+        if fresh.counts != viewer.due.counts:
+            mismatched.append('due')
+        if viewer._name_index.names != {key[-1]: key[0] for key in viewer.indexes['subject'].keys()}:
+            mismatched.append('names')
+        other.submit(writer.close).result()
+        other.shutdown()
+        viewer.close()
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"refresh {rounds} changes by another client: median {1000*times[len(times)//2]:.2f}ms, "
+          f"max {1000*times[-1]:.2f}ms, {relists} relisted, "
+          f"{', '.join(mismatched) or 'nothing'} mismatched: {'FAILED' if mismatched else 'ok'}")
+
+
+benchmarks = {
+    'forecast': bench_forecast,
+    'render': bench_render,
+    'eta': bench_eta,
+    'due': bench_due,
+    'agenda': bench_agenda,
+    'backup': bench_backup,
+    'startup': bench_startup,
+    'cli': bench_cli,
+    'core': bench_core,
+    'history': bench_history,
+    'encoding': bench_encoding,
+    'parse': bench_parse,
+    'transfer': bench_transfer,
+    'memory': bench_memory,
+    'search': bench_search,
+    'scheduler': bench_scheduler,
+    'server': bench_server,
+    'refresh': bench_refresh,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            print(f"unknown benchmark '{name}', choose from {', '.join(benchmarks)}")
+            return
+    trf = load_trf()
+    for name in names:
+        benchmarks[name](trf)
+
+
+if __name__ == "__main__":
+    main()
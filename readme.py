@@ -18,7 +18,7 @@ The goal of *trf* is to save you trouble of going through this iterative process
 
       - The "expected next completion" is calculated by adding the *average* of the intervals to the last completion date and time.
 
-      - If there are more than 12 completions, only the last 12 completions are used to calculate the average interval. The estimated next completion date and time is thus based only on the average of the intervals for the most recent 12 completions.
+      - The full history of completions is kept but only the intervals between the most recent completions are used to calculate the average interval, at most 12 of them or the number given by the 'window' setting. The estimated next completion date and time is thus based only on the average of the most recent intervals.
 
 One slight wrinkle when adding a completion is that you might have filled the bird feeders because it was a convenient time even though you estimate that you could have waited another day. In this case the actual interval should be the difference between the last completion date and the current completion date plus one day. On the other hand, you might have noticed that the feeders were empty on the previous day but weren't able to fill them. In this case the actual interval should be the difference between the last completion date and the current completion date minus one day. To accommodate this, when adding a completion you can optionally specify the interval adjustment. E.g., `4p, +1d` would add a completion for 4pm today with an estimate that the completion could have been postponed by one day. Similarly, `4p, -1d` would add a completion for 4pm today with an estimate that the completion should have been done one day earlier.
 
@@ -58,6 +58,8 @@ The `forecast` column shows, as mentioned above, the sum of `latest` (the last c
 
 Since it is currently 3:48pm on September 23 or `240923T1548` and this is past `late = 240922T0900`, i.e., more than 2d2h after the forecast for bird feeders, the display shows the bird feeder tracker in a suspiciously-late color, burnt orange. By comparison, `early` and `late` datetimes for "between late and early" are September 23 plus or minus 1 day and 2 hours.  Since the current time lies within this interval, "between early and late" gets an anytime-now color, gold. Finally, since `early` for "before early" is September 29 minus 1 day and 2 hours and this is later than the current time, "before early" gets a not-yet color, blue. There is no forecast for the last two trackers since neither have the two or more completions which are required for an interval on which to base a forecast, so these get trackers get the the no-forecast color, white.
 
+A tracker changes color as soon as the current time passes one of its datetimes, without waiting for the list to be redrawn, and the status bar shows after the time how many trackers have each of the colors, burnt orange, gold, blue and then light blue for trackers before `early - η × spread`.
+
 ### Usage
 
 #### Installation
@@ -80,9 +82,9 @@ The optional arguments, --force and -U, are used to update an existing installat
 
 Once installed you can start *trf* with the following command:
 
-        > trf [log_level] [home_dir] ['restore']
+        > trf [--startup-profile] [--server] [log_level] [home_dir] ['restore' | 'pack']
 
-where all three arguments are optional.
+where all the arguments are optional.
 
 - If log_level is given it should be an integer: 10 for debug, 20 for info, 30 for warning or 40 for error. If not given log_level defaults to 20.
 
@@ -92,13 +94,41 @@ where all three arguments are optional.
 
     - Finally, if neither home_dir nor TRFHOME is given, then *trf* will use the current working directory as its home directory.
 
-- If restore is given, then instead of starting *trf*,  an option will be offered to restore the datastore from one of its backup files - more on this below.
+- If restore is given, then instead of starting *trf*,  an option will be offered to restore the datastore from one of its backup files - more on this below. This is refused while other *trf* processes share the datastore through a server, which exits 5 minutes after the last of them closes.
+
+- If pack is given, then instead of starting *trf*, the datastore will be packed to discard old revisions of its objects and *trf* will exit, as with `trf pack` below, without loading the interface, so it can be run by cron. While *trf* is running, the datastore is also packed automatically, in the background, whenever a full backup is due, just before it, so that the daily backups that follow build on the packed file. The `pack_days` setting gives the number of days of history to keep when packing.
+
+- If --startup-profile is given, then *trf* will start as usual but exit as soon as its first screen has been drawn and print the time taken by each step of starting up: processing the arguments, importing the libraries, building the interface, opening the datastore, loading the trackers and drawing the first frame.
+
+- If --server is given, then the datastore is shared with other *trf* processes, e.g., *trf* running in another terminal or `trf record` run by cron, through a server for the home directory. The server is started if it is not already running, listens on the socket trf.sock in the home directory and exits once it has had no clients for five minutes. Whenever the server is running, *trf* and the commands below use it without --server. Changes made by the other processes are shown within a couple of seconds, the list being redrawn only if the page shown has changed, and two processes changing the same tracker at the same time have their completions merged or the second change made again. The server needs ZEO, installed with `pip install "trf-dgraham[zeo]"`.
+
+*trf* also has commands for scripts, cron jobs and shell hooks that work with the datastore without starting the full screen interface:
+
+        > trf [--home home_dir] record <id|name> <when> [adjustment]
+        > trf [--home home_dir] due [--within period]
+        > trf [--home home_dir] agenda [--start datetime] [--within period]
+        > trf [--home home_dir] show <id|name>
+        > trf [--home home_dir] export [file] [--format jsonl|csv]
+        > trf [--home home_dir] import <file> [--format jsonl|csv] [--workers n] [--restart]
+        > trf [--home home_dir] pack
+
+- record adds a completion, e.g., `trf record 'fill feeders' now` or `trf record 3 '3p wed' -1d`.
+- due lists the trackers whose next completion is expected within the period, e.g., `trf due --within 3d`, together with hot, warm, cool or cold as in the list view.
+- agenda lists the trackers that may be due within the period, those whose interval from `forecast - 2 × η × spread` to `late` overlaps it, e.g., `trf agenda --within 72h` or `trf agenda --start "mon 9a" --within 2d`.
+- show prints the details of a tracker.
+- export writes every tracker with its history, one tracker per line, as JSON Lines or, for a file ending in .csv, as CSV. Without a file it writes to stdout.
+- import adds the trackers in a file written by export, keeping their ids when they are not already in use. An import that is interrupted continues where it stopped when the same command is run again, or starts over with --restart.
+- pack discards the revisions of the datastore older than the `pack_days` setting.
+
+The home directory defaults to TRFHOME or the current working directory as above. Since due, show and export only read the datastore, they can be used while *trf* is running. record and import need *trf* to be closed unless it was started with --server.
 
 The home directory is where the datastore, data backup files and log files are stored.
 
 The datastore used by *trf* is a ZOBD database.  The data itself is a python dictionary with integer doc_id's as keys and dictionaries as values. These dictionaries contain entries for the tracker name and the history of completions and internals for the intervals and other computed values.  An additional dictionary containing user settings is also stored in the ZOBD datastore.
 
-The ZOBD datastore transparently stores these python objects as 'pickled' versions of the objects themselves, using two files called 'track.fs' and 'track.fs.index'. Track keeps a daily, rotating back up of these two files in a zip format when ever 'track.fs' has been modified since the last backup.  Of these zip files, only 7 are kept  including the 3 most recent 3 files and 4 older files separated by intervals of at least 14 days. ZOBD also uses files called 'track.fs.lock' and 'track.fs.tmp' but they are not needed for restoring the datastore and are not backed up.
+The ZOBD datastore transparently stores these python objects as 'pickled' versions of the objects themselves, using two files called 'track.fs' and 'track.fs.index'. Track keeps a daily, rotating back up of 'track.fs' in a compressed zip format when ever it has been modified since the last backup. The backup is written in the background from a consistent snapshot of the committed transactions, so *trf* remains usable while it runs, and 'track.fs.index' is not needed since ZODB rebuilds it from 'track.fs'. The compression method and level are set by 'backup_compression' and 'backup_level' in the settings. Since ZODB only ever appends to 'track.fs', a full backup is made once every 'full_backup_days' days (7 by default) which is also when the datastore is packed, and the daily backups in between hold only the changes made since the previous backup. Every day of the two most recent weeks is kept together with up to 4 older full backups separated by intervals of at least 14 days. ZOBD also uses files called 'track.fs.lock' and 'track.fs.tmp' but they are not needed for restoring the datastore and are not backed up.
+
+Only the trackers on the page being listed and on the pages next to it need to be in memory. Other trackers are released once more than 'cache_size' objects (2000 by default) or more than 'cache_mb' megabytes (32 by default) are in memory, and are loaded again when they are needed. F2) about track shows how many trackers and objects are in memory and how many of the listed trackers were found in memory or had to be loaded. It also shows, for the clock update, the daily maintenance and the other timed jobs, how late they started, how long they ran and how often they overran.
 
 In addition to the 'backup' subdirectory, *trf* keeps a daily rotating backup of its log files in another subdirectory called 'logs'.
 
@@ -127,7 +157,7 @@ Here is an illustration of home_dir as it might appear on November 9, 2024:
             trf.fs.lock
             trf.fs.tmp
 
-If the optional 'restore' were given, then a list of the available backup zip files in the 'backup' sub directory of the home dir would be presented to the user with a prompt to choose the zip file from which to restore the datastore. If the user chooses a zip file, the current 'track.fs' and 'track.fs.index' files would first be saved as 'restore.zip' and then these files would be replaced by the corresponding files from the selected zip file. When next restarted, *trf* would use the restored files.
+If the optional 'restore' were given, then a list of the available backup zip files in the 'backup' sub directory of the home dir would be presented to the user with a prompt to choose the zip file from which to restore the datastore. If the user chooses a zip file, the current 'track.fs' and 'track.fs.index' files would first be saved as 'removed.zip' and then 'track.fs' would be rebuilt as of the chosen day from the preceding full backup and the daily backups that follow it. When next restarted, *trf* would use the restored files.
 
 #### Using *trf*
 
@@ -148,6 +178,8 @@ The menu bar has the following options:
                 l) list trackers
                 s) sort trackers
                 t) select row from tag
+                J) jump to tracker
+                A) agenda
             edit
                 n) create new tracker
                 c) add completion
@@ -157,6 +189,10 @@ The menu bar has the following options:
 i
 Most options have fairly obvious meanings and can be invoked either from the menu or by pressing the relevant key. E.g., for `sort trackers`, either clicking the menu item or pressing `s` would offer the option to sort the trackers either by f)orecast datetime, l)atest datetime, n)ame or i)d. Just press the relevant key, e.g., `n` to sort by name.
 
+To find a tracker on any page, press `J` and type part of its name. The trackers whose names start with what you have typed are listed first, then those with a word starting with each word you have typed and then those containing each of them. Press `enter` to jump to the page and row of the first, or use `up` and `down` to choose another.
+
+To see what may be due in a period, press `A` and enter a period such as `3d` or `72h` from now, or a datetime and a period separated by a comma, e.g., `mon 9a, 2d`. Every tracker whose interval from `forecast - 2 × η × spread` to `late` overlaps the period is listed in the order of its forecast. The same list is printed by `trf agenda --within 3d`, with `--start` for a period that does not begin now.
+
 Similarly, when you press `n` to create a new tracker, the one requirement is that you specify a name for the new tracker
 
         > the name of my tracker
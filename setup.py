@@ -40,10 +40,15 @@ setup(
         'python-dateutil>=2.7.3',
         'persistent>=4.6.4',  # Add persistent here
         'ZODB>=5.6.0',  # Add ZODB here
+        'BTrees>=4.0.0',
         'transaction>=3.0.1',  # Add transaction here
         'lorem>=0.1.1',
         'pyperclip>=1.7.0',
     ],
+    extras_require={
+        'numpy': ['numpy>=1.20'],  # batch forecasts in trf/forecast.py
+        'zeo': ['ZEO>=5.2'],  # sharing the database, trf/server.py
+    },
     entry_points={
         'console_scripts': [
             'trf=trf.__main__:main',  # Correct the path to `main` in `trf/trf.py`
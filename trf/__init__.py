@@ -1,12 +1,25 @@
 import os, sys
 
+commands = ('restore', 'pack')
+
 def process_arguments():
     """
     Process sys.argv to get the necessary parameters, like the database file location.
+
+    Usage: trf [--startup-profile] [--server] [log_level] [trf_home] [command]
+    where command is one of 'restore' or 'pack'. With --server the database
+    is shared with other trf processes through a server, see server.py.
     """
-    backup_count = 7
     log_level = 20
 
+    startup_profile = '--startup-profile' in sys.argv
+    if startup_profile:
+        sys.argv.remove('--startup-profile')
+
+    server = '--server' in sys.argv
+    if server:
+        sys.argv.remove('--server')
+
     if len(sys.argv) > 1:
         try:
             log_level = int(sys.argv[1])
@@ -14,6 +27,10 @@ def process_arguments():
         except ValueError:
             log_level = log_level
 
+    command = None
+    if len(sys.argv) > 1 and sys.argv[-1] in commands:
+        command = sys.argv.pop()
+
     envhome = os.environ.get('TRFHOME')
     if len(sys.argv) > 1:
         trf_home = sys.argv[1]
@@ -26,10 +43,25 @@ def process_arguments():
 
     db_path = os.path.join(trf_home, "trf.fs")
 
-    restore = len(sys.argv) > 2 and sys.argv[2] == 'restore'
+    restore = command == 'restore'
 
-    return trf_home, log_level, restore, backup_dir, db_path
+    return trf_home, log_level, restore, backup_dir, db_path, command, startup_profile, server
+
+arguments = ('trf_home', 'log_level', 'restore', 'backup_dir', 'db_path', 'command', 'startup_profile', 'server')
+
+def load_arguments():
+    """
+    Process the command line once, setting the arguments as attributes of
+    the trf package.
+    """
+    if 'trf_home' not in globals():
+        globals().update(zip(arguments, process_arguments()))
 
-# Get command-line arguments: Process the command-line arguments to get the database file location
-trf_home, log_level, restore, backup_dir, db_path = process_arguments()
+def __getattr__(name):
+    # The command line is processed when one of the arguments is first
+    # needed rather than whenever trf is imported
+    if name in arguments:
+        load_arguments()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
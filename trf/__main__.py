@@ -1,6 +1,23 @@
 import sys
 
-from .trf import main # This imports `main` from `trf/trf.py`
+from .startup import profile
+
+def main():
+    from . import cli
+    if cli.is_headless(sys.argv[1:]):
+        # record, due and show never import the interface
+        sys.exit(cli.main(sys.argv[1:]))
+    # The command line is processed before the interface in trf/trf.py is
+    # imported and built, and the database is only opened by its main()
+    from . import load_arguments
+    load_arguments()
+    from . import command, trf_home, log_level, server
+    if command == 'pack':
+        # trf [log_level] [trf_home] pack, as 'trf pack' without the interface
+        sys.exit(cli.main(['--home', trf_home, '--log-level', str(log_level)] + ['--server'] * server + ['pack']))
+    profile.mark('arguments')
+    from .trf import main as run
+    run()
 
 if __name__ == "__main__":
     main()
@@ -1,36 +1,201 @@
 import os
 import zipfile
 import re
+import time
+import json
+import hashlib
 from datetime import datetime, timedelta
 # from . import logger
 
 # Backup and restore functions
 
-def backup_to_zip(trf_home, today, logger):
+COMPRESSION = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+if hasattr(zipfile, 'ZIP_ZSTANDARD'):
+    # python >= 3.14
+    COMPRESSION['zstd'] = zipfile.ZIP_ZSTANDARD
+
+CHUNK_SIZE = 1 << 20
+TAIL_SIZE = 1 << 16
+MANIFEST = 'manifest.json'
+
+def open_snapshot(db_file, storage=None):
+    """
+    Open db_file for reading and return the file object together with the
+    number of bytes at its start that form a consistent snapshot.
+
+    FileStorage only ever appends to trf.fs and getSize() is the end of the
+    last committed transaction, so the bytes before it never change. Packing
+    replaces trf.fs with a new file but the open file object keeps the old
+    one readable, so the file is reopened only if it was replaced between
+    opening it and reading the size. Without a storage, e.g. when the
+    database is not open, the whole file is used.
+    """
+    while True:
+        f = open(db_file, 'rb')
+        size = storage.getSize() if storage is not None else os.fstat(f.fileno()).st_size
+        if os.fstat(f.fileno()).st_ino == os.stat(db_file).st_ino:
+            return f, size
+        f.close()
+
+def write_zip(backup_zip, members, compression='deflate', level=None, manifest=None):
+    """
+    Stream members, a list of (arcname, file object, size) tuples, into a
+    compressed zip file without making an intermediate copy. Each member is
+    read from the current position of its file object. The archive is
+    written under a temporary name and only renamed to backup_zip when it is
+    complete. Returns the number of bytes read.
+    """
+    tmp_zip = f"{backup_zip}.tmp"
+    total = 0
+    with zipfile.ZipFile(tmp_zip, 'w', compression=COMPRESSION[compression], compresslevel=level) as zipf:
+        for arcname, f, size in members:
+            with zipf.open(arcname, 'w', force_zip64=True) as dest:
+                remaining = size
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    remaining -= len(chunk)
+                    total += len(chunk)
+        if manifest is not None:
+            zipf.writestr(MANIFEST, json.dumps(manifest))
+    os.replace(tmp_zip, backup_zip)
+    return total
+
+def read_manifest(backup_zip):
+    """
+    Return the manifest of backup_zip. Archives written before incremental
+    backups have no manifest and are full backups of trf.fs.
+    """
+    with zipfile.ZipFile(backup_zip, 'r') as zipf:
+        if MANIFEST in zipf.namelist():
+            return json.loads(zipf.read(MANIFEST))
+    return {'kind': 'full', 'base': os.path.splitext(os.path.basename(backup_zip))[0]}
+
+def tail_digest(f, end):
+    """
+    The md5 hex digest of the TAIL_SIZE bytes of f ending at end. Used to
+    check that trf.fs still begins with the bytes already backed up.
+    """
+    start = max(end - TAIL_SIZE, 0)
+    f.seek(start)
+    return hashlib.md5(f.read(end - start)).hexdigest()
+
+def backup_names(backup_dir):
+    pattern = re.compile(r'^\d{6}\.zip$')
+    names = [os.path.splitext(f)[0] for f in os.listdir(backup_dir) if pattern.match(f)]
+    names.sort()
+    return names
+
+def chain_expired(last, name, full_days):
+    """
+    Whether the backup name must start a new chain with a full backup
+    because last, the manifest of the previous backup, is not part of a
+    chain or the full backup of its chain is full_days or more days older.
+    """
+    base = last.get('base')
+    return (not base or 'end' not in last
+            or (datetime.strptime(name, "%y%m%d") - datetime.strptime(base, "%y%m%d")).days >= full_days)
+
+def full_backup_due(trf_home, full_days=7):
+    """
+    Whether the next backup of trf.fs, named for the day it was last
+    modified, will be a full backup because the current chain has expired.
+    """
     backup_dir = os.path.join(trf_home, 'backup')
-    files_to_backup = [os.path.join(trf_home, 'trf.fs'), os.path.join(trf_home, 'trf.fs.index')]
-    logger.debug(f"{files_to_backup = }")
-    if not files_to_backup or not os.path.exists(files_to_backup[0]):
+    db_file = os.path.join(trf_home, 'trf.fs')
+    previous = backup_names(backup_dir) if os.path.isdir(backup_dir) else []
+    if not previous:
+        return True
+    name = datetime.fromtimestamp(os.path.getmtime(db_file)).strftime('%y%m%d')
+    return chain_expired(read_manifest(os.path.join(backup_dir, f"{previous[-1]}.zip")), name, full_days)
+
+def backup_to_zip(trf_home, today, logger, storage=None, compression='deflate', level=None, full_days=7):
+    """
+    Back up trf.fs to backup/YYMMDD.zip.
+
+    FileStorage only ever appends transactions to trf.fs, so, as with
+    repozo, a full backup is made only every full_days days and otherwise
+    the archive holds just the bytes appended since the previous backup.
+    Each archive has a manifest recording the byte range it covers, the
+    full backup it builds on and a digest of the bytes before its end so
+    that the chain can be checked. A full backup is also made when trf.fs
+    has been packed since the previous backup since packing rewrites it,
+    which is why backup_and_pack() packs only when a full backup is due.
+    """
+    backup_dir = os.path.join(trf_home, 'backup')
+    db_file = os.path.join(trf_home, 'trf.fs')
+    logger.debug(f"{db_file = }")
+    if not os.path.exists(db_file):
         return False, "nothing to backup"
 
-    last_modified_timestamp = os.path.getmtime(files_to_backup[0])
+    last_modified_timestamp = os.path.getmtime(db_file)
     last_modified_time = datetime.fromtimestamp(last_modified_timestamp)
 
-    for file in files_to_backup:
-        if not os.path.exists(file):
-            return (False, f"Backup skipped - {file} does not exist")
+    if compression not in COMPRESSION:
+        logger.error(f"Unknown backup compression '{compression}', using 'deflate'")
+        compression = 'deflate'
 
     if today == 'remove':
-        files_to_backup += [os.path.join(trf_home, 'trf.fs.tmp'), os.path.join(trf_home, 'trf.fs.lock')]
+        # the database is closed, keep everything including the lock files
+        files_to_backup = [db_file] + [os.path.join(trf_home, f'trf.fs.{ext}') for ext in ('index', 'tmp', 'lock')]
+        files_to_backup = [f for f in files_to_backup if os.path.exists(f)]
         backup_zip = os.path.join(trf_home, 'backup', "removed.zip")
+        files = [open(f, 'rb') for f in files_to_backup]
+        members = [(os.path.basename(name), f, os.fstat(f.fileno()).st_size) for name, f in zip(files_to_backup, files)]
+        manifest = None
     else:
-        backup_zip = os.path.join(trf_home, 'backup', f"{last_modified_time.strftime('%y%m%d')}.zip")
+        name = last_modified_time.strftime('%y%m%d')
+        backup_zip = os.path.join(trf_home, 'backup', f"{name}.zip")
         if os.path.exists(backup_zip):
             return (False, f"Backup skipped - backup file already exists: {backup_zip}")
+        # trf.fs.index is rebuilt from trf.fs when needed, so only the
+        # committed part of trf.fs is backed up
+        f, size = open_snapshot(db_file, storage)
+        files = [f]
+        inode = os.fstat(f.fileno()).st_ino
+        previous = backup_names(backup_dir)
+        last = read_manifest(os.path.join(backup_dir, f"{previous[-1]}.zip")) if previous else {}
+        base = last.get('base')
+        start = last.get('end', 0)
+        if (chain_expired(last, name, full_days)
+                or last.get('inode') != inode
+                or size < start
+                or tail_digest(f, start) != last.get('tail')):
+            start = 0
+            base = name
+        elif size == start:
+            f.close()
+            return (False, "Backup skipped - no changes since the last backup")
+        manifest = {
+            'kind': 'full' if start == 0 else 'delta',
+            'base': base,
+            'previous': previous[-1] if start else None,
+            'start': start,
+            'end': size,
+            'inode': inode,
+            'tail': tail_digest(f, size),
+        }
+        f.seek(start)
+        members = [('trf.fs' if start == 0 else 'trf.fs.delta', f, size - start)]
 
-    with zipfile.ZipFile(backup_zip, 'w') as zipf:
-        for file in files_to_backup:
-            zipf.write(file)
+    start_time = time.perf_counter()
+    try:
+        total = write_zip(backup_zip, members, compression, level, manifest)
+    finally:
+        for f in files:
+            f.close()
+    elapsed = time.perf_counter() - start_time
+    compressed = os.path.getsize(backup_zip)
+    ratio = total / compressed if compressed else 0
+    kind = manifest['kind'] if manifest else 'full'
+    logger.info(f"Wrote {kind} backup {backup_zip}: {total} -> {compressed} bytes ({compression}, ratio {ratio:.1f}) in {elapsed:.2f} seconds")
 
     if today == 'remove':
         for fp in files_to_backup:
@@ -40,60 +205,139 @@ def backup_to_zip(trf_home, today, logger):
 
     return (True, f"Backup completed: {backup_zip}")
 
-def rotate_backups(trf_home, logger):
+def rotate_backups(trf_home, logger, storage=None, compression='deflate', level=None, full_days=7):
     # entry point for backups - make sure backup dir exists
     backup_dir = os.path.join(trf_home, 'backup')
     os.makedirs(backup_dir, exist_ok=True)
 
     today = datetime.today()
-    ok, msg = backup_to_zip(trf_home, today, logger)
+    ok, msg = backup_to_zip(trf_home, today, logger, storage, compression, level, full_days)
     if not ok:
         logger.info(msg)
         return False
 
-    pattern = re.compile(r'^\d{6}\.zip$')
-    all_files = os.listdir(backup_dir)
-    names = [os.path.splitext(f)[0] for f in all_files if pattern.match(f)]
-    queue = []
+    # group the archives into chains, each a full backup followed by the
+    # incremental backups built on it
+    chains = {}
+    for name in backup_names(backup_dir):
+        base = read_manifest(os.path.join(backup_dir, f"{name}.zip")).get('base', name)
+        chains.setdefault(base, []).append(name)
+    bases = sorted(chains, reverse=True)
+
+    # keep every day of the two most recent chains and, from the older
+    # chains, up to 4 full backups separated by at least 14 days
     gap = timedelta(days=14)
+    older = []
+    for base in reversed(bases[2:]):
+        if not older or datetime.strptime(base, "%y%m%d") >= datetime.strptime(older[-1], "%y%m%d") + gap:
+            older.append(base)
+    keep = bases[:2] + older[-4:]
 
-    names.sort()
     remove = []
-    for name in names:
-        queue.insert(0, name)
-        if len(queue) > 7:
-            pivot = queue[3]
-            older = queue[4]
-            pivot_dt = datetime.strptime(pivot, "%y%m%d")
-            pivot_gap = (pivot_dt - gap).strftime("%y%m%d")
-            if older < pivot_gap:
-                remove.append(queue.pop(-1))
-            else:
-                remove.append(queue.pop(3))
-
-            if len(queue) > 7:
-                remove.extend(queue[7:])
-                queue = queue[:7]
+    for base in bases:
+        if base not in keep:
+            remove.extend(chains[base])
+        elif base not in bases[:2]:
+            remove.extend(chains[base][1:])
 
     if remove:
         for name in remove:
             file = os.path.join(backup_dir, f"{name}.zip")
             os.remove(file)
         logger.info(f"Removing backup: {', '.join(remove)}")
+    return True
+
+# Pack functions
+
+def pack_database(db, trf_home, days, logger):
+    """
+    Pack the database, discarding object revisions that are no longer
+    current and are older than 'days' days. Returns the file size before
+    and after packing.
+    """
+    db_file = os.path.join(trf_home, 'trf.fs')
+    before = os.path.getsize(db_file)
+    start = time.perf_counter()
+    logger.info(f"Packing {db_file} ({before} bytes), keeping {days} days of history")
+    db.pack(days=days)
+    after = os.path.getsize(db_file)
+    logger.info(f"Packed {db_file}: {before} -> {after} bytes in {time.perf_counter() - start:.2f} seconds")
+    return before, after
+
+def backup_and_pack(db, trf_home, logger, storage=None, compression='deflate', level=None, full_days=7,
+                    pack_days=7):
+    """
+    The daily backup, see rotate_backups(), and pack, see pack_database().
+
+    Packing rewrites trf.fs as a new file, after which the next backup can
+    only be a full one. So that the daily incremental backups still form a
+    chain, the database is packed only when a full backup is due anyway,
+    just before it, and the packed file starts the new chain. Revisions
+    older than pack_days days are thus discarded every full_days days.
+    """
+    if pack_days is not None and pack_days >= 0 and full_backup_due(trf_home, full_days):
+        pack_database(db, trf_home, pack_days, logger)
+    return rotate_backups(trf_home, logger, storage, compression, level, full_days)
+
+def backup_chain(backup_dir, name):
+    """
+    Return the names of the archives needed to rebuild trf.fs as it was
+    when backup name was made: the full backup followed by each incremental
+    backup up to and including name.
+    """
+    chain = []
+    while name:
+        backup_zip = os.path.join(backup_dir, f"{name}.zip")
+        if not os.path.exists(backup_zip):
+            raise FileNotFoundError(f"{backup_zip} is needed to restore {chain[-1] if chain else name}")
+        chain.insert(0, name)
+        name = read_manifest(backup_zip).get('previous')
+    return chain
+
+def restore_day(trf_home, name, logger):
+    """
+    Rebuild trf.fs from the chain of archives ending with backup name. The
+    file is assembled under a temporary name, checked against the manifest
+    of the last archive and only then moved into place.
+    """
+    backup_dir = os.path.join(trf_home, 'backup')
+    db_file = os.path.join(trf_home, 'trf.fs')
+    tmp_file = f"{db_file}.restore"
+    chain = backup_chain(backup_dir, name)
+    with open(tmp_file, 'w+b') as out:
+        for link in chain:
+            backup_zip = os.path.join(backup_dir, f"{link}.zip")
+            manifest = read_manifest(backup_zip)
+            with zipfile.ZipFile(backup_zip, 'r') as zipf:
+                # archives written before incremental backups used full paths
+                member = [n for n in zipf.namelist() if os.path.basename(n) in ('trf.fs', 'trf.fs.delta')][0]
+                if out.tell() != manifest.get('start', 0):
+                    raise ValueError(f"{backup_zip} starts at byte {manifest.get('start')}, not {out.tell()}")
+                with zipf.open(member) as src:
+                    while chunk := src.read(CHUNK_SIZE):
+                        out.write(chunk)
+            logger.info(f"Restored {manifest.get('kind', 'full')} backup {backup_zip}")
+        if 'tail' in manifest:
+            end = out.tell()
+            if end != manifest['end'] or tail_digest(out, end) != manifest['tail']:
+                raise ValueError(f"{tmp_file} does not match the manifest of {name}")
+    for ext in ('index', 'tmp', 'lock'):
+        if os.path.exists(f"{db_file}.{ext}"):
+            os.remove(f"{db_file}.{ext}")
+    os.replace(tmp_file, db_file)
+    return chain
 
-def restore_from_zip(trf_home):
-    clear_screen()
+def restore_from_zip(trf_home, logger):
     backup_dir = os.path.join(trf_home, 'backup')
     print(f"""
 Choosing one of the 'restore from' options will:
-1) compress all trf.fs* files into "remove.zip" in {backup_dir}
+1) compress all trf.fs* files into "removed.zip" in {backup_dir}
 2) remove all trf.fs* files from {trf_home}
-3) restore files "trf.fs" and "trf.fs.index" from the selected zip file
+3) rebuild "trf.fs" as of the selected day from its full backup and
+   the daily incremental backups that follow it
 """)
 
-    pattern = re.compile(r'^\d{6}\.zip$')
-    all_files = os.listdir(backup_dir)
-    names = [os.path.splitext(f)[0] for f in all_files if pattern.match(f)]
+    names = backup_names(backup_dir)
     names.sort(reverse=True)
 
     restore_options = {'0': 'cancel'}
@@ -111,17 +355,14 @@ Choosing one of the 'restore from' options will:
                 print("Restore cancelled.")
                 return False, "nothing to backup"
 
-            # Perform the restore
-            ok, msg = backup_to_zip(track_home, 'remove')
-            print(msg)
             chosen_name = restore_options[choice]
-            backup_zip = os.path.join(backup_dir, chosen_name + '.zip')
-            print(f"Extracting files from {backup_zip}")
-
-            with zipfile.ZipFile(backup_zip, 'r') as zipf:
-                zipf.extractall(track_home)
-
-            return
+            # check the chain before anything is removed
+            chain = backup_chain(backup_dir, chosen_name)
+            ok, msg = backup_to_zip(trf_home, 'remove', logger)
+            print(msg)
+            print(f"Restoring {chosen_name} from {', '.join(chain)}")
+            restore_day(trf_home, chosen_name, logger)
+            return True, f"Restored {chosen_name}"
 
         else:
             print("Invalid option. Please choose again.")
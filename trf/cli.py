@@ -0,0 +1,245 @@
+# trf/cli.py
+"""
+Headless commands for scripts, cron jobs and shell hooks:
+
+    trf record <id|name> <when> [adjustment]
+    trf due [--within 3d]
+    trf agenda [--start datetime] [--within 7d]
+    trf show <id|name>
+    trf export [file] [--format jsonl|csv]
+    trf import <file> [--format jsonl|csv] [--workers n] [--restart]
+    trf pack
+
+These work with trf.core alone and never import prompt_toolkit. With
+--server, or whenever the server for the home is running, they share the
+database with the interface and other commands, see server.py.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+commands = ('record', 'due', 'agenda', 'show', 'export', 'import', 'pack')
+
+
+def is_headless(argv: list) -> bool:
+    """
+    True if argv, without the program name, starts with one of the commands
+    after any --home, --log-level and --server options.
+    """
+    i = 0
+    while i < len(argv) and argv[i] in ('--home', '--log-level', '--server'):
+        i += 1 if argv[i] == '--server' else 2
+    return i < len(argv) and argv[i] in commands
+
+
+def open_store(trf_home: str, log_level: int, read_only: bool = False, server: bool = False):
+    """
+    Open the database in trf_home, through its server if server or if the
+    server is running, see server.py. Commands that only read fall back to
+    a read only connection when trf is running without the server and holds
+    the lock.
+    """
+    from zc.lockfile import LockError
+    from .core import setup_logging, TrackerStore
+    db_path = os.path.join(trf_home, "trf.fs")
+    if not os.path.exists(db_path):
+        raise SystemExit(f"No trf database in {trf_home}")
+    setup_logging(trf_home=trf_home, log_level=log_level, backup_count=7)
+    try:
+        return TrackerStore.open(db_path, server=server)
+    except RuntimeError as e:
+        # the server could not be used
+        raise SystemExit(str(e))
+    except LockError:
+        if not read_only:
+            raise SystemExit(f"{db_path} is in use by another trf process, start both with --server to share it")
+    try:
+        return TrackerStore.open(db_path, read_only=True)
+    except RuntimeError as e:
+        # a database that has to be upgraded first
+        raise SystemExit(str(e))
+
+
+def find_tracker(store, key: str) -> int:
+    """
+    Return the doc_id of the tracker given by its doc_id or its name.
+    """
+    if key.isdigit() and int(key) in store.trackers:
+        return int(key)
+    doc_ids = store.find_trackers(key)
+    if not doc_ids:
+        raise SystemExit(f"No tracker matches '{key}'")
+    if len(doc_ids) > 1:
+        raise SystemExit(f"'{key}' matches trackers {', '.join(str(x) for x in doc_ids)}, use the id")
+    return doc_ids[0]
+
+
+def record(store, args) -> int:
+    from .core import Tracker
+    doc_id = find_tracker(store, args.tracker)
+    completion = ", ".join(x for x in (args.when, args.adjustment) if x)
+    ok, comp = Tracker.parse_completion(completion)
+    if not ok:
+        print(f"Could not parse '{completion}': {comp}", file=sys.stderr)
+        return 1
+    ok, msg = store.record_completion(doc_id, comp)
+    if not ok:
+        print(msg, file=sys.stderr)
+        return 1
+    tracker = store.trackers[doc_id]
+    print(f"{doc_id}: {tracker.name}: recorded {Tracker.format_completion(comp, long=True)}, next {Tracker.format_dt(tracker.info['next_expected_completion'], long=True) or '~'}")
+    return 0
+
+
+def due_state(info: dict, now: datetime) -> str:
+    """
+    The name TrackerLexer uses for the style of the next date.
+    """
+    if now < info['early']:
+        return 'cold'
+    if now < info['timely']:
+        return 'cool'
+    if now < info['tardy']:
+        return 'warm'
+    return 'hot'
+
+
+def due(store, args) -> int:
+    from .core import Tracker
+    ok, within = Tracker.parse_td(args.within)
+    if not ok:
+        print(f"Could not parse '{args.within}': {within}", file=sys.stderr)
+        return 1
+    now = datetime.now()
+    for doc_id in store.due_trackers(now + within):
+        tracker = store.trackers[doc_id]
+        info = tracker.info
+        print(f"{doc_id:>4}  {Tracker.format_dt(info['next_expected_completion'], long=True)}  {due_state(info, now):<4}  {tracker.name}")
+    return 0
+
+
+def agenda(store, args) -> int:
+    from .core import Tracker
+    ok, within = Tracker.parse_td(args.within)
+    if not ok:
+        print(f"Could not parse '{args.within}': {within}", file=sys.stderr)
+        return 1
+    now = start = datetime.now()
+    if args.start:
+        ok, start = Tracker.parse_dt(args.start)
+        if not ok:
+            print(f"Could not parse '{args.start}': {start}", file=sys.stderr)
+            return 1
+    # printed as they are found, releasing the trackers as they are printed
+    for count, doc_id in enumerate(store.agenda_trackers(start, start + within), 1):
+        tracker = store.trackers[doc_id]
+        info = tracker.info
+        print(f"{doc_id:>4}  {Tracker.format_dt(info['early'], long=True)}  {Tracker.format_dt(info['next_expected_completion'], long=True)}  "
+              f"{Tracker.format_dt(info['tardy'], long=True)}  {due_state(info, now):<4}  {tracker.name}")
+        if count % store.RELEASE_EVERY == 0:
+            store.release()
+    return 0
+
+
+def show(store, args) -> int:
+    from .core import NON_PRINTING_CHAR
+    doc_id = find_tracker(store, args.tracker)
+    print(store.trackers[doc_id].get_tracker_info().replace(NON_PRINTING_CHAR, ''))
+    return 0
+
+
+def export(store, args) -> int:
+    from .transfer import export_trackers, guess_format
+    fmt = args.format or guess_format(args.file)
+    if args.file == '-':
+        num_trackers, num_completions = export_trackers(store, sys.stdout, fmt)
+    else:
+        with open(args.file, 'w', newline='' if fmt == 'csv' else None, encoding='utf-8') as out:
+            num_trackers, num_completions = export_trackers(store, out, fmt)
+    print(f"exported {num_trackers} trackers with {num_completions} completions", file=sys.stderr)
+    return 0
+
+
+def import_(store, args) -> int:
+    from .core import logger
+    from .transfer import import_trackers
+    try:
+        num_trackers, num_completions, errors = import_trackers(
+            store, args.file, args.format, args.workers, restart=args.restart, logger=logger)
+    except (OSError, ValueError) as e:
+        print(f"Could not import {args.file}: {e}", file=sys.stderr)
+        return 1
+    for msg in errors:
+        print(f"skipped {msg}", file=sys.stderr)
+    print(f"imported {num_trackers} trackers with {num_completions} completions", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def pack(store, args) -> int:
+    from .core import logger
+    from .backup import pack_database
+    days = max(store.settings.get('pack_days', 7), 0)
+    before, after = pack_database(store.db, args.home, days, logger)
+    print(f"packed {os.path.join(args.home, 'trf.fs')} keeping {days} days of history: {before} -> {after} bytes")
+    return 0
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='trf', description="Record and query trf trackers without starting the interface.")
+    parser.add_argument('--home', default=None, help="the trf home directory, by default TRFHOME or the current directory")
+    parser.add_argument('--log-level', type=int, default=20, help="10 debug, 20 info, 30 warning or 40 error")
+    parser.add_argument('--server', action='store_true', help="share the database with other trf processes through a server, started if need be")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('record', help="record a completion")
+    p.add_argument('tracker', help="the id or name of the tracker")
+    p.add_argument('when', help="the datetime of the completion, e.g. 'now' or '3p wed'")
+    p.add_argument('adjustment', nargs='?', default='', help="an optional adjustment to the interval, e.g. '-1d'")
+    p.set_defaults(func=record, read_only=False)
+
+    p = subparsers.add_parser('due', help="list the trackers expected within a period")
+    p.add_argument('--within', default='0m', help="a period such as '3d' or '2d12h', by default only those already expected")
+    p.set_defaults(func=due, read_only=True)
+
+    p = subparsers.add_parser('agenda', help="list the trackers that may be due within a period")
+    p.add_argument('--start', default=None, help="the start of the period, e.g. 'mon 9a', by default now")
+    p.add_argument('--within', default='7d', help="the length of the period, e.g. '72h' or '2d12h', by default 7d")
+    p.set_defaults(func=agenda, read_only=True)
+
+    p = subparsers.add_parser('show', help="show the details of a tracker")
+    p.add_argument('tracker', help="the id or name of the tracker")
+    p.set_defaults(func=show, read_only=True)
+
+    p = subparsers.add_parser('export', help="write all trackers with their histories as JSON lines or CSV")
+    p.add_argument('file', nargs='?', default='-', help="the file to write, by default stdout")
+    p.add_argument('--format', choices=('jsonl', 'csv'), default=None, help="by default csv for a .csv file and otherwise jsonl")
+    p.set_defaults(func=export, read_only=True)
+
+    p = subparsers.add_parser('import', help="add the trackers in a file written by export")
+    p.add_argument('file', help="the file to read, or - for stdin")
+    p.add_argument('--format', choices=('jsonl', 'csv'), default=None, help="by default csv for a .csv file and otherwise jsonl")
+    p.add_argument('--workers', type=int, default=None, help="processes parsing records, 0 to parse in this process, by default one per cpu")
+    p.add_argument('--restart', action='store_true', help="import from the start instead of resuming an interrupted import")
+    p.set_defaults(func=import_, read_only=False)
+
+    p = subparsers.add_parser('pack', help="discard the revisions older than the pack_days setting")
+    p.set_defaults(func=pack, read_only=False)
+    return parser
+
+
+def main(argv: list = None) -> int:
+    parser = make_parser()
+    # an adjustment such as -1d looks like an option to argparse
+    args, extra = parser.parse_known_args(argv)
+    if extra:
+        if args.command == 'record' and not args.adjustment and len(extra) == 1:
+            args.adjustment = extra[0]
+        else:
+            parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.home = trf_home = args.home or os.environ.get('TRFHOME') or os.getcwd()
+    store = open_store(trf_home, args.log_level, args.read_only, args.server)
+    try:
+        return args.func(store, args)
+    finally:
+        store.close()
@@ -0,0 +1,1860 @@
+# trf/core.py
+"""
+The trackers and their storage, independent of the user interface.
+
+Nothing here imports prompt_toolkit so this module can be used by the
+headless commands in trf/cli.py, by scripts and by services embedding trf:
+
+    from trf.core import TrackerStore
+    store = TrackerStore.open('/path/to/trf.fs')
+    for doc_id in store.due_trackers(datetime.now()):
+        print(store.trackers[doc_id].name)
+    store.close()
+
+ZODB and BTrees are only imported when a database is opened so importing
+this module is quick. A ZODB connection, and the trackers loaded through
+it, must only be used by one thread; see TrackerStore.connect().
+"""
+from typing import List, Any
+from array import array
+from contextlib import contextmanager
+from functools import wraps
+from datetime import date, datetime, timedelta
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import random
+import re
+import shutil
+import sys
+import textwrap
+import time
+from weakref import WeakSet
+from persistent import Persistent
+import transaction
+from .forecast import refresh_forecasts
+from .history import History, encode_dt, encode_td, decode_td
+
+# configured by setup_logging()
+logger = logging.getLogger()
+
+def setup_logging(trf_home, log_level=logging.INFO, backup_count=7):
+    """
+    Set up logging with daily rotation and a specified log level.
+
+    Args:
+        trf_home (str): The home directory for storing log files.
+        log_level (int): The log level (e.g., logging.DEBUG, logging.INFO).
+        backup_count (int): Number of backup log files to keep.
+    """
+    log_dir = os.path.join(trf_home, "logs")
+
+    # Ensure the logs directory exists
+    os.makedirs(log_dir, exist_ok=True)
+
+    logfile = os.path.join(log_dir, "trf.log")
+
+    # Create a TimedRotatingFileHandler for daily log rotation
+    handler = TimedRotatingFileHandler(
+        logfile, when="midnight", interval=1, backupCount=backup_count
+    )
+
+    # Set the suffix to add the date and ".log" extension to the rotated files
+    handler.suffix = "%y%m%d.log"
+
+    # Create a formatter
+    formatter = logging.Formatter(
+        fmt='--- %(asctime)s - %(levelname)s - %(module)s.%(funcName)s\n    %(message)s',
+        datefmt="%y-%m-%d %H:%M:%S"
+    )
+
+    # Set the formatter to the handler
+    handler.setFormatter(formatter)
+
+    # Define a custom namer function to change the log file naming format
+    def custom_namer(filename):
+        # Replace "tracker.log." with "tracker-" in the rotated log filename
+        return filename.replace("trf.log.", "trf")
+
+    # Set the handler's namer function
+    handler.namer = custom_namer
+
+    # Get the root logger
+    logger = logging.getLogger()
+    logger.setLevel(log_level)
+
+    # Clear any existing handlers (if needed)
+    if logger.hasHandlers():
+        logger.handlers.clear()
+
+    # Add the TimedRotatingFileHandler to the logger
+    logger.addHandler(handler)
+
+    logger.info("Logging setup complete.")
+    logging.info(f"\n### Logging initialized at level {log_level} ###")
+
+    return logger
+
+# classes pickled by earlier versions under the module they were defined in
+moved_classes = {
+    ('trf.trf', 'Tracker'): 'Tracker',
+}
+
+def class_factory(connection, modulename, globalname):
+    """
+    Find the class of a pickled object. Trackers stored when Tracker was
+    defined in trf.trf are loaded from this module instead so that loading
+    them does not import the user interface.
+    """
+    if (modulename, globalname) in moved_classes:
+        return globals()[moved_classes[(modulename, globalname)]]
+    from ZODB.broken import find_global
+    return find_global(modulename, globalname)
+
+def init_db(db_path, read_only=False, server=False):
+    """
+    Initialize the ZODB database using the specified file. A read only
+    database does not take the lock on the file and so can be opened while
+    trf is running.
+
+    With server, or whenever a server for the file is already running, the
+    database is opened as a client of the server instead, starting it if
+    need be, so that other trf processes can use it at the same time, see
+    server.py.
+    """
+    import ZODB, ZODB.FileStorage
+    from .server import is_running, socket_path, connect
+    trf_home = os.path.dirname(os.path.abspath(db_path))
+    if server or is_running(socket_path(trf_home)):
+        storage = connect(trf_home, read_only=read_only)
+    else:
+        # backups are handled by rotate_backups, so packing need not keep a
+        # copy of the unpacked file as trf.fs.old
+        storage = ZODB.FileStorage.FileStorage(db_path, pack_keep_old=False, read_only=read_only)
+    db = ZODB.DB(storage, class_factory=class_factory)
+    connection = db.open()
+    root = connection.root()
+    return storage, db, connection, root, transaction
+
+
+def close_db(db, connection):
+    """
+    Close the ZODB database and its connection.
+    """
+    connection.close()
+    db.close()
+
+def default_settings():
+    """
+    Return the default settings as a CommentedMap so that the comments are
+    shown when the settings are edited. ruamel.yaml is only imported when
+    this is first called.
+    """
+    from ruamel.yaml.comments import CommentedMap
+    # Create a CommentedMap, which behaves like a Python dictionary but supports comments
+    settings_map = CommentedMap({
+        'ampm': True,
+        'yearfirst': True,
+        'dayfirst': False,
+        'η': 2,
+        'window': 12,
+        'pack_days': 7,
+        'backup_compression': 'deflate',
+        'backup_level': 6,
+        'full_backup_days': 7,
+        'cache_size': 2000,
+        'cache_mb': 32,
+    })
+    # Add comments to the dictionary
+    settings_map.yaml_set_comment_before_after_key(
+        'ampm',
+        before='trf settings\n\n[ampm] Display 12-hour times with AM or PM if true, \notherwise display 24-hour times'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'yearfirst',
+        before='\n[yearfirst] When parsing ambiguous dates, assume the year is first \nif true, otherwise assume the month is first'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'dayfirst',
+        before='\n[dayfirst] When parsing ambiguous dates, assume the day is first \nif true, otherwise assume the month is first'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'η',
+        before='\n[η] Use this integer multiple of "spread" for setting the \ntimely-to-tardy next confidence interval'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'window',
+        before='\n[window] Base the forecasts on at most this many of the latest \nintervals between completions'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'pack_days',
+        before='\n[pack_days] When the database is packed, just before each full backup, \nkeep the history of changes made within this many days. Use -1 to never \npack'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'backup_compression',
+        before='\n[backup_compression] The compression used for the daily backups: \nstored, deflate, bzip2 or lzma'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'backup_level',
+        before='\n[backup_level] The compression level, 0 (fastest) to 9 (smallest)'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'full_backup_days',
+        before='\n[full_backup_days] Make a full backup when the last one is at least \nthis many days old. Daily backups in between hold only the changes \nsince the previous backup'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'cache_size',
+        before='\n[cache_size] Keep at most about this many trackers and other \ndatabase objects in memory. Those not recently listed are released \nand loaded again when needed'
+        )
+    settings_map.yaml_set_comment_before_after_key(
+        'cache_mb',
+        before='\n[cache_mb] Also release objects once their estimated size exceeds \nthis many megabytes. Use 0 for no limit'
+        )
+    return settings_map
+
+
+# Non-printing character
+NON_PRINTING_CHAR = '\u200B'
+# Placeholder for spaces within special tokens
+PLACEHOLDER = '\u00A0'
+# Placeholder for hyphens to prevent word breaks
+NON_BREAKING_HYPHEN = '\u2011'
+# Placeholder for zero-width non-joiner
+ZWNJ = '\u200C'
+PLUS_OR_MINUS = '±'
+
+# For showing active page in pages, e.g.,  ○ ○ ⏺ ○ = page 3 of 4 pages
+OPEN_CIRCLE = '○'
+CLOSED_CIRCLE = '⏺'
+ETA = 'η'
+APPROX = '≈'
+
+UP = '↑'
+DOWN = '↓'
+RIGHT = '→'
+
+
+def wrap(text: str, indent: int = 3, width: int = shutil.get_terminal_size()[0] - 3):
+    # Preprocess to replace spaces within specific "@\S" patterns with PLACEHOLDER
+    text = preprocess_text(text)
+    numbered_list = re.compile(r'^\d+\.\s.*')
+
+    # Split text into paragraphs
+    paragraphs = text.split('\n')
+
+    # Wrap each paragraph
+    wrapped_paragraphs = []
+    for para in paragraphs:
+        leading_whitespace = re.match(r'^\s*', para).group()
+        initial_indent = leading_whitespace
+
+        # Determine subsequent_indent based on the first non-whitespace character
+        stripped_para = para.lstrip()
+        if stripped_para.startswith(('+', '-', '*', '%', '!', '~')):
+            subsequent_indent = initial_indent + ' ' * 2
+        elif stripped_para.startswith(('@', '&')):
+            subsequent_indent = initial_indent + ' ' * 3
+        # elif stripped_para and stripped_para[0].isdigit():
+        elif stripped_para and numbered_list.match(stripped_para):
+            subsequent_indent = initial_indent + ' ' * 3
+        else:
+            subsequent_indent = initial_indent + ' ' * indent
+
+        wrapped = textwrap.fill(
+            para,
+            initial_indent='',
+            subsequent_indent=subsequent_indent,
+            width=width)
+        wrapped_paragraphs.append(wrapped)
+
+    # Join paragraphs with newline followed by non-printing character
+    wrapped_text = ('\n' + NON_PRINTING_CHAR).join(wrapped_paragraphs)
+
+    # Postprocess to replace PLACEHOLDER and NON_BREAKING_HYPHEN back with spaces and hyphens
+    wrapped_text = postprocess_text(wrapped_text)
+
+    return wrapped_text
+
+def preprocess_text(text):
+    # Regex to find "@\S" patterns and replace spaces within the pattern with PLACEHOLDER
+    text = re.sub(r'(@\S+\s\S+)', lambda m: m.group(0).replace(' ', PLACEHOLDER), text)
+    # Replace hyphens within words with NON_BREAKING_HYPHEN
+    text = re.sub(r'(\S)-(\S)', lambda m: m.group(1) + NON_BREAKING_HYPHEN + m.group(2), text)
+        # logger.debug(f"listing {self.active_page = }, {start_index = }, {end_index = }")
+    return text
+
+def postprocess_text(text):
+    text = text.replace(PLACEHOLDER, ' ')
+    text = text.replace(NON_BREAKING_HYPHEN, '-')
+    return text
+
+def unwrap(wrapped_text):
+    # Split wrapped text into paragraphs
+    paragraphs = wrapped_text.split('\n' + NON_PRINTING_CHAR)
+
+    # Replace newlines followed by spaces in each paragraph with a single space
+    unwrapped_paragraphs = []
+    for para in paragraphs:
+        unwrapped = re.sub(r'\n\s*', ' ', para)
+        unwrapped_paragraphs.append(unwrapped)
+
+    # Join paragraphs with original newlines
+    unwrapped_text = '\n'.join(unwrapped_paragraphs)
+
+    return unwrapped_text
+
+# Parsing completions. The formats trf itself writes, "%Y-%m-%d %H:%M",
+# "%y%m%dT%H%M" and periods such as "+1d2h", are matched by the compiled
+# patterns below and converted directly. Anything else is passed to dateutil,
+# which is imported, with its parserinfo, the first time it is needed.
+PERIOD_REGEX = re.compile(r'(([+-]?)(\d+)([dhms]))+?')
+EXPANDED_PERIOD_REGEX = re.compile(r'(([+-]?)(\d+)\s(day|hour|minute|second)s?)+?')
+LONG_DT_REGEX = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})(?:\s+(\d{1,2}):(\d{2}))?$')
+SHORT_DT_REGEX = re.compile(r'(\d{2})(\d{2})(\d{2})T(\d{2})(\d{2})$')
+COMPLETION_SEP_REGEX = re.compile(r',\s+')
+
+PERIOD_UNITS = {
+    'd': 'days',
+    'day': 'days',
+    'days': 'days',
+    'h': 'hours',
+    'hour': 'hours',
+    'hours': 'hours',
+    'm': 'minutes',
+    'minute': 'minutes',
+    'minutes': 'minutes',
+    's': 'seconds',
+    'second': 'seconds',
+    'seconds': 'seconds',
+}
+
+# set by load_dateutil()
+dateutil_parse = None
+dateutil_parserinfo = None
+
+def load_dateutil():
+    """
+    Import dateutil's parser on first use and return (parse, parserinfo).
+    """
+    global dateutil_parse, dateutil_parserinfo
+    if dateutil_parse is None:
+        from dateutil.parser import parse, parserinfo
+        dateutil_parserinfo = parserinfo(dayfirst=False, yearfirst=True)
+        dateutil_parse = parse
+    return dateutil_parse, dateutil_parserinfo
+
+def two_digit_year(year: int) -> int:
+    """
+    The year within 50 years of today for a two digit year, as dateutil
+    chooses it.
+    """
+    this_year = datetime.now().year
+    year += this_year - this_year % 100
+    if year >= this_year + 50:
+        year -= 100
+    elif year < this_year - 50:
+        year += 100
+    return year
+
+def fast_parse_dt(dt: str):
+    """
+    Return the datetime for dt if it is in one of the formats trf writes and
+    otherwise None.
+    """
+    m = LONG_DT_REGEX.match(dt)
+    if m:
+        year, month, day, hour, minute = m.groups()
+        year = int(year)
+    else:
+        m = SHORT_DT_REGEX.match(dt)
+        if not m:
+            return None
+        year, month, day, hour, minute = m.groups()
+        year = two_digit_year(int(year))
+    try:
+        return datetime(year, int(month), int(day), int(hour or 0), int(minute or 0))
+    except ValueError:
+        # leave the message to dateutil
+        return None
+
+def sort_key(tracker):
+    # Sorting by None first (using doc_id as secondary sorting)
+    if tracker.next_expected_completion is None:
+        return (0, tracker.doc_id)
+    # Sorting by datetime for non-None values
+    else:
+        return (1, tracker.next_expected_completion)
+
+class Tracker(Persistent):
+    max_history = 12 # completions shown in the details, depending on width, 6 rows of 2, 4 rows of 3, 3 rows of 4, 2 rows of 6
+    # η and the number of intervals in the forecast window for a tracker
+    # that has not been added to a database
+    default_eta = 2
+    default_window = 12
+    # the keys of the tracker in the sort and forecast indexes of its
+    # database, see TrackerStore.reindex(), and the further keys left in
+    # them when its changes were merged with another client's, see
+    # _p_resolveConflict()
+    index_keys = None
+    merged_keys = None
+
+    @classmethod
+    def format_dt(cls, dt: Any, long=False) -> str:
+        if not isinstance(dt, datetime):
+            return ""
+        if long:
+            return dt.strftime("%Y-%m-%d %H:%M")
+        return dt.strftime("%y%m%dT%H%M")
+
+    @classmethod
+    def td2seconds(cls, td: timedelta) -> str:
+        if not isinstance(td, timedelta):
+            return ""
+        return f"{round(td.total_seconds())}"
+
+    @classmethod
+    def format_td(cls, td: timedelta, short=0):
+        if not isinstance(td, timedelta):
+            return None
+        sign = '+' if td.total_seconds() >= 0 else '-'
+        total_seconds = abs(int(td.total_seconds()))
+        if total_seconds == 0:
+            # return '0 minutes '
+            return '0m' if short else '+0m'
+        total_seconds = abs(total_seconds)
+        try:
+            until = []
+            days = hours = minutes = 0
+            if total_seconds:
+                minutes = total_seconds // 60
+                if minutes >= 60:
+                    hours = minutes // 60
+                    minutes = minutes % 60
+                if hours >= 24:
+                    days = hours // 24
+                    hours = hours % 24
+            if days:
+                until.append(f'{days}d')
+            if hours:
+                until.append(f'{hours}h')
+            if minutes:
+                until.append(f'{minutes}m')
+            if not until:
+                until.append('0m')
+            if short == 1:
+                ret = ''.join(until[:2]) if short else sign + ''.join(until)
+            elif not short:
+                ret = sign + ''.join(until)
+            elif short == 2:
+                ret = f"{round(days + hours/24 + minutes/(60*24), 1)}"
+            elif short == 3:
+                ret = f"{round(days + hours/24 + minutes/(60*24), 1)}d"
+            return ret
+        except Exception as e:
+            logger.error(f'{td}: {e}')
+            return ''
+
+    @classmethod
+    def format_completion(cls, completion: tuple[datetime, timedelta], long=False)->str:
+        dt, td = completion
+        return f"{cls.format_dt(dt, long=True)}, {cls.format_td(td)}"
+
+    @classmethod
+    def parse_td(cls, td:str)->tuple[bool, timedelta]:
+        """\
+        Take a period string and return a corresponding timedelta.
+        Examples:
+            parse_duration('-2w3d4h5m')= Duration(weeks=-2,days=3,hours=4,minutes=5)
+            parse_duration('1h30m') = Duration(hours=1, minutes=30)
+            parse_duration('-10m') = Duration(minutes=10)
+        where:
+            d: days
+            h: hours
+            m: minutes
+            s: seconds
+
+        >>> 3*60*60+5*60
+        11100
+        >>> parse_duration("2d-3h5m")[1]
+        Duration(days=1, hours=21, minutes=5)
+        >>> datetime(2015, 10, 15, 9, 0, tz='local') + parse_duration("-25m")[1]
+        DateTime(2015, 10, 15, 8, 35, 0, tzinfo=ZoneInfo('America/New_York'))
+        >>> datetime(2015, 10, 15, 9, 0) + parse_duration("1d")[1]
+        DateTime(2015, 10, 16, 9, 0, 0, tzinfo=ZoneInfo('UTC'))
+        >>> datetime(2015, 10, 15, 9, 0) + parse_duration("1w-2d+3h")[1]
+        DateTime(2015, 10, 20, 12, 0, 0, tzinfo=ZoneInfo('UTC'))
+        """
+
+        kwds = {
+            'days': 0,
+            'hours': 0,
+            'minutes': 0,
+            'seconds': 0,
+        }
+
+        # logger.debug(f"parse_td: {td}")
+        m = PERIOD_REGEX.findall(td)
+        if not m:
+            m = EXPANDED_PERIOD_REGEX.findall(str(td))
+            if not m:
+                return False, f"Invalid period string '{td}'"
+        for g in m:
+            if g[3] not in PERIOD_UNITS:
+                return False, f'Invalid period argument: {g[3]}'
+
+            num = -int(g[2]) if g[1] == '-' else int(g[2])
+            if num:
+                kwds[PERIOD_UNITS[g[3]]] = num
+        td = timedelta(**kwds)
+        return True, td
+
+
+    @classmethod
+    def parse_dt(cls, dt: str = "") -> tuple[bool, datetime]:
+        # if isinstance(dt, datetime):
+        #     return True, dt
+        if dt.strip() == "now":
+            dt = datetime.now()
+            return True, dt
+        elif isinstance(dt, str) and dt:
+            fast = fast_parse_dt(dt.strip())
+            if fast is not None:
+                return True, fast
+            parse, pi = load_dateutil()
+            try:
+                dt = parse(dt, parserinfo=pi)
+                return True, dt
+            except Exception as e:
+                msg = f"Error parsing datetime: {dt}\ne {repr(e)}"
+                return False, msg
+        else:
+            return False, "Invalid datetime"
+
+    @classmethod
+    def parse_completion(cls, completion: str) -> tuple[datetime, timedelta]:
+        parts = [x.strip() for x in COMPLETION_SEP_REGEX.split(completion)]
+        dt = parts.pop(0)
+        if parts:
+            td = parts.pop(0)
+        else:
+            td = timedelta(0)
+
+        # logger.debug(f"parts: {dt}, {td}")
+        msg = []
+        if not dt:
+            return False, ""
+        dtok, dt = cls.parse_dt(dt)
+        if not dtok:
+            msg.append(dt)
+        if td:
+            # logger.debug(f"{td = }")
+            tdok, td = cls.parse_td(td)
+            if not tdok:
+                msg.append(td)
+        else:
+            # no td specified
+            td = timedelta(0)
+            tdok = True
+        if dtok and tdok:
+            return True, (dt, td)
+        return False, "; ".join(msg)
+
+    @classmethod
+    def parse_completions(cls, completions: List[str]) -> List[tuple[datetime, timedelta]]:
+        completions = [x.strip() for x in completions.split('\n') if x.strip()]
+        output = []
+        msg = []
+        for completion in completions:
+            ok, x = cls.parse_completion(completion)
+            if ok:
+                output.append(x)
+            else:
+                msg.append(x)
+        if msg:
+            return False, "; ".join(msg)
+        return True, output
+
+
+    def __init__(self, name: str, doc_id: int) -> None:
+        self.doc_id = int(doc_id)
+        self.name = name
+        self.history = History()
+        # the intervals of the forecast window and their sum in microseconds,
+        # kept up to date as completions are recorded, see window_micros()
+        self.intervals = array('q')
+        self.interval_sum = 0
+        self.window_size = None
+        self.created = datetime.now()
+        self.modified = self.created
+        logger.info(f"Created tracker {self.name} ({self.doc_id})")
+
+
+    def __setstate__(self, state):
+        # info is derived from history and is no longer persisted, drop the
+        # copy stored by earlier versions
+        state.pop('_info', None)
+        if isinstance(state.get('history'), list):
+            # earlier versions kept at most max_history completions in a list;
+            # the window is computed from the history until the tracker is
+            # next changed
+            state['history'] = History(state['history'])
+            state['intervals'] = array('q')
+            state['interval_sum'] = 0
+            state['window_size'] = None
+        elif isinstance(state.get('intervals'), list):
+            # kept as timedeltas before
+            state['intervals'] = array('q', (encode_td(td) for td in state['intervals']))
+            state['interval_sum'] = encode_td(state['interval_sum'])
+        super().__setstate__(state)
+
+    def _p_resolveConflict(self, old: dict, committed: dict, new: dict) -> dict:
+        """
+        Merge the states of a tracker changed at the same time by two clients
+        of a shared database, see server.py, or raise ConflictError if they
+        cannot be merged. This runs in the storage with the pickled states, so
+        the history blocks are only references and are never loaded.
+
+        Completions added to the tail of the history by either client are
+        kept, and the forecast window is rebuilt from the merged history when
+        it is next needed. Changes to the blocks, removed completions and
+        different changes to any other attribute are left as conflicts.
+
+        Each client has moved the tracker in the indexes as well, and the
+        buckets of the indexes keep the keys of both, see index.py. The
+        merged keys record them until the client whose commit was merged
+        reindexes the tracker, see TrackerStore.reindex_merged().
+        """
+        from ZODB.POSException import ConflictError
+        resolved = {}
+        for key in set(committed) | set(new):
+            if key in ('history', 'intervals', 'interval_sum', 'window_size', 'modified',
+                       'index_keys', 'merged_keys'):
+                continue
+            was, theirs, ours = old.get(key), committed.get(key), new.get(key)
+            if theirs == ours or ours == was:
+                resolved[key] = theirs
+            elif theirs == was:
+                resolved[key] = ours
+            else:
+                raise ConflictError(f"{key} changed by both")
+        resolved['history'] = History.merge_tails(old['history'], committed['history'], new['history'])
+        resolved['intervals'] = array('q')
+        resolved['interval_sum'] = 0
+        resolved['window_size'] = None
+        resolved['modified'] = max(committed['modified'], new['modified'])
+        index_keys, merged_keys = Tracker.merge_index_keys(old, committed, new)
+        if index_keys:
+            resolved['index_keys'] = index_keys
+        if merged_keys:
+            resolved['merged_keys'] = merged_keys
+        return resolved
+
+    @staticmethod
+    def merge_index_keys(old: dict, committed: dict, new: dict) -> tuple[dict, dict]:
+        """
+        The keys of a tracker in each index once the buckets changed by both
+        clients have been merged, see index.merge_set_states(), as the keys
+        of committed where they remain and the others as merged keys.
+        """
+        def keys(state, mode):
+            found = ((state.get('index_keys') or {}).get(mode),
+                     *(state.get('merged_keys') or {}).get(mode, ()))
+            return {key for key in found if key is not None}
+
+        modes = set()
+        for state in (old, committed, new):
+            modes.update(state.get('index_keys') or {}, state.get('merged_keys') or {})
+        index_keys = {}
+        merged_keys = {}
+        for mode in modes:
+            was, theirs, ours = keys(old, mode), keys(committed, mode), keys(new, mode)
+            present = (was & theirs & ours) | (theirs - was) | (ours - was)
+            key = None
+            for state in (committed, new):
+                if (state.get('index_keys') or {}).get(mode) in present:
+                    key = state['index_keys'][mode]
+                    break
+            if key is None and present:
+                key = min(present)
+            if key is not None:
+                index_keys[mode] = key
+            if present - {key}:
+                merged_keys[mode] = sorted(present - {key})
+        return index_keys, merged_keys
+
+    @property
+    def info(self):
+        # Lazy initialization with re-computation logic. The computed info is
+        # kept in a volatile (_v_) attribute so that computing it never marks
+        # the tracker as changed and it is never written to the database.
+        # Only the values that depend on η are refreshed when η changes.
+        info = getattr(self, '_v_info', None)
+        if info is None:
+            # logger.debug(f"Computing info for {self.name} ({self.doc_id})")
+            info = self.compute_info()
+        eta = self.get_eta()
+        if info['eta'] != eta:
+            self.apply_eta(info, eta)
+        return info
+
+    def compute_info(self):
+        logger.debug(f"Computing info for {self.name} ({self.doc_id})")
+        intervals, interval_sum = self.window_micros()
+        average_interval = spread = None
+        if intervals:
+            average_interval = decode_td(interval_sum) / len(intervals)
+        if len(intervals) >= 2:
+            average = encode_td(average_interval)
+            spread = decode_td(sum(abs(x - average) for x in intervals)) / len(intervals)
+        info = self.set_info([decode_td(x) for x in intervals], average_interval, spread)
+        return self.apply_eta(info, self.get_eta())
+
+    @staticmethod
+    def intervals_of(completions: list) -> list:
+        #           x[i+1]               y[i+1]               x[i]
+        return [completions[i+1][0] + completions[i+1][1] - completions[i][0] for i in range(len(completions)-1)]
+
+    def window_micros(self) -> tuple[array, int]:
+        """
+        The intervals between the latest completions used for the forecast,
+        at most the window setting of them, together with their sum, all in
+        microseconds. These are maintained by the methods that change the
+        history, so this only reads the latest completions if the window
+        setting has changed since.
+        """
+        window = self.get_window()
+        if self.window_size == window:
+            return self.intervals, self.interval_sum
+        intervals = array('q', (encode_td(td) for td in Tracker.intervals_of(self.history.latest(window + 1))))
+        return intervals, sum(intervals)
+
+    def window_intervals(self) -> tuple[list, timedelta]:
+        """
+        The intervals of window_micros() and their sum as timedeltas.
+        """
+        intervals, interval_sum = self.window_micros()
+        return [decode_td(us) for us in intervals], decode_td(interval_sum)
+
+    def rebuild_window(self):
+        self.window_size = None
+        self.intervals, self.interval_sum = self.window_micros()
+        self.window_size = self.get_window()
+
+    def update_window(self, completion: tuple[datetime, timedelta], previous: tuple[datetime, timedelta]):
+        """
+        Add the interval ending with completion, the latest, to the window
+        and drop the oldest interval if the window is full.
+        """
+        window = self.get_window()
+        if self.window_size != window:
+            self.rebuild_window()
+            return
+        interval = encode_dt(completion[0]) + encode_td(completion[1]) - encode_dt(previous[0])
+        self.intervals.append(interval)
+        self.interval_sum += interval
+        if len(self.intervals) > window:
+            self.interval_sum -= self.intervals.pop(0)
+
+    def get_eta(self):
+        """
+        The η setting of the database holding this tracker. It is read
+        through the connection that loaded the tracker so that every
+        TrackerStore, in whatever thread, uses its own settings.
+        """
+        return self.get_setting('η', Tracker.default_eta)
+
+    def get_window(self):
+        return self.get_setting('window', Tracker.default_window)
+
+    def get_setting(self, key, default):
+        jar = self._p_jar
+        if jar is None:
+            return default
+        return jar.root()['settings'].get(key, default)
+
+    def set_info(self, intervals: list, average_interval: timedelta, spread: timedelta, next_expected: datetime = None, labels: dict = None):
+        """
+        Build and store the info dict from the intervals of the history, their
+        average and their mean absolute deviation (spread). This is shared by
+        compute_info() and the batch engine in forecast.py which can also
+        supply the next expected completion and the format_td(..., 2) labels
+        for 'average' and 'spread' it has computed.
+
+        Nothing stored here depends on η. The values that do, 'n_x_spread',
+        'n_spread', 'plus_or_minus' and the early, timely and tardy bounds,
+        are added by apply_eta() when the info is read.
+        """
+        if labels is None and intervals:
+            labels = {
+                'average': Tracker.format_td(average_interval, 2),
+                'spread': Tracker.format_td(spread, 2),
+            }
+
+        if not self.history:
+            result = dict(
+                last_completion=None, 
+                num_completions=0, 
+                num_intervals=0, 
+                average_interval=timedelta(minutes=0), 
+                last_interval=timedelta(minutes=0), 
+                spread=timedelta(minutes=0), 
+                next_expected_completion=None,
+                early=None, 
+                timely=None, 
+                tardy=None, 
+                avg=None, 
+                plus_or_minus=f"{5*' '}~{5*' '}"
+                )
+        else:
+            result = dict(
+                last_completion=self.history[-1],
+                num_completions=len(self.history),
+                intervals=intervals,
+                num_intervals=len(intervals),
+                spread=timedelta(minutes=0),
+                last_interval=None,
+                average_interval=None,
+                next_expected_completion=None,
+                early=None,
+                timely=None,
+                tardy=None,
+                avg=None,
+                plus_or_minus=f"{5*' '}~{5*' '}",
+                )
+            if result['num_intervals'] > 0:
+                result['average_interval'] = average_interval
+                change = intervals[-1] - average_interval
+                direction = UP if change > timedelta(0) else DOWN if change < timedelta(0) else RIGHT
+                result['avg'] = f"{labels['average']}{direction}"
+                result['plus_or_minus'] = f"{Tracker.days_label(labels['average']): ^11}"
+                if next_expected is None:
+                    next_expected = result['last_completion'][0] + average_interval
+                result['next_expected_completion'] = next_expected
+            if result['num_intervals'] >= 2:
+                result['spread'] = spread
+        result['labels'] = labels
+        # the η that the values added by apply_eta() are for
+        result['eta'] = None
+
+        self._v_info = result
+
+        return result
+
+    @staticmethod
+    def days_label(label: str) -> str:
+        # the format_td(..., 3) version of a format_td(..., 2) label
+        return label if label == '0m' else f"{label}d"
+
+    @staticmethod
+    def apply_eta(info: dict, eta) -> dict:
+        """
+        Add the values of info that depend on η. This only multiplies the
+        spread and formats one label, so a change of η costs nothing until
+        the info of a tracker is next read.
+        """
+        info['eta'] = eta
+        if info['num_intervals'] >= 2:
+            labels = info['labels']
+            spread = info['spread']
+            n_x_spread = eta * spread
+            n_x_spread_label = Tracker.days_label(Tracker.format_td(n_x_spread, 2))
+            info['n_x_spread'] = n_x_spread
+            info['n_spread'] = f"{eta} × {Tracker.days_label(labels['spread'])} = {n_x_spread_label}"
+            info['plus_or_minus'] = f"{labels['average']: >5}{PLUS_OR_MINUS}{n_x_spread_label: <5}"
+        if info['num_intervals'] >= 1:
+            next_expected = info['next_expected_completion']
+            info['early'] = next_expected - (eta*2) * info['spread']
+            info['timely'] = next_expected - eta * info['spread']
+            info['tardy'] = next_expected + eta * info['spread']
+        return info
+
+    # XXX: Just for reference
+    def add_to_history(self, new_event):
+        self.history.add(new_event)
+        self.rebuild_window()
+        self.modified = datetime.now()
+        self.invalidate_info()
+        self._p_changed = True  # Mark object as changed in ZODB
+
+    def format_history(self)->str:
+        output = []
+        for completion in self.history:
+            output.append(Tracker.format_completion(completion, long=True))
+        return '\n  '.join(output)
+
+    def invalidate_info(self):
+        # Invalidate the cached dict so it will be recomputed on next access
+        self._v_info = None
+        self.compute_info()
+
+
+    def record_completion(self, completion: tuple[datetime, timedelta]):
+        ok, msg = True, ""
+        if not isinstance(completion, tuple) or len(completion) < 2:
+            completion = (completion, timedelta(0))
+        previous = self.history[-1] if self.history else None
+        if self.history.add(completion) and previous is not None:
+            self.update_window(completion, previous)
+        else:
+            # an earlier completion may change any of the intervals
+            self.rebuild_window()
+
+        # Notify ZODB that this object has changed
+        self.invalidate_info()
+        self.modified = datetime.now()
+        self._p_changed = True
+        return True, f"recorded completion for ..."
+
+    def rename(self, name: str):
+        original_name = self.name
+        self.name = name
+        self.invalidate_info()
+        self.modified = datetime.now()
+        self._p_changed = True
+        return True, f"renamed {self.doc_id} from {original_name} to {self.name}"
+
+    def record_completions(self, completions: list[tuple[datetime, timedelta]]):
+        self.history = History(
+            completion if isinstance(completion, tuple) and len(completion) >= 2 else (completion, timedelta(0))
+            for completion in completions)
+        self.rebuild_window()
+        self.invalidate_info()
+        self.modified = datetime.now()
+        self._p_changed = True
+        return True, f"recorded completions for ..."
+
+    def remove_completions(self):
+        self.history = History()
+        self.rebuild_window()
+        self.invalidate_info()
+        self.modified = datetime.now()
+        self._p_changed = True
+        return True, f"removed all completions for ..."
+
+
+    def edit_history(self):
+        if not self.history:
+            # logger.debug("No history to edit.")
+            return
+
+        # Display current history
+        for i, completion in enumerate(self.history):
+            logger.debug(f"{i + 1}. {self.format_completion(completion)}")
+
+        # Choose an entry to edit
+        try:
+            choice = int(input("Enter the number of the history entry to edit (or 0 to cancel): ").strip())
+            if choice == 0:
+                return
+            if choice < 1 or choice > len(self.history):
+                return
+            completions = list(self.history)
+            selected_comp = completions[choice - 1]
+
+            # Choose what to do with the selected entry
+            action = input("Do you want to (d)elete or (r)eplace this entry? ").strip().lower()
+
+            if action == 'd':
+                completions.pop(choice - 1)
+            elif action == 'r':
+                new_comp_str = input("Enter the replacement completion: ").strip()
+                ok, new_comp = self.parse_completion(new_comp_str)
+                if ok:
+                    completions[choice - 1] = new_comp
+                    self.record_completions(completions)
+                    return True, f"Entry replaced with {self.format_completion(new_comp)}"
+                else:
+                    return False, f"{new_comp}"
+            else:
+                return False, "Invalid action."
+
+            # record_completions sorts the history and notifies ZODB
+            self.record_completions(completions)
+
+        except ValueError:
+            logger.error("Invalid input. Please enter a number.")
+
+    def get_tracker_info(self):
+
+        info = self.info
+        # insert a placeholder to prevent date and time from being split across multiple lines when wrapping
+        # format_str = f"%y-%m-%d{PLACEHOLDER}%H:%M"
+        # logger.debug(f"{self.history = }")
+        history = [f"{Tracker.format_dt(x[0])} {Tracker.format_td(x[1])}" for x in self.history.latest(Tracker.max_history)]
+        history = ', '.join(history)
+        intervals = [f"{Tracker.format_td(x, 3)}" for x in info['intervals']] if info.get('intervals') else []
+        intervals = ', '.join(intervals) if intervals else ""
+        return wrap(f"""\
+ name:        {self.name}
+ doc_id:      {self.doc_id}
+ created:     {Tracker.format_dt(self.created)}
+ modified:    {Tracker.format_dt(self.modified)}
+ completions: ({info['num_completions']})
+    {history}
+ intervals:   ({info['num_intervals']})
+    {intervals}
+    average:  {info['avg']}
+    spread:   {Tracker.format_td(info['spread'], 3)}
+    η spread: {info.get('n_spread', '?')}
+ next:    {Tracker.format_dt(info['next_expected_completion'])}
+    early:    next - 2 × η spread = {Tracker.format_dt(info.get('early', '?'))}
+    timely:   next - η spread     = {Tracker.format_dt(info.get('timely', '?'))}
+    tardy:    next + η spread     = {Tracker.format_dt(info.get('tardy', '?'))}
+""", 0)
+
+
+# half the longest pause before the first retry of a change, in seconds
+CONFLICT_BACKOFF = 0.025
+
+def retried(method):
+    """
+    Run a TrackerStore method that commits again, up to CONFLICT_ATTEMPTS
+    times in all, if its commit conflicts with one made meanwhile by another
+    client of a shared database, see server.py. Each attempt starts a new
+    transaction and so sees the other client's changes, after a random
+    pause that doubles with each attempt, up to a second. Inside batch() the
+    method does not commit and is called once.
+    """
+    @wraps(method)
+    def retry(self, *args, **kwargs):
+        from ZODB.POSException import ConflictError
+        if self.shared and not self._batch_depth:
+            # start from the latest commits rather than from the view of the
+            # database when this store last committed, perhaps long ago
+            self.sync()
+        attempt = 1
+        while True:
+            try:
+                return method(self, *args, **kwargs)
+            except ConflictError as e:
+                if self._batch_depth:
+                    raise
+                self.num_conflicts += 1
+                if attempt < self.CONFLICT_ATTEMPTS:
+                    logger.info(f"{method.__name__} conflicted with another client, trying again")
+                    # clients that keep conflicting try again at different
+                    # times, and the view of the database is only renewed by
+                    # the abort below so that it is as fresh as possible
+                    time.sleep(random.uniform(0, min(CONFLICT_BACKOFF * 2 ** attempt, 1)))
+                self.abort()
+                if attempt >= self.CONFLICT_ATTEMPTS:
+                    logger.error(f"{method.__name__} failed after {attempt} conflicts: {e}")
+                    raise
+                attempt += 1
+    return retry
+
+
+class TrackerStore:
+    """
+    The trackers, their sort indexes and the settings kept in a ZODB
+    database, without any user interface. The methods that change a tracker
+    return (ok, msg) and commit unless called inside batch().
+
+        store = TrackerStore.open(db_path)
+        doc_id = store.add_tracker('fill bird feeders')
+        ok, msg = store.record_completion(doc_id, (datetime.now(), timedelta(0)))
+        store.close()
+    """
+    # the sort orders maintained in root['indexes']
+    sort_modes = ('next', 'last', 'subject', 'modified', 'id')
+    # the layout of the keys in the indexes, those of an earlier layout are
+    # built again by load_data()
+    INDEX_VERSION = 4
+    # while walking every tracker, release those beyond the cache limits
+    # after each this many, see release()
+    RELEASE_EVERY = 1000
+    # attempts at a change that conflicts with other clients, see retried()
+    CONFLICT_ATTEMPTS = 10
+    # the most doc_ids listed with a commit for other clients, see commit()
+    MAX_LISTED = 1000
+
+    def __init__(self, storage, db, connection, root, transaction) -> None:
+        # Ensure that all required arguments are provided during the first initialization
+        if db is None or connection is None or root is None or transaction is None:
+            raise ValueError("db, connection, root, and transaction must be provided on the first initialization.")
+
+        # Initialize instance attributes
+        self.storage = storage
+        self.db = db
+        self.connection = connection
+        self.root = root
+        self.transaction = transaction
+        # close() only closes the database if this store opened it
+        self.owns_db = True
+        self.trackers = {}
+        self.indexes = {}
+        # built by search_trackers() when first needed
+        self._name_index = None
+        # the forecast and spread of each tracker, see reindex()
+        self.forecasts = None
+        # built by due_states() when first needed
+        self.due = None
+        # unit of work and commit accounting, see batch() and commit()
+        self._batch_depth = 0
+        self.num_commits = 0
+        self.last_commit_bytes = 0
+        self.total_commit_bytes = 0
+        self.num_conflicts = 0
+        # a client of a shared database, the last transaction it has seen
+        # and a transaction at or after the last one its connection shows,
+        # see sync() and view_moved()
+        from .server import is_client
+        self.shared = is_client(storage)
+        self.client_id = f"{os.getpid()}:{id(self)}"
+        self.last_seen = storage.lastTransaction()
+        self.view_bound = self.last_seen
+        # the doc_ids reindexed or unindexed since the last commit, or None
+        # if there are too many to list, see commit()
+        self._touched = set()
+        # trackers found in memory and loaded from the storage by get_trackers()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # the trackers used through this store that are still in memory,
+        # see loaded_trackers()
+        self.used_trackers = WeakSet()
+        logger.info(f"using data from\n  {self.db}")
+        self.load_data()
+        self.view_moved()
+
+    @classmethod
+    def open(cls, db_path: str, read_only: bool = False, server: bool = False):
+        """
+        Open the database in db_path and return a store for it, through the
+        server for db_path if server or if one is running, see init_db().
+        """
+        return cls(*init_db(db_path, read_only, server))
+
+    def connect(self):
+        """
+        Return a TrackerStore for the same database on a new connection,
+        for use by another thread. Call it in the thread that will use the
+        store; the connection joins that thread's transactions. Closing the
+        returned store leaves the database open.
+        """
+        connection = self.db.open()
+        store = TrackerStore(self.storage, self.db, connection, connection.root(), self.transaction)
+        store.owns_db = False
+        return store
+
+    @property
+    def settings(self) -> dict:
+        # looked up each time since release() may turn the root into a
+        # ghost that is loaded again with a new settings dict
+        return self.root['settings']
+
+    def load_data(self):
+        """
+        Load the trackers and their indexes, first upgrading a database
+        written by an earlier version. A read only database cannot be
+        upgraded, so one that needs it is not loaded at all.
+        """
+        from BTrees.IOBTree import IOBTree
+        from .index import SortIndex, ForecastIndex
+        read_only = self.storage.isReadOnly()
+        if read_only and ('settings' not in self.root or not isinstance(self.root.get('trackers'), IOBTree)
+                          or self.indexes_outdated()):
+            raise RuntimeError(f"{self.storage.getName()} has to be upgraded by this version of trf "
+                               f"and cannot be while it is in use, close trf and try again")
+        try:
+            settings_map = default_settings()
+            if 'settings' not in self.root:
+                self.root['settings'] = settings_map
+                self.transaction.commit()
+            missing = [key for key in settings_map if key not in self.settings]
+            if missing and not read_only:
+                # settings added since this database was created, in a batch
+                # since nothing else is loaded yet for retried() to sync
+                with self.batch():
+                    self.update_settings({key: settings_map[key] for key in missing})
+            if 'trackers' not in self.root:
+                self.root['trackers'] = IOBTree()
+                self.root['next_id'] = 1  # Initialize the ID counter
+                self.transaction.commit()
+            elif not isinstance(self.root['trackers'], IOBTree):
+                self.upgrade_trackers()
+            self.trackers = self.root['trackers']
+            if self.indexes_outdated():
+                self.rebuild_indexes()
+            self.indexes = self.root['indexes']
+            self.forecasts = self.root['forecasts']
+            self.apply_cache_settings()
+        except Exception as e:
+            if read_only:
+                # nothing would be listed, as if there were no trackers
+                raise
+            logger.error(f"Warning: could not load data from '{self.storage.getName()}': {str(e)}")
+            self.trackers = IOBTree()
+            self.indexes = {mode: SortIndex(integer=mode != 'subject') for mode in self.sort_modes}
+            self.forecasts = ForecastIndex()
+
+    def indexes_outdated(self) -> bool:
+        return ('indexes' not in self.root or set(self.root['indexes'].keys()) != set(self.sort_modes)
+                or self.root.get('index_version') != self.INDEX_VERSION)
+
+    def upgrade_trackers(self):
+        """
+        One-time migration of the plain dict stored under root['trackers'] by
+        earlier versions to an IOBTree keyed by doc_id. Once upgraded, a commit
+        only writes the buckets that actually changed instead of re-pickling
+        the whole mapping.
+        """
+        from BTrees.IOBTree import IOBTree
+        old = self.root['trackers']
+        trackers = IOBTree()
+        for doc_id, tracker in old.items():
+            trackers[int(doc_id)] = tracker
+        self.root['trackers'] = trackers
+        self.transaction.commit()
+        logger.info(f"Upgraded {len(trackers)} trackers from {type(old).__name__} to IOBTree.")
+
+    def rebuild_indexes(self):
+        """
+        Build the sorted indexes in root['indexes'] and the forecast index
+        in root['forecasts'] from scratch. This is only needed once for a
+        database created before they existed or with an earlier layout of
+        their keys, thereafter they are updated incrementally by reindex()
+        and unindex().
+        """
+        from BTrees.OOBTree import OOBTree
+        from .index import SortIndex, ForecastIndex
+        indexes = OOBTree()
+        for mode in self.sort_modes:
+            # names are not numbers
+            indexes[mode] = SortIndex(integer=mode != 'subject')
+        self.root['indexes'] = indexes
+        self.indexes = indexes
+        self.root['forecasts'] = self.forecasts = ForecastIndex()
+        self.root['index_version'] = self.INDEX_VERSION
+        for i, tracker in enumerate(self.trackers.values(), 1):
+            # the keys of the indexes replaced
+            tracker.index_keys = tracker.merged_keys = None
+            self.reindex(tracker)
+            if i % self.RELEASE_EVERY == 0:
+                self.release(savepoint=True)
+        self.transaction.commit()
+        logger.info(f"Built sort indexes for {len(self.indexes['id'])} trackers.")
+
+    def reindex(self, tracker):
+        """
+        Move tracker to its current keys in the indexes from the keys it
+        keeps in index_keys, and keep the new ones there. The indexes hold
+        nothing but the keys, so only the buckets of the keys that have
+        changed and the tracker, which is usually being written anyway, are
+        written.
+        """
+        doc_id = tracker.doc_id
+        self.touched(doc_id)
+        self.used_trackers.add(tracker)
+        old = tracker.index_keys or {}
+        merged = tracker.merged_keys or {}
+        new = self.sort_keys(tracker)
+        for mode, key in new.items():
+            self.indexes[mode].move(old.get(mode), key, merged.get(mode, ()))
+        info = tracker.info
+        if info['next_expected_completion'] is not None:
+            new['forecast'] = (encode_dt(info['next_expected_completion']), encode_td(info['spread']))
+        self.forecasts.move(doc_id, old.get('forecast'), new.get('forecast'), merged.get('forecast', ()))
+        if new != old:
+            tracker.index_keys = new
+        if tracker.merged_keys is not None:
+            tracker.merged_keys = None
+        if self.due is not None:
+            self.due.set(doc_id, *new.get('forecast', (None, None)))
+
+    def unindex(self, doc_id: int):
+        """
+        Remove the tracker doc_id, which is still in trackers, from the
+        indexes.
+        """
+        self.touched(doc_id)
+        old = self.trackers[doc_id].index_keys or {}
+        merged = self.trackers[doc_id].merged_keys or {}
+        for mode, index in self.indexes.items():
+            index.move(old.get(mode), None, merged.get(mode, ()))
+        self.forecasts.move(doc_id, old.get('forecast'), None, merged.get('forecast', ()))
+        if self.due is not None:
+            self.due.remove(doc_id)
+
+    def touched(self, doc_id: int):
+        if self._touched is not None:
+            self._touched.add(doc_id)
+            if len(self._touched) > self.MAX_LISTED:
+                self._touched = None
+
+    def due_states(self):
+        """
+        The due states of the trackers, see due.py. These are built from
+        root['forecasts'] when first needed, without loading any tracker,
+        and then kept up to date by reindex() and unindex().
+        """
+        if self.due is None:
+            from .due import DueStates
+            self.due = DueStates()
+            self.rebuild_due_states()
+        return self.due
+
+    def rebuild_due_states(self):
+        if self.due is not None:
+            self.due.build(self.forecasts.items(), self.settings.get('η', Tracker.default_eta), datetime.now())
+
+    def num_trackers(self):
+        return len(self.indexes['id'])
+
+    @retried
+    def restore_defaults(self):
+        window = self.settings.get('window')
+        self.root['settings'] = default_settings()
+        if self.settings['window'] != window:
+            self.rebuild_windows()
+        self.apply_cache_settings()
+        self.save_data()
+        self.rebuild_due_states()
+        logger.info(f"Restored default settings:\n{self.settings}")
+
+    def refresh_info(self):
+        """
+        Recompute the info of the trackers in memory. Info is volatile, so a
+        tracker that has been released computes it again when it is next
+        loaded and there is no need to load every tracker here. Changing the
+        settings does not need this: a change of window rebuilds the windows
+        and η is applied to the info as it is read, see Tracker.apply_eta().
+        """
+        trackers = self.loaded_trackers()
+        refresh_forecasts(trackers, logger)
+        logger.info(f"Refreshed the info of {len(trackers)} trackers in memory.")
+
+    @retried
+    def update_settings(self, updated_settings: dict):
+        window = self.settings.get('window')
+        eta = self.settings.get('η')
+        self.settings.update(updated_settings)
+        # settings is not itself persistent, so changing it does not mark
+        # the root as changed
+        self.root._p_changed = True
+        if self.settings.get('window') != window:
+            self.rebuild_windows()
+        self.apply_cache_settings()
+        self.save_data()
+        if self.settings.get('η') != eta:
+            # the bounds of every tracker have changed but not its forecast
+            self.rebuild_due_states()
+
+    @retried
+    def start_maintenance(self, day: date) -> bool:
+        """
+        Record that the daily maintenance of day, see trf.py, is starting
+        and return True, or return False if it has already been started on
+        day, perhaps by another client of a shared database, or later.
+        """
+        last = self.root.get('last_maintenance')
+        if last is not None and last >= day:
+            return False
+        self.root['last_maintenance'] = day
+        self.save_data()
+        return True
+
+    def rebuild_windows(self):
+        """
+        Recompute the forecast window of every tracker, and so its forecast
+        and sort keys, after the window setting has changed.
+        """
+        with self.batch():
+            for i, tracker in enumerate(self.trackers.values(), 1):
+                tracker.rebuild_window()
+                tracker.invalidate_info()
+                self.reindex(tracker)
+                if i % self.RELEASE_EVERY == 0:
+                    self.release(savepoint=True)
+        logger.info(f"Rebuilt the forecast windows of {len(self.trackers)} trackers.")
+
+    def apply_cache_settings(self):
+        """
+        Limit the objects kept in memory by each connection to the
+        cache_size and cache_mb settings. Unchanged objects beyond the limits
+        are released, least recently used first, by turning them back into
+        ghosts at the end of each transaction and by release().
+        """
+        self.db.setCacheSize(int(self.settings.get('cache_size') or 2000))
+        self.db.setCacheSizeBytes(int(self.settings.get('cache_mb') or 0) * 1024 * 1024)
+
+    def release(self, savepoint: bool = False):
+        """
+        Release the least recently used objects beyond the cache limits now
+        rather than at the end of the transaction. Changed objects are kept
+        in memory until they are written, with savepoint true they are first
+        written to a savepoint so that they can be released as well.
+        """
+        if savepoint:
+            self.transaction.savepoint(optimistic=True)
+        self.connection.cacheGC()
+
+    def get_trackers(self, doc_ids) -> list:
+        """
+        Return the trackers for doc_ids, counting those already in memory as
+        cache hits and those that have to be loaded as misses.
+        """
+        trackers = [self.trackers[doc_id] for doc_id in doc_ids]
+        self.used_trackers.update(trackers)
+        for tracker in trackers:
+            if tracker._p_status == 'ghost':
+                self.cache_misses += 1
+            else:
+                self.cache_hits += 1
+        return trackers
+
+    def loaded_trackers(self) -> list:
+        """
+        Return the trackers that are in memory and not ghosts, of those used
+        through get_trackers() or changed through this store, without
+        looking into the connection's cache.
+        """
+        return [tracker for tracker in self.used_trackers if tracker._p_status != 'ghost']
+
+    def cache_stats(self) -> dict:
+        """
+        The store's own counts of tracker lookups, with the counts of the
+        objects in the connection's cache from the database, and the
+        estimated size of the trackers in memory.
+        """
+        connection = repr(self.connection)
+        cache = next((detail for detail in self.db.cacheDetailSize() if detail['connection'] == connection),
+                     {'ngsize': 0, 'size': 0})
+        trackers = self.loaded_trackers()
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': self.cache_hits / lookups if lookups else None,
+            'loads': self.connection.getTransferCounts()[0],
+            'objects': cache['ngsize'],
+            'ghosts': cache['size'] - cache['ngsize'],
+            'trackers': len(trackers),
+            'estimated_mb': sum(tracker._p_estimated_size for tracker in trackers) / (1024 * 1024),
+            'cache_size': self.db.getCacheSize(),
+            'cache_mb': self.db.getCacheSizeBytes() / (1024 * 1024),
+        }
+
+    def format_cache_stats(self) -> str:
+        stats = self.cache_stats()
+        hit_rate = f"{stats['hit_rate']:.0%}" if stats['hit_rate'] is not None else "~"
+        limit_mb = f"{stats['cache_mb']:.0f} MB" if stats['cache_mb'] else "no limit"
+        return f"""\
+cache:
+    trackers in memory:  {stats['trackers']}, estimated {stats['estimated_mb']:.1f} MB
+    objects in memory:   {stats['objects']} of {stats['cache_size']}, {stats['ghosts']} ghosts
+    memory limit:        {limit_mb}
+    tracker lookups:     {stats['hits']} hits, {stats['misses']} misses ({hit_rate} hits)
+    objects loaded:      {stats['loads']}"""
+
+    def set_setting(self, key, value):
+
+        if key in self.settings:
+            self.settings[key] = value
+            self.zodb_root[0] = self.settings  # Update the ZODB storage
+            self.transaction.commit()
+        else:
+            logger.error(f"Setting '{key}' not found.")
+
+    def get_setting(self, key):
+        return self.settings.get(key, None)
+
+    @retried
+    def add_tracker(self, name: str) -> None:
+        # Two clients of a shared database adding trackers at the same time
+        # both change the root, which cannot be merged, so the second commit
+        # conflicts and is retried with the next_id committed by the first
+        doc_id = self.root['next_id']
+        # Create a new tracker with the current doc_id
+        tracker = Tracker(name, doc_id)
+        # Add the tracker to the trackers dictionary
+        self.trackers[doc_id] = tracker
+        self.connection.add(tracker)
+        self.reindex(tracker)
+        if self._name_index is not None:
+            self._name_index.add(doc_id, name)
+        # Increment the next_id for the next tracker
+        self.root['next_id'] += 1
+        # Save the updated data
+        self.save_data()
+
+        logger.info(f"Tracker '{name}' added with ID {doc_id}")
+        return doc_id
+
+    @retried
+    def rename_tracker(self, doc_id: int, new_name: str):
+        ok, msg = self.trackers[doc_id].rename(new_name)
+        if ok:
+            self.reindex(self.trackers[doc_id])
+            if self._name_index is not None:
+                self._name_index.add(doc_id, self.trackers[doc_id].name)
+            self.save_data()
+        return ok, msg
+
+    @retried
+    def record_completion(self, doc_id: int, comp: tuple[datetime, timedelta]):
+        # dt will be a datetime
+        ok, msg = self.trackers[doc_id].record_completion(comp)
+        if ok:
+            self.reindex(self.trackers[doc_id])
+            self.save_data()
+        return ok, msg
+
+    @retried
+    def record_completions(self, doc_id: int, completions: list[tuple[datetime, timedelta]]):
+        ok, msg = self.trackers[doc_id].record_completions(completions)
+        if ok:
+            self.reindex(self.trackers[doc_id])
+            self.save_data()
+        return ok, msg
+
+    @retried
+    def remove_completions(self, doc_id: int):
+        ok, msg = self.trackers[doc_id].remove_completions()
+        if ok:
+            self.reindex(self.trackers[doc_id])
+            self.save_data()
+        return ok, msg
+
+
+    def find_trackers(self, name: str) -> list:
+        """
+        Return the doc_ids of the trackers named name, ignoring case if no
+        name matches exactly. Only the keys of the subject index are read.
+        """
+        index = self.indexes['subject']
+        doc_ids = [key[-1] for key in index.keys((name, ), (name, sys.maxsize))]
+        if not doc_ids:
+            folded = name.casefold()
+            doc_ids = [key[-1] for key in index.keys() if key[0].casefold() == folded]
+        return doc_ids
+
+    def search_trackers(self, query: str, limit: int = 10) -> list:
+        """
+        Return the doc_ids of at most limit trackers whose names match query,
+        best first, see NameIndex. The index is built from the keys of the
+        subject index when first needed, without loading the trackers.
+        """
+        if self._name_index is None:
+            from .search import NameIndex
+            self._name_index = NameIndex((key[-1], key[0]) for key in self.indexes['subject'].keys())
+        return self._name_index.search(query, limit)
+
+    def due_trackers(self, until: datetime) -> list:
+        """
+        Return the doc_ids of the trackers whose next completion is expected
+        on or before until, in the order expected.
+        """
+        from .index import int_key, time_value, ID_BITS, ID_MASK
+        value = time_value(0, until)
+        doc_ids = []
+        for key in self.indexes['next'].keys(None, int_key(value, ID_MASK)):
+            doc_id = key & ID_MASK
+            # the keys are to the minute, check the forecasts in the last one
+            if key >> ID_BITS == value and self.trackers[doc_id].info['next_expected_completion'] > until:
+                continue
+            doc_ids.append(doc_id)
+        return doc_ids
+
+    def agenda_trackers(self, start: datetime, end: datetime):
+        """
+        Iterate over the doc_ids of the trackers whose window from early to
+        tardy overlaps the period from start to end, in the order expected.
+        """
+        eta = self.settings.get('η', Tracker.default_eta)
+        return self.forecasts.overlapping(encode_dt(start), encode_dt(end), eta)
+
+    def sort_keys(self, tracker) -> dict:
+        """
+        Return the key for tracker in each of the sort indexes, an int from
+        int_key() with times in epoch minutes, except for the name, a tuple.
+        Each key ends with the doc_id which keeps the keys unique and breaks
+        ties. Trackers with a forecast come first by next, then those with
+        a completion, and then the rest by doc_id, and the other way around
+        by last.
+        """
+        from .index import int_key, time_value, TIME_BITS
+        doc_id = tracker.doc_id
+        forecast_dt = tracker.info.get('next_expected_completion', None)
+        last_dt = tracker.history[-1][0] if tracker.history else None
+        if forecast_dt:
+            next_value = time_value(0, forecast_dt)
+        elif last_dt:
+            next_value = time_value(1, last_dt)
+        else:
+            next_value = 2 << TIME_BITS
+        if last_dt:
+            last_value = time_value(0, last_dt)
+        elif forecast_dt:
+            last_value = time_value(1, forecast_dt)
+        else:
+            last_value = 2 << TIME_BITS
+        return {
+            'next': int_key(next_value, doc_id),
+            'last': int_key(last_value, doc_id),
+            'subject': (tracker.name, doc_id),
+            'modified': int_key(time_value(0, tracker.modified), doc_id),
+            'id': int_key(0, doc_id),
+        }
+
+    @contextmanager
+    def batch(self):
+        """
+        Group the mutations made inside the block into a single commit:
+
+            with store.batch():
+                for name in names:
+                    store.add_tracker(name)
+
+        save_data() calls made inside the block are deferred and only the
+        objects marked as changed are written when the outermost block
+        exits. An exception raised out of the outermost block aborts the
+        transaction instead.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except Exception:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.abort()
+                logger.error("Batch aborted.")
+            raise
+        else:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.commit()
+
+    def abort(self):
+        """
+        Abort the current transaction and build again the name index, the
+        sampled positions and the due states kept in memory, which may
+        include the changes aborted.
+        """
+        self.transaction.abort()
+        self.view_moved()
+        self._touched = set()
+        self._name_index = None
+        for index in self.indexes.values():
+            index.forget_samples()
+        self.rebuild_due_states()
+
+    def foreign_changes(self, after: bytes, last: bytes) -> list:
+        """
+        The doc_ids listed by each of the transactions of other clients
+        committed after the transaction after and up to last, None for a
+        transaction that did not list them, see commit().
+        """
+        from ZODB.utils import p64, u64
+        if after >= last:
+            return []
+        return [
+            txn.extension.get('trackers', None)
+            for txn in self.storage.iterator(p64(u64(after) + 1), last)
+            if txn.extension.get('client') != self.client_id
+            ]
+
+    def view_moved(self):
+        """
+        Note that the connection now shows the latest transaction, as it
+        does after each commit or abort and connection.sync(). It shows none
+        after view_bound, which sync() uses to tell the transactions of
+        other clients that the connection already shows from those it will
+        show once synced. A transaction whose invalidations are being
+        received may be shown before lastTransaction() returns it, see
+        server.connect().
+        """
+        self.view_bound = max(self.storage.lastTransaction(),
+                              getattr(self.storage, 'last_invalidated', self.view_bound))
+
+    def index_keys(self, doc_id: int) -> dict:
+        # the index keys of tracker doc_id, none if it does not exist
+        tracker = self.trackers.get(doc_id)
+        return (tracker.index_keys or {}) if tracker is not None else {}
+
+    def index_entries(self, doc_id: int) -> dict:
+        # the set of keys of tracker doc_id in each index, its merged keys
+        # included
+        tracker = self.trackers.get(doc_id)
+        if tracker is None:
+            return {}
+        entries = {mode: {key} for mode, key in (tracker.index_keys or {}).items()}
+        for mode, keys in (tracker.merged_keys or {}).items():
+            entries.setdefault(mode, set()).update(keys)
+        return entries
+
+    def sync(self):
+        """
+        Catch up with the commits made by other clients of a shared database,
+        see server.py, and return the doc_ids of the trackers they changed,
+        added or deleted, or None if they did not list them. Checking costs
+        a comparison when nothing has been committed since the last call.
+
+        Only the changed trackers are invalidated and so reloaded when next
+        used, and only their entries in the due states, the name index and
+        the sampled positions of the sort indexes are updated, from the index
+        keys the changed trackers keep before and after the commits. When the
+        keys before are not known, since a commit or an abort of this store
+        may already have shown the commits, see view_moved(), the samples
+        are taken again, and when the doc_ids are not listed or η has
+        changed, everything is built again.
+        """
+        if not self.shared:
+            return set()
+        last = self.storage.lastTransaction()
+        if last == self.last_seen:
+            return set()
+        view = self.view_bound
+        shown = self.foreign_changes(self.last_seen, view)
+        listed = self.foreign_changes(view, last)
+        old_keys = {}
+        if listed:
+            if None not in listed:
+                # read from the view that is about to be replaced
+                old_keys = {doc_id: self.index_entries(doc_id) for doc_id in set().union(*listed)}
+            self.connection.sync()
+            self.view_moved()
+            # and the commits made meanwhile, shown as well
+            shown += self.foreign_changes(last, self.view_bound)
+        # any commits after the bound up to last are this store's own
+        self.last_seen = max(self.view_bound, last)
+        changes = shown + listed
+        if not changes:
+            # only this store's commits
+            return set()
+        eta = self.settings.get('η', Tracker.default_eta)
+        if None in changes or (self.due is not None and self.due.eta != eta):
+            # the indexes may even have been replaced, see rebuild_indexes()
+            self.trackers = self.root['trackers']
+            self.indexes = self.root['indexes']
+            self.forecasts = self.root['forecasts']
+            for index in self.indexes.values():
+                index.forget_samples()
+            self._name_index = None
+            self.rebuild_due_states()
+            logger.info(f"{len(changes)} commits by other clients, rebuilt the due states")
+            return None
+        doc_ids = set().union(*changes)
+        if shown:
+            for index in self.indexes.values():
+                index.forget_samples()
+        for doc_id in doc_ids:
+            if doc_id in old_keys:
+                entries = self.index_entries(doc_id)
+                for mode, index in self.indexes.items():
+                    before, after = old_keys[doc_id].get(mode, set()), entries.get(mode, set())
+                    for key in before - after:
+                        index.moved(key, None)
+                    for key in after - before:
+                        index.moved(None, key)
+            keys = self.index_keys(doc_id)
+            if self.due is not None:
+                self.due.set(doc_id, *keys.get('forecast', (None, None)))
+            if self._name_index is not None:
+                subject = keys.get('subject')
+                if subject is None:
+                    self._name_index.remove(doc_id)
+                elif self._name_index.names.get(doc_id) != subject[0]:
+                    self._name_index.add(doc_id, subject[0])
+        logger.info(f"{len(doc_ids)} trackers changed by other clients")
+        return doc_ids
+
+    def save_data(self):
+        if self._batch_depth:
+            # the enclosing batch() will commit
+            return
+        self.commit()
+
+    def commit(self):
+        """
+        Commit the current transaction and record the number of bytes it
+        appended to the storage file.
+        """
+        size = self.storage.getSize()
+        touched, self._touched = self._touched, set()
+        if self.shared:
+            # so that the other clients can tell what changed, see sync()
+            txn = self.transaction.get()
+            txn.setExtendedInfo('client', self.client_id)
+            txn.setExtendedInfo('trackers', None if touched is None else sorted(touched))
+        try:
+            self.transaction.commit()
+        finally:
+            self.view_moved()
+        self.last_commit_bytes = self.storage.getSize() - size
+        self.total_commit_bytes += self.last_commit_bytes
+        self.num_commits += 1
+        logger.debug(f"commit {self.num_commits}: {self.last_commit_bytes} bytes, {self.total_commit_bytes} total")
+        if self.shared and touched:
+            self.reindex_merged(touched)
+
+    def reindex_merged(self, doc_ids):
+        """
+        Reindex the trackers of doc_ids whose changes the commit just made
+        merged with those of another client, see Tracker._p_resolveConflict(),
+        so that each is left with a single key in each index, and commit.
+        If this conflicts, another client has changed and so reindexed them
+        meanwhile.
+        """
+        from ZODB.POSException import ConflictError
+        # ZODB turns the objects whose changes were merged into ghosts, so
+        # the others are not loaded again
+        merged = [tracker for tracker in (self.trackers.get(doc_id) for doc_id in doc_ids)
+                  if tracker is not None and tracker._p_status == 'ghost' and tracker.merged_keys]
+        if not merged:
+            return
+        try:
+            for tracker in merged:
+                self.reindex(tracker)
+            self.commit()
+        except ConflictError:
+            self.abort()
+        else:
+            logger.info(f"reindexed {len(merged)} trackers merged with the changes of another client")
+
+    @retried
+    def update_tracker(self, doc_id, tracker):
+        replaced = self.trackers.get(doc_id)
+        if replaced is not tracker:
+            if replaced is not None:
+                self.unindex(doc_id)
+            if tracker.index_keys is not None:
+                # keys kept from another database or from before a deletion
+                tracker.index_keys = None
+        self.trackers[doc_id] = tracker
+        if tracker._p_jar is None:
+            # a new tracker, its info may have been computed without the
+            # settings of this database
+            self.connection.add(tracker)
+            tracker.invalidate_info()
+        self.reindex(tracker)
+        if self._name_index is not None:
+            self._name_index.add(doc_id, tracker.name)
+        self.save_data()
+
+    @retried
+    def delete_tracker(self, doc_id):
+        if doc_id in self.trackers:
+            self.unindex(doc_id)
+            del self.trackers[doc_id]
+            if self._name_index is not None:
+                self._name_index.remove(doc_id)
+            self.save_data()
+
+    def close(self):
+        # Make sure to commit or abort any ongoing transaction
+        try:
+            if self.connection.transaction_manager.isDoomed():
+                logger.error("Transaction aborted.")
+                self.transaction.abort()
+            else:
+                logger.info("Transaction committed.")
+                self.transaction.commit()
+        except Exception as e:
+            logger.error(f"Error during transaction handling: {e}")
+            self.transaction.abort()
+        else:
+            logger.info("Transaction handled successfully.")
+        finally:
+            self.connection.close()
+            if self.owns_db:
+                self.db.close()
@@ -0,0 +1,212 @@
+# trf/due.py
+"""
+The due state of every tracker with a forecast, kept up to date as time
+passes without looking at every tracker.
+
+A tracker is cold before its early bound, cool before its timely bound,
+warm before its tardy bound and hot after that, where
+
+    early = forecast - 2 × η × spread
+    timely = forecast - η × spread
+    tardy = forecast + η × spread
+
+as in Tracker.apply_eta(). Each tracker that is not yet hot has one entry in
+a heap, the time of its next crossing, so advance() only looks at the k
+trackers whose state has changed since the last call, in O(k log n), and
+next_crossing() says when to call it again.
+
+The bounds and states are kept in arrays indexed by doc_id, and a heap entry
+is the single int (time << 32) + doc_id, so there is no object per tracker.
+Entries left behind when a tracker changes are skipped when they reach the
+top of the heap and dropped when the heap is rebuilt.
+"""
+import heapq
+from array import array
+from datetime import datetime
+
+from .history import decode_td, encode_dt, decode_dt, encode_td
+
+STATES = ('cold', 'cool', 'warm', 'hot')
+COLD, COOL, WARM, HOT = range(4)
+# the state of a doc_id without a forecast
+NONE = 255
+
+# doc_ids are 32 bit, see the trackers IOBTree
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+
+
+def scaled(factor, us: int) -> int:
+    """
+    factor * us microseconds, rounded as factor * timedelta is.
+    """
+    if isinstance(factor, int):
+        return factor * us
+    return encode_td(factor * decode_td(us))
+
+
+class DueStates:
+    """
+    The cold, cool, warm and hot trackers and the number of each.
+
+    on_tardy(doc_id) is called by advance() for each tracker that has become
+    hot, and on_next(dt) whenever the next crossing becomes earlier than it
+    was, e.g., to wake a scheduler sooner.
+    """
+
+    def __init__(self, eta=2, on_tardy=None, on_next=None):
+        self.eta = eta
+        self.on_tardy = on_tardy
+        self.on_next = on_next
+        self.counts = [0, 0, 0, 0]
+        # early, timely and tardy of each doc_id, in epoch microseconds
+        self._bounds = array('q')
+        self._states = bytearray()
+        self._heap = []
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def build(self, forecasts, eta, now: datetime):
+        """
+        Start again with the (doc_id, (forecast, spread)) items of
+        forecasts, both in microseconds, and the η setting eta. This is O(n)
+        but only reads forecasts, not the trackers.
+        """
+        self.eta = eta
+        self.counts = counts = [0, 0, 0, 0]
+        self._bounds = bounds = array('q')
+        self._states = states = bytearray()
+        now = encode_dt(now)
+        for doc_id, (forecast, spread) in forecasts:
+            if doc_id >= len(states):
+                self._grow(max(doc_id, 2 * len(states)))
+            early = forecast - scaled(eta * 2, spread)
+            timely = forecast - scaled(eta, spread)
+            tardy = forecast + scaled(eta, spread)
+            i = 3 * doc_id
+            bounds[i] = early
+            bounds[i + 1] = timely
+            bounds[i + 2] = tardy
+            state = COLD if now < early else COOL if now < timely else WARM if now < tardy else HOT
+            states[doc_id] = state
+            counts[state] += 1
+        self._rebuild_heap()
+        if self.on_next is not None:
+            self.on_next(self.next_crossing())
+
+    def _grow(self, doc_id: int):
+        missing = doc_id + 1 - len(self._states)
+        if missing > 0:
+            self._states.extend(bytes([NONE]) * missing)
+            self._bounds.frombytes(bytes(3 * self._bounds.itemsize * missing))
+
+    def _state_at(self, doc_id: int, now: int) -> int:
+        i = 3 * doc_id
+        early, timely, tardy = self._bounds[i:i + 3]
+        return COLD if now < early else COOL if now < timely else WARM if now < tardy else HOT
+
+    def _crossing(self, doc_id: int, state: int) -> int:
+        # the bound that ends state
+        return self._bounds[3 * doc_id + state]
+
+    def _set(self, doc_id: int, forecast: int, spread: int, now: int):
+        self._grow(doc_id)
+        old = self._states[doc_id]
+        if old != NONE:
+            self.counts[old] -= 1
+        i = 3 * doc_id
+        self._bounds[i:i + 3] = array('q', (
+            forecast - scaled(self.eta * 2, spread),
+            forecast - scaled(self.eta, spread),
+            forecast + scaled(self.eta, spread),
+            ))
+        state = self._state_at(doc_id, now)
+        self._states[doc_id] = state
+        self.counts[state] += 1
+        if state != HOT:
+            self._push(doc_id, state)
+
+    def _push(self, doc_id: int, state: int):
+        key = (self._crossing(doc_id, state) << ID_BITS) + doc_id
+        earlier = not self._heap or key < self._heap[0]
+        heapq.heappush(self._heap, key)
+        if len(self._heap) > 2 * len(self) + 1024:
+            self._rebuild_heap()
+        if earlier and self.on_next is not None:
+            self.on_next(self.next_crossing())
+
+    def _rebuild_heap(self):
+        states = self._states
+        self._heap = [
+            (self._crossing(doc_id, state) << ID_BITS) + doc_id
+            for doc_id, state in enumerate(states) if state < HOT
+            ]
+        heapq.heapify(self._heap)
+
+    def set(self, doc_id: int, forecast: int, spread: int, now: datetime = None):
+        """
+        Set the forecast and the spread of doc_id, in epoch microseconds and
+        microseconds, or remove doc_id if forecast is None.
+        """
+        if forecast is None:
+            self.remove(doc_id)
+            return
+        self._set(doc_id, forecast, spread, encode_dt(now or datetime.now()))
+
+    def remove(self, doc_id: int):
+        if doc_id < len(self._states) and self._states[doc_id] != NONE:
+            self.counts[self._states[doc_id]] -= 1
+            self._states[doc_id] = NONE
+
+    def state(self, doc_id: int) -> str:
+        """
+        'cold', 'cool', 'warm' or 'hot', or None if doc_id has no forecast.
+        """
+        if doc_id < len(self._states) and self._states[doc_id] != NONE:
+            return STATES[self._states[doc_id]]
+        return None
+
+    def _live(self, key: int) -> bool:
+        doc_id = key & ID_MASK
+        state = self._states[doc_id]
+        return state < HOT and self._crossing(doc_id, state) == key >> ID_BITS
+
+    def advance(self, now: datetime = None) -> list:
+        """
+        Move the trackers whose bounds have been crossed by now to their new
+        states and return the (doc_id, old state, new state) of each.
+        """
+        now = encode_dt(now or datetime.now())
+        heap = self._heap
+        changes = []
+        while heap and heap[0] >> ID_BITS <= now:
+            key = heapq.heappop(heap)
+            if not self._live(key):
+                continue
+            doc_id = key & ID_MASK
+            old = self._states[doc_id]
+            new = self._state_at(doc_id, now)
+            self.counts[old] -= 1
+            self.counts[new] += 1
+            self._states[doc_id] = new
+            changes.append((doc_id, STATES[old], STATES[new]))
+            if new == HOT:
+                if self.on_tardy is not None:
+                    self.on_tardy(doc_id)
+            else:
+                heapq.heappush(heap, (self._crossing(doc_id, new) << ID_BITS) + doc_id)
+        return changes
+
+    def next_crossing(self) -> datetime:
+        """
+        The time of the next change of state, or None if every tracker is
+        hot.
+        """
+        heap = self._heap
+        while heap and not self._live(heap[0]):
+            heapq.heappop(heap)
+        return decode_dt(heap[0] >> ID_BITS) if heap else None
+
+    def summary(self) -> str:
+        return ' '.join(f"{count} {name}" for name, count in zip(reversed(STATES), reversed(self.counts)))
@@ -0,0 +1,153 @@
+# trf/forecast.py
+"""
+Batch forecasts for all trackers at once.
+
+The forecast window intervals of all trackers are packed into a single ragged
+int64 array of microseconds so that the averages, spreads and forecasts of
+every tracker are computed with a handful of NumPy operations. The results are handed back to each tracker through
+Tracker.set_info(), the same method used by Tracker.compute_info(), so both
+paths produce identical info dicts. None of this depends on η, which is
+applied by Tracker.apply_eta() when the info of a tracker is read.
+
+NumPy is optional and is only imported the first time there are at least
+BATCH_MIN trackers to refresh. With fewer trackers, or without NumPy,
+refresh_forecasts() calls compute_info() for each tracker instead.
+"""
+from .history import EPOCH, MICROSECOND
+
+# set by load_numpy()
+np = None
+
+# below this many trackers importing NumPy costs more than it saves
+BATCH_MIN = 5000
+
+
+def load_numpy():
+    """
+    Import NumPy on first use and return it, or None if it is not installed.
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+    return np
+
+
+def pack_windows(trackers: list):
+    """
+    Return (counts, intervals, last) where counts[i] is the number of
+    intervals in the forecast window of trackers[i], intervals holds those of
+    all trackers, one after the other, and last[i] is the datetime of the
+    latest completion of trackers[i], all in microseconds.
+    """
+    windows = [t.window_micros()[0] for t in trackers]
+    counts = np.fromiter((len(w) for w in windows), dtype=np.int64, count=len(trackers))
+    # the windows are int64 arrays already
+    intervals = np.frombuffer(b''.join(w.tobytes() for w in windows), dtype=np.int64)
+    last = np.fromiter(
+        (t.history.last_time() or 0 for t in trackers),
+        dtype=np.int64, count=len(trackers))
+    return counts, intervals, last
+
+
+def _divide(numerator, denominator):
+    """
+    Integer division rounding half to even, as timedelta / int does.
+    Entries with a zero denominator are returned as zero.
+    """
+    d = np.where(denominator > 0, denominator, 1)
+    q, r = np.divmod(numerator, d)
+    q += (2 * r > d) | ((2 * r == d) & (q % 2 == 1))
+    return np.where(denominator > 0, q, 0)
+
+
+def _segment_sums(values, starts, ends):
+    """
+    Exact int64 sums of values[starts[i]:ends[i]] for each i.
+    """
+    cumulative = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(values, out=cumulative[1:])
+    return cumulative[ends] - cumulative[starts]
+
+
+def days_labels(values) -> list:
+    """
+    Format microsecond durations as Tracker.format_td(td, 2) does: the
+    number of days rounded to one decimal place, or '0m' for durations under
+    a second.
+    """
+    seconds = np.abs(values) // 1_000_000
+    minutes = seconds // 60
+    days = (minutes // 1440) + ((minutes % 1440) // 60) / 24 + (minutes % 60) / (60*24)
+    return [f"{d:.1f}" if s else '0m' for d, s in zip(days.tolist(), seconds.tolist())]
+
+
+def batch_statistics(counts, intervals, last):
+    """
+    Compute the forecast statistics of every tracker from packed windows.
+    All returned arrays are in microseconds and are indexed by tracker except
+    for 'intervals' which is ragged with 'num_intervals' entries per tracker.
+    """
+    num_intervals = counts
+    interval_owner = np.repeat(np.arange(len(counts)), counts)
+    interval_ends = np.cumsum(num_intervals)
+    interval_starts = interval_ends - num_intervals
+    average = _divide(_segment_sums(intervals, interval_starts, interval_ends), num_intervals)
+
+    deviations = np.abs(intervals - average[interval_owner])
+    totals = _segment_sums(deviations, interval_starts, interval_ends)
+    spread = np.where(num_intervals >= 2, _divide(totals, num_intervals), 0)
+
+    return dict(
+        num_intervals=num_intervals,
+        intervals=intervals,
+        interval_starts=interval_starts,
+        average=average,
+        spread=spread,
+        forecast=last + average,
+    )
+
+
+def refresh_forecasts(trackers, logger=None) -> int:
+    """
+    Recompute the info of every tracker in trackers and return the number of
+    trackers refreshed.
+    """
+    trackers = list(trackers)
+    if len(trackers) < BATCH_MIN or load_numpy() is None:
+        for tracker in trackers:
+            tracker.compute_info()
+        if logger:
+            logger.debug("refreshed trackers one at a time")
+        return len(trackers)
+
+    stats = batch_statistics(*pack_windows(trackers))
+    intervals = stats['intervals'].tolist()
+    interval_starts = stats['interval_starts'].tolist()
+    num_intervals = stats['num_intervals'].tolist()
+    columns = [stats[k].tolist() for k in ('average', 'spread', 'forecast')]
+    average_labels, spread_labels = (days_labels(stats[k]) for k in ('average', 'spread'))
+
+    for i, tracker in enumerate(trackers):
+        k = num_intervals[i]
+        if not k:
+            tracker.set_info([], None, None)
+            continue
+        a = interval_starts[i]
+        average, spread, forecast = (c[i] for c in columns)
+        tracker.set_info(
+            [MICROSECOND * us for us in intervals[a:a + k]],
+            MICROSECOND * average,
+            MICROSECOND * spread if k >= 2 else None,
+            next_expected=EPOCH + MICROSECOND * forecast,
+            labels={
+                'average': average_labels[i],
+                'spread': spread_labels[i],
+            },
+        )
+    if logger:
+        logger.debug(f"refreshed {len(trackers)} trackers")
+    return len(trackers)
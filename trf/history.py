@@ -0,0 +1,273 @@
+# trf/history.py
+from array import array
+from bisect import bisect_right
+from collections import Counter
+import sys
+from datetime import datetime, timedelta
+from persistent import Persistent
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_dt(dt: datetime) -> int:
+    return (dt - EPOCH) // MICROSECOND
+
+
+def decode_dt(us: int) -> datetime:
+    return EPOCH + timedelta(microseconds=us)
+
+
+def encode_td(td: timedelta) -> int:
+    return td // MICROSECOND
+
+
+def decode_td(us: int) -> timedelta:
+    return timedelta(microseconds=us)
+
+
+def pack(completions) -> tuple[array, array]:
+    """
+    The datetimes and adjustments of completions as two int64 arrays of
+    epoch microseconds and microseconds.
+    """
+    times = array('q')
+    adjustments = array('q')
+    for dt, td in completions:
+        times.append(encode_dt(dt))
+        adjustments.append(encode_td(td))
+    return times, adjustments
+
+
+def to_bytes(values: array) -> bytes:
+    """
+    The int64 values as little endian bytes, 8 per value.
+    """
+    if sys.byteorder == 'big':
+        values = array('q', values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_bytes(data: bytes) -> array:
+    values = array('q')
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def unpack(times: array, adjustments: array, start: int = 0) -> list:
+    return [(decode_dt(us), decode_td(adj)) for us, adj in zip(times[start:], adjustments[start:])]
+
+
+def insert(times: array, adjustments: array, completion: tuple) -> int:
+    """
+    Insert completion after any with the same datetime and return its
+    position.
+    """
+    us = encode_dt(completion[0])
+    i = bisect_right(times, us)
+    times.insert(i, us)
+    adjustments.insert(i, encode_td(completion[1]))
+    return i
+
+
+class HistoryBlock(Persistent):
+    """
+    A sorted run of older completions, stored as a record of its own so
+    that it is written once when it is filled and not again as later
+    completions are added.
+    """
+
+    def __init__(self, times: array, adjustments: array):
+        self.times = times
+        self.adjustments = adjustments
+
+    def __getstate__(self):
+        return to_bytes(self.times), to_bytes(self.adjustments)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # stored as a list of (datetime, timedelta) tuples before
+            self.times, self.adjustments = pack(state['completions'])
+        else:
+            self.times, self.adjustments = (from_bytes(x) for x in state)
+
+    def __len__(self):
+        return len(self.times)
+
+
+class History:
+    """
+    The completions of a tracker, (datetime, timedelta) tuples in order of
+    their datetimes.
+
+    The completions are stored as pairs of int64 arrays, the datetimes in
+    epoch microseconds and the adjustments in microseconds, eight bytes
+    each, and are only turned back into tuples when they are read.
+
+    The most recent completions are kept in the tail arrays that are pickled
+    with the tracker. Once they hold more than BLOCK_SIZE completions, the
+    oldest BLOCK_SIZE of them are moved into a new HistoryBlock. Adding a
+    completion therefore rewrites at most BLOCK_SIZE completions however long
+    the history is. Completions that are not the latest are inserted with
+    bisect into the tail or into the block holding their datetime.
+    """
+    BLOCK_SIZE = 64
+
+    def __init__(self, completions: list = ()):
+        self.blocks = []
+        # the datetime of the first completion in each block
+        self.firsts = array('q')
+        self.block_length = 0
+        self.times, self.adjustments = pack(sorted(completions, key=lambda x: x[0]))
+        while len(self.times) > self.BLOCK_SIZE:
+            self.spill()
+
+    def __getstate__(self):
+        # arrays are pickled with their type and byte order, the bytes
+        # alone are enough here
+        return (self.blocks, self.block_length, to_bytes(self.firsts),
+                to_bytes(self.times), to_bytes(self.adjustments))
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # stored as lists of tuples and datetimes before
+            self.blocks = state['blocks']
+            self.block_length = state['block_length']
+            self.firsts = array('q', (encode_dt(dt) for dt in state['firsts']))
+            self.times, self.adjustments = pack(state['tail'])
+            return
+        self.blocks, self.block_length, firsts, times, adjustments = state
+        self.firsts, self.times, self.adjustments = from_bytes(firsts), from_bytes(times), from_bytes(adjustments)
+
+    def __len__(self):
+        return self.block_length + len(self.times)
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from unpack(block.times, block.adjustments)
+        yield from unpack(self.times, self.adjustments)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("history index out of range")
+        if i >= self.block_length:
+            times, adjustments = self.times, self.adjustments
+            i -= self.block_length
+        else:
+            for block in self.blocks:
+                if i < len(block):
+                    break
+                i -= len(block)
+            times, adjustments = block.times, block.adjustments
+        return decode_dt(times[i]), decode_td(adjustments[i])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def last_time(self):
+        """
+        The epoch microseconds of the latest completion, or None.
+        """
+        if self.times:
+            return self.times[-1]
+        return self.blocks[-1].times[-1] if self.blocks else None
+
+    def latest(self, n: int) -> list:
+        """
+        The last n completions, oldest first. Blocks are only loaded if the
+        tail holds fewer than n.
+        """
+        if n <= 0:
+            return []
+        if n <= len(self.times):
+            return unpack(self.times, self.adjustments, len(self.times) - n)
+        completions = unpack(self.times, self.adjustments)
+        for block in reversed(self.blocks):
+            completions[:0] = unpack(block.times, block.adjustments, max(len(block) - (n - len(completions)), 0))
+            if len(completions) >= n:
+                break
+        return completions
+
+    def add(self, completion: tuple) -> bool:
+        """
+        Add completion and return True if it is the latest, and so was
+        appended, or False if it was inserted before later completions.
+        """
+        us = encode_dt(completion[0])
+        last = self.last_time()
+        if last is None or us >= last:
+            self.times.append(us)
+            self.adjustments.append(encode_td(completion[1]))
+            self.spill()
+            return True
+        if not self.blocks or us >= self.times[0]:
+            insert(self.times, self.adjustments, completion)
+            self.spill()
+            return False
+        i = max(bisect_right(self.firsts, us) - 1, 0)
+        block = self.blocks[i]
+        insert(block.times, block.adjustments, completion)
+        block._p_changed = True
+        self.firsts[i] = block.times[0]
+        self.block_length += 1
+        return False
+
+    @staticmethod
+    def merge_tails(old: 'History', committed: 'History', new: 'History') -> 'History':
+        """
+        The history with the completions that committed and new, two changes
+        made to old at the same time, each added to its tail, for
+        Tracker._p_resolveConflict(). Raises ConflictError if either changed
+        the blocks or removed a completion. The blocks are only compared by
+        their oids since they are references that cannot be loaded there.
+
+        The merged tail may hold more than BLOCK_SIZE completions until the
+        next completion is added.
+        """
+        from ZODB.POSException import ConflictError
+
+        def layout(history):
+            return [block.oid for block in history.blocks], history.block_length, to_bytes(history.firsts)
+
+        def added(history):
+            remaining = Counter(zip(old.times, old.adjustments))
+            extra = []
+            for completion in zip(history.times, history.adjustments):
+                if remaining[completion]:
+                    remaining[completion] -= 1
+                else:
+                    extra.append(completion)
+            if +remaining:
+                raise ConflictError("completions removed from the history")
+            return extra
+
+        if not layout(old) == layout(committed) == layout(new):
+            raise ConflictError("history blocks changed")
+        added(committed)
+        # those with the same datetime stay in the order they were added
+        merged = sorted(list(zip(committed.times, committed.adjustments)) + added(new), key=lambda x: x[0])
+        history = History.__new__(History)
+        history.blocks = committed.blocks
+        history.block_length = committed.block_length
+        history.firsts = committed.firsts
+        history.times = array('q', (us for us, adj in merged))
+        history.adjustments = array('q', (adj for us, adj in merged))
+        return history
+
+    def spill(self):
+        if len(self.times) <= self.BLOCK_SIZE:
+            return
+        block = HistoryBlock(self.times[:self.BLOCK_SIZE], self.adjustments[:self.BLOCK_SIZE])
+        del self.times[:self.BLOCK_SIZE]
+        del self.adjustments[:self.BLOCK_SIZE]
+        self.blocks.append(block)
+        self.firsts.append(block.times[0])
+        self.block_length += len(block)
@@ -0,0 +1,383 @@
+# trf/index.py
+from bisect import bisect_left, bisect_right
+import heapq
+from itertools import islice
+from datetime import datetime
+from persistent import Persistent
+from BTrees.LLBTree import LLTreeSet, LLSet
+from BTrees.OOBTree import OOTreeSet, OOSet
+from BTrees.Length import Length
+
+from .history import encode_dt
+
+
+# the doc_id is kept in the low bits of an integer sort key, see int_key(),
+# 32 bits as in due.py and the trackers IOBTree
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+# the bits of a time in epoch minutes within a sort value, see time_value(),
+# enough until the year 2990 and, with the groups, to keep a key in 63 bits
+TIME_BITS = 29
+
+
+def int_key(value: int, doc_id: int) -> int:
+    """
+    The integer sort key of doc_id for the sort value value, a non-negative
+    int of at most 31 bits. The doc_id in the low bits keeps the keys unique
+    and breaks ties.
+    """
+    if not 0 <= doc_id <= ID_MASK:
+        raise ValueError(f"doc_id {doc_id} does not fit in an integer sort key")
+    return (value << ID_BITS) | doc_id
+
+
+def time_value(group: int, dt: datetime) -> int:
+    """
+    The sort value of dt in epoch minutes, after every time in the groups
+    before group, e.g., forecasts in group 0 before last completions in
+    group 1. Times within the same minute are ordered by doc_id.
+    """
+    minutes = min(max(encode_dt(dt) // 60_000_000, 0), (1 << TIME_BITS) - 1)
+    return (group << TIME_BITS) + minutes
+
+
+def merge_set_states(old, committed, new):
+    """
+    Merge the states of a bucket of keys changed at the same time by two
+    clients of a shared database, see server.py, or raise ConflictError.
+    Keys removed by either are removed, once if both removed them, and keys
+    inserted by either are kept, so two clients that move the same tracker
+    both leave their new keys, see Tracker._p_resolveConflict(). Changes to
+    the bucket that follows and emptied buckets are left as conflicts, as
+    they are by BTrees.
+    """
+    from ZODB.POSException import ConflictError
+    if committed[1:] != old[1:] or new[1:] != old[1:]:
+        raise ConflictError("the buckets have been split or joined")
+    was, theirs, ours = set(old[0]), set(committed[0]), set(new[0])
+    keys = (was & theirs & ours) | (theirs - was) | (ours - was)
+    if not keys:
+        raise ConflictError("the bucket has been emptied")
+    return (tuple(sorted(keys)), ) + old[1:]
+
+
+class MergedBucket:
+    """
+    A bucket of keys whose conflicting changes are merged by
+    merge_set_states().
+    """
+
+    def _p_resolveConflict(self, old, committed, new):
+        return merge_set_states(old, committed, new)
+
+
+class MergedTree:
+    """
+    A tree of MergedBuckets. A tree small enough to be a single bucket keeps
+    the keys in its own state, and these are merged in the same way.
+    """
+
+    def _p_resolveConflict(self, old, committed, new):
+        states = (old, committed, new)
+        if all(state is not None and len(state) == 1 and len(state[0]) == 1 for state in states):
+            return ((merge_set_states(old[0][0], committed[0][0], new[0][0]), ), )
+        return super()._p_resolveConflict(old, committed, new)
+
+
+class IntBucket(MergedBucket, LLSet):
+    pass
+
+
+class IntKeys(MergedTree, LLTreeSet):
+    """
+    The integer keys of a SortIndex, in buckets of at most 32 keys rather
+    than 120 so that moving a key rewrites a few hundred bytes.
+    """
+    _bucket_type = IntBucket
+    max_leaf_size = 32
+    max_internal_size = 128
+
+
+class Bucket(MergedBucket, OOSet):
+    pass
+
+
+class Keys(MergedTree, OOTreeSet):
+    """
+    The keys of a SortIndex that are not integers, and of a ForecastIndex.
+    """
+    _bucket_type = Bucket
+
+
+class SortIndex(Persistent):
+    """
+    A persistent, incrementally maintained sort order for trackers.
+
+    Each tracker is stored under a sort key that ends with its doc_id so
+    that keys are unique: an int from int_key(), or for an order that is
+    not numeric, such as names, a tuple whose last element is the doc_id.
+    Only the keys are kept here. The keys of each tracker are kept by the
+    tracker itself, see TrackerStore.reindex(), so moving a tracker only
+    rewrites the buckets of the keys moved.
+
+    To find the keys at a position without reading every bucket before it,
+    every SAMPLE_EVERY-th key is kept with its position in a volatile list
+    that is built on first use and adjusted as keys are inserted and
+    removed. The first key of each page listed, and of the page after it,
+    are added to the samples, so that listing them seeks straight to the
+    first key with one search.
+    """
+    SAMPLE_EVERY = 256
+
+    def __init__(self, integer: bool = True):
+        self._keys = IntKeys() if integer else Keys()
+        self._length = Length()
+
+    def __len__(self):
+        return self._length()
+
+    @staticmethod
+    def doc_id(key) -> int:
+        return key & ID_MASK if isinstance(key, int) else key[-1]
+
+    def move(self, old, new, merged=()):
+        """
+        Move a doc_id from key old to key new, either of which is None if
+        the doc_id is being added or removed. merged are the further keys
+        left for the doc_id by changes merged with those of another client,
+        see Tracker._p_resolveConflict(), which are removed as well. Nothing
+        is written if the key is unchanged.
+        """
+        present = {key for key in (old, *merged) if key is not None}
+        if present == {new} or not present and new is None:
+            return
+        if not present:
+            self._length.change(1)
+        elif new is None:
+            self._length.change(-1)
+        for key in present - {new}:
+            self._keys.remove(key)
+            self.moved(key, None)
+        if new is not None and new not in present:
+            self._keys.insert(new)
+            self.moved(None, new)
+
+    def moved(self, old, new):
+        """
+        Adjust the sampled positions after a doc_id has been moved from key
+        old to key new, either of which is None if the doc_id was added or
+        removed. move() calls this, and so does TrackerStore.sync() for the
+        moves made by another client of a shared database, since the trees
+        are reloaded by ZODB but the samples are volatile.
+        """
+        if old == new:
+            return
+        if old is not None:
+            self._sample_removed(old)
+        if new is not None:
+            self._sample_inserted(new)
+
+    def forget_samples(self):
+        """
+        Take the samples again when they are next needed, e.g., after many
+        keys have been changed by another client.
+        """
+        self._v_samples = None
+
+    def clear(self):
+        self._v_samples = None
+        self._keys.clear()
+        self._length.set(0)
+
+    def samples(self) -> tuple[list, list]:
+        """
+        Return the sampled keys and their positions, reading all the keys
+        once if the index has been loaded since they were last needed.
+        """
+        samples = getattr(self, '_v_samples', None)
+        if samples is None:
+            keys = []
+            positions = []
+            for position, key in enumerate(self._keys.keys()):
+                if position % self.SAMPLE_EVERY == 0:
+                    keys.append(key)
+                    positions.append(position)
+                    if self._p_jar is not None and len(keys) % 64 == 0:
+                        # release the buckets already read
+                        self._p_jar.cacheGC()
+            samples = self._v_samples = (keys, positions)
+        return samples
+
+    def _sample_inserted(self, key):
+        samples = getattr(self, '_v_samples', None)
+        if samples is None:
+            return
+        keys, positions = samples
+        for i in range(bisect_right(keys, key), len(positions)):
+            positions[i] += 1
+
+    def _sample_removed(self, key):
+        samples = getattr(self, '_v_samples', None)
+        if samples is None:
+            return
+        keys, positions = samples
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+            del positions[i]
+        for j in range(i, len(positions)):
+            positions[j] -= 1
+
+    def _anchor(self, key, position: int):
+        # add key at position to the samples
+        keys, positions = self.samples()
+        i = bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            keys.insert(i, key)
+            positions.insert(i, position)
+
+    def page(self, start: int, count: int, reverse: bool = False) -> list:
+        """
+        Return the doc_ids in positions start, ..., start + count - 1 of the
+        sort order, or of the reversed sort order if reverse is true. The
+        keys are read from the nearest sampled key at or before start, found
+        with one search, which is the first key of the page itself once the
+        page or the one before it has been listed.
+        """
+        start, count = max(start, 0), max(count, 0)
+        if reverse:
+            stop = max(len(self) - start, 0)
+            start = max(stop - count, 0)
+            count = stop - start
+        for _ in range(2):
+            keys, positions = self.samples()
+            i = bisect_right(positions, start) - 1
+            min_key, skip = (keys[i], start - positions[i]) if i >= 0 else (None, start)
+            if skip <= 4 * self.SAMPLE_EVERY:
+                break
+            # many keys have been inserted or sampled keys removed since the
+            # samples were taken
+            self._v_samples = None
+        found = list(islice(self._keys.keys(min_key), skip, skip + count + 1))
+        if skip and found:
+            self._anchor(found[0], start)
+        if len(found) > count:
+            self._anchor(found.pop(), start + count)
+        doc_ids = [self.doc_id(key) for key in found]
+        if reverse:
+            doc_ids.reverse()
+        return doc_ids
+
+    def position(self, key, reverse: bool = False):
+        """
+        Return the position of key in the sort order, or in the reversed
+        sort order if reverse is true, or None if key is not indexed.
+        """
+        if key is None or key not in self._keys:
+            return None
+        keys, positions = self.samples()
+        i = bisect_right(keys, key) - 1
+        min_key, position = (keys[i], positions[i]) if i >= 0 else (None, 0)
+        # counted by the buckets between the sampled key and key
+        position += len(self._keys.keys(min_key, key)) - 1
+        return len(self) - 1 - position if reverse else position
+
+    def keys(self, min_key=None, max_key=None):
+        """
+        Iterate over the keys from min_key to max_key inclusive in sort
+        order. Only the buckets spanning the range are loaded.
+        """
+        return self._keys.keys(min_key, max_key)
+
+    def doc_ids(self, reverse: bool = False):
+        """
+        Iterate over all doc_ids in sort order.
+        """
+        keys = reversed(list(self._keys.keys())) if reverse else self._keys.keys()
+        for key in keys:
+            yield self.doc_id(key)
+
+
+class ForecastIndex(Persistent):
+    """
+    A persistent index of the forecast and the spread of each tracker with
+    a forecast, in epoch microseconds and microseconds, for finding the
+    trackers whose window, from early = forecast - 2 × η × spread to
+    tardy = forecast + η × spread, overlaps a period.
+
+    Nothing stored depends on η. The keys are (size, forecast, spread,
+    doc_id) where size is the bit length of spread, so the spreads of one
+    size are within a factor of two of each other. The windows of a size
+    that overlap a period all have forecasts in a range that is wider than
+    the period by at most the longest window of the size, and are found
+    with one range search for each size, O(log n + k) for k windows.
+    """
+
+    def __init__(self):
+        self._keys = Keys()
+        self._length = Length()
+
+    def __len__(self):
+        return self._length()
+
+    def move(self, doc_id: int, old, new, merged=()):
+        """
+        Move doc_id from the (forecast, spread) old to new, either of which
+        is None if doc_id is being added or removed, and from the merged
+        ones as well. As in SortIndex, the (forecast, spread) of each
+        tracker is kept by the tracker and nothing is written if it is
+        unchanged.
+        """
+        present = {key for key in (old, *merged) if key is not None}
+        if present == {new} or not present and new is None:
+            return
+        if not present:
+            self._length.change(1)
+        elif new is None:
+            self._length.change(-1)
+        for forecast, spread in present - {new}:
+            self._keys.remove((spread.bit_length(), forecast, spread, doc_id))
+        if new is not None and new not in present:
+            self._keys.insert((new[1].bit_length(), new[0], new[1], doc_id))
+
+    def items(self):
+        """
+        Iterate over the (doc_id, (forecast, spread)) of every tracker, in
+        order of spread size and then of forecast.
+        """
+        for _, forecast, spread, doc_id in self._keys.keys():
+            yield doc_id, (forecast, spread)
+
+    def sizes(self) -> list:
+        """
+        The sizes that have keys, found with one search for each.
+        """
+        sizes = []
+        size = 0
+        while True:
+            try:
+                size = self._keys.minKey((size, ))[0]
+            except ValueError:
+                return sizes
+            sizes.append(size)
+            size += 1
+
+    def overlapping(self, start: int, end: int, eta):
+        """
+        Iterate over the doc_ids of the trackers whose windows overlap the
+        period from start to end, in epoch microseconds, in order of their
+        forecasts. The doc_ids are found as they are iterated over.
+        """
+        from .due import scaled
+
+        def size_overlapping(size):
+            # the longest spread of this size
+            widest = (1 << size) - 1
+            lo = start - scaled(eta, widest)
+            hi = end + scaled(2 * eta, widest)
+            for _, forecast, spread, doc_id in self._keys.keys((size, lo), (size, hi + 1), excludemax=True):
+                if forecast - scaled(2 * eta, spread) <= end and forecast + scaled(eta, spread) >= start:
+                    yield forecast, doc_id
+
+        for _, doc_id in heapq.merge(*(size_overlapping(size) for size in self.sizes())):
+            yield doc_id
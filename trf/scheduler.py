@@ -0,0 +1,218 @@
+# trf/scheduler.py
+"""
+Timed jobs on an asyncio event loop, the loop of the prompt_toolkit
+Application when trf is running, so that everything that changes the
+interface happens in the loop's thread:
+
+    scheduler = Scheduler(invalidate=app.invalidate)
+    app.run(pre_run=scheduler.start)
+
+Jobs given to call_every() and call_later() run on the loop. Blocking work,
+e.g., backups, is given to run_in_executor() and runs in a worker thread.
+A job that wants the interface redrawn calls scheduler.invalidate() and
+the calls made during one pass of the loop result in a single redraw.
+
+For each job the scheduler records how late it started, its latency, and
+how long it ran. A job on the loop overruns if it runs for longer than
+overrun_seconds, since the interface cannot respond meanwhile, and a
+repeating job also overruns if it starts so late that a run was missed.
+A worker job overruns if it is still running when it is next submitted,
+and the new run is then skipped.
+"""
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobStats:
+    """
+    The runs, latency and run time of a job, in seconds.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.runs = 0
+        self.overruns = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+
+    def record(self, latency: float, duration: float, overrun: bool = False):
+        self.runs += 1
+        self.overruns += overrun
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+
+    def format(self) -> str:
+        runs = max(self.runs, 1)
+        return (f"{self.name}: {self.runs} runs, latency {1000*self.total_latency/runs:.1f}ms mean "
+                f"{1000*self.max_latency:.1f}ms max, run time {1000*self.total_duration/runs:.1f}ms mean "
+                f"{1000*self.max_duration:.1f}ms max, {self.overruns} overruns")
+
+
+class Scheduler:
+    """
+    Repeating, delayed and worker jobs on one event loop, with coalesced
+    redraws and the statistics of each job by name.
+    """
+
+    def __init__(self, invalidate=None, workers: int = 1, overrun_seconds: float = 0.05, logger=None):
+        self.loop = None
+        self._invalidate = invalidate
+        self._invalidate_pending = False
+        self.redraws = 0
+        self.redraw_requests = 0
+        self.workers = workers
+        self._executor = None
+        # the futures of the worker jobs that are running, by name
+        self._running = {}
+        # the timer handles of the jobs on the loop, by name, and the jobs
+        # added before start()
+        self._handles = {}
+        self._pending = []
+        self.overrun_seconds = overrun_seconds
+        self.logger = logger
+        self.stats = {}
+
+    def start(self, loop=None):
+        """
+        Bind the scheduler to loop, or to the running loop, and schedule the
+        jobs added before it was started.
+        """
+        self.loop = loop or asyncio.get_running_loop()
+        pending, self._pending = self._pending, []
+        for schedule, args in pending:
+            schedule(*args)
+
+    def stop(self):
+        for handle in self._handles.values():
+            handle.cancel()
+        self._handles.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def job_stats(self, name: str) -> JobStats:
+        if name not in self.stats:
+            self.stats[name] = JobStats(name)
+        return self.stats[name]
+
+    def _run(self, name: str, func, due: float, interval: float = None):
+        """
+        Run func on the loop for the job name that was due at time.time()
+        due and record its latency and run time.
+        """
+        start = time.time()
+        try:
+            func()
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"scheduled job {name} failed: {e!r}")
+        duration = time.time() - start
+        latency = start - due
+        overrun = duration > self.overrun_seconds or (interval is not None and latency >= interval)
+        self.job_stats(name).record(latency, duration, overrun)
+        if overrun and self.logger:
+            self.logger.warning(f"scheduled job {name} overran: started {1000*latency:.1f}ms late, ran {1000*duration:.1f}ms")
+
+    def call_later(self, seconds: float, func, name: str = None):
+        """
+        Run func on the loop after seconds instead of any job still waiting
+        to run under the same name.
+        """
+        name = name or func.__name__
+        if self.loop is None:
+            self._pending.append((self.call_later, (seconds, func, name)))
+            return None
+        self.cancel(name)
+        due = time.time() + seconds
+        self._handles[name] = self.loop.call_later(seconds, self._run, name, func, due)
+        return self._handles[name]
+
+    def call_every(self, seconds: float, func, name: str = None):
+        """
+        Run func on the loop whenever the time is a multiple of seconds, so
+        a job run every 12 seconds runs at 0, 12, 24, 36 and 48 seconds past
+        each minute. A run missed because the loop was busy is skipped.
+        """
+        name = name or func.__name__
+        if self.loop is None:
+            self._pending.append((self.call_every, (seconds, func, name)))
+            return None
+
+        def run(due):
+            self._run(name, func, due, seconds)
+            schedule()
+
+        def schedule():
+            now = time.time()
+            due = math.floor(now / seconds + 1) * seconds
+            self._handles[name] = self.loop.call_later(due - now, run, due)
+
+        schedule()
+        return self._handles[name]
+
+    def cancel(self, name: str):
+        handle = self._handles.pop(name, None)
+        if handle is not None:
+            handle.cancel()
+
+    def run_in_executor(self, func, *args, name: str = None):
+        """
+        Run func(*args) in a worker thread and return an asyncio future for
+        its result, or None if the previous run of the job name is still
+        running, which counts as an overrun.
+        """
+        name = name or func.__name__
+        running = self._running.get(name)
+        if running is not None and not running.done():
+            self.job_stats(name).overruns += 1
+            if self.logger:
+                self.logger.warning(f"worker job {name} is still running, skipping this run")
+            return None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='trf-worker')
+        submitted = time.time()
+        started = []
+
+        def work():
+            started.append(time.time())
+            return func(*args)
+
+        def done(future):
+            end = time.time()
+            start = started[0] if started else end
+            self.job_stats(name).record(start - submitted, end - start)
+            if not future.cancelled() and future.exception() is not None and self.logger:
+                self.logger.error(f"worker job {name} failed: {future.exception()!r}")
+
+        future = self.loop.run_in_executor(self._executor, work)
+        future.add_done_callback(done)
+        self._running[name] = future
+        return future
+
+    def invalidate(self):
+        """
+        Ask for the interface to be redrawn once the current pass of the loop
+        is done. This may be called from any thread.
+        """
+        self.redraw_requests += 1
+        if self._invalidate_pending or self.loop is None:
+            return
+        self._invalidate_pending = True
+        self.loop.call_soon_threadsafe(self._redraw)
+
+    def _redraw(self):
+        self._invalidate_pending = False
+        self.redraws += 1
+        if self._invalidate is not None:
+            self._invalidate()
+
+    def report(self) -> str:
+        lines = [stats.format() for stats in self.stats.values()]
+        lines.append(f"redraws: {self.redraws} for {self.redraw_requests} requests")
+        return "\n".join(lines)
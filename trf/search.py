@@ -0,0 +1,151 @@
+# trf/search.py
+from bisect import bisect_left, bisect_right, insort
+
+# sorts after any character that can follow a prefix
+LAST_CHAR = '\U0010ffff'
+
+
+def prefix_range(entries: list, prefix: str) -> tuple[int, int]:
+    """
+    The positions in the sorted (string, doc_id) entries of those whose
+    string starts with prefix.
+    """
+    return bisect_left(entries, (prefix, )), bisect_left(entries, (prefix + LAST_CHAR, ))
+
+
+class NameIndex:
+    """
+    An in-memory index of tracker names for finding trackers as a name is
+    typed. Names are compared ignoring case and a query matches, ranked in
+    this order,
+
+        the names that start with the query,
+        the names with a word starting with each word of the query,
+        the names containing each word of the query.
+
+    The names and their words are kept in sorted lists so the first two
+    are found with bisect. The last is only looked for when the others are
+    too few, with str.find in the names joined into one string. Names added
+    later are appended to the string and those removed are only dropped
+    when a quarter of it has been removed and it is built again.
+    """
+
+    def __init__(self, names=()):
+        # doc_id -> name
+        self.names = {}
+        # sorted (casefolded name, doc_id) and (casefolded word, doc_id)
+        self.sorted_names = []
+        self.words = []
+        self._text = None
+        self._starts = []
+        # doc_id, or None once removed, for each name in _text
+        self._ids = []
+        self._slots = {}
+        self._removed = 0
+        for doc_id, name in names:
+            self.names[doc_id] = name
+            folded = name.casefold()
+            self.sorted_names.append((folded, doc_id))
+            self.words.extend((word, doc_id) for word in set(folded.split()))
+        self.sorted_names.sort()
+        self.words.sort()
+        self.text()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, doc_id: int, name: str):
+        if doc_id in self.names:
+            self.remove(doc_id)
+        self.names[doc_id] = name
+        folded = name.casefold()
+        insort(self.sorted_names, (folded, doc_id))
+        for word in set(folded.split()):
+            insort(self.words, (word, doc_id))
+        self._slots[doc_id] = len(self._ids)
+        self._starts.append(len(self._text))
+        self._ids.append(doc_id)
+        self._text += folded + '\n'
+
+    def remove(self, doc_id: int):
+        name = self.names.pop(doc_id, None)
+        if name is None:
+            return
+        folded = name.casefold()
+        for entries, key in [(self.sorted_names, folded)] + [(self.words, word) for word in set(folded.split())]:
+            i = bisect_left(entries, (key, doc_id))
+            if i < len(entries) and entries[i] == (key, doc_id):
+                del entries[i]
+        self._ids[self._slots.pop(doc_id)] = None
+        self._removed += 1
+        if self._removed > len(self._ids) // 4:
+            self._text = None
+            self.text()
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """
+        Return the doc_ids of at most limit trackers whose names match
+        query, best first.
+        """
+        query = ' '.join(query.casefold().split())
+        if not query or limit <= 0:
+            return []
+        found = []
+        seen = set()
+
+        def add(doc_id):
+            if doc_id not in seen:
+                seen.add(doc_id)
+                found.append(doc_id)
+            return len(found) >= limit
+
+        lo, hi = prefix_range(self.sorted_names, query)
+        for i in range(lo, hi):
+            if add(self.sorted_names[i][1]):
+                return found
+
+        words = query.split()
+        # walk the matches of the word with the fewest and check the others
+        ranges = [prefix_range(self.words, word) for word in words]
+        lo, hi = min(ranges, key=lambda r: r[1] - r[0])
+        for i in range(lo, hi):
+            doc_id = self.words[i][1]
+            if doc_id in seen:
+                continue
+            name_words = self.names[doc_id].casefold().split()
+            if all(any(x.startswith(word) for x in name_words) for word in words):
+                if add(doc_id):
+                    return found
+
+        text = self.text()
+        # look for the word that occurs least often
+        word = min(words, key=text.count) if len(words) > 1 else words[0]
+        position = text.find(word)
+        while position >= 0:
+            i = bisect_right(self._starts, position) - 1
+            doc_id = self._ids[i]
+            if doc_id is not None and doc_id not in seen:
+                name = text[self._starts[i]:text.find('\n', position)]
+                if all(x in name for x in words) and add(doc_id):
+                    break
+            # continue after this name
+            position = text.find(word, text.find('\n', position))
+        return found
+
+    def text(self) -> str:
+        """
+        The casefolded names, each ending with a newline.
+        """
+        if self._text is None:
+            self._ids = list(self.names)
+            self._slots = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            self._removed = 0
+            folded = [self.names[doc_id].casefold() + '\n' for doc_id in self._ids]
+            starts = []
+            position = 0
+            for name in folded:
+                starts.append(position)
+                position += len(name)
+            self._starts = starts
+            self._text = ''.join(folded)
+        return self._text
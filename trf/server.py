@@ -0,0 +1,182 @@
+# trf/server.py
+"""
+A ZEO server for the database of a trf home, so that several trf processes,
+e.g., the interface in two terminals and a cron job recording completions,
+can use the trackers at the same time. FileStorage locks trf.fs, so without
+the server only one process can open it. With the server, only the server
+opens trf.fs and each trf process is a client with its own connection.
+
+The server listens on the Unix socket trf.sock in the trf home. The first
+client that needs it starts it in a process of its own,
+
+    python -m trf.server <trf home>
+
+and it exits once it has had no clients for IDLE_SECONDS. ZEO is optional,
+pip install trf-dgraham[zeo], and is only imported when the server is used.
+
+The server sends the changes committed by one client to the others as
+invalidations. When two clients change the same tracker at once, the second
+commit conflicts. Tracker._p_resolveConflict() merges the completions they
+added, and the store redoes any change whose conflict cannot be merged, see
+retried() in core.py.
+"""
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+SOCKET_NAME = 'trf.sock'
+# how long the server keeps running without clients
+IDLE_SECONDS = 300
+# how long a client waits for the server to start
+START_SECONDS = 10
+
+logger = logging.getLogger('trf.server')
+
+
+def socket_path(trf_home: str) -> str:
+    return os.path.join(trf_home, SOCKET_NAME)
+
+
+def is_running(address: str) -> bool:
+    """
+    True if a server accepts connections on the Unix socket address. The
+    socket file alone is not enough since a server that did not exit
+    cleanly leaves it behind.
+    """
+    if not os.path.exists(address):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(address)
+        except OSError:
+            return False
+    return True
+
+
+def is_client(storage) -> bool:
+    """
+    True if storage is a connection to a server rather than trf.fs itself.
+    """
+    client = sys.modules.get('ZEO.ClientStorage')
+    return client is not None and isinstance(storage, client.ClientStorage)
+
+
+def start_server(trf_home: str, timeout: float = START_SECONDS) -> str:
+    """
+    Start the server for trf_home unless it is running and return its
+    address once it accepts connections. A server started by another client
+    at the same moment gives up since it cannot lock trf.fs, and one that
+    gives up because a process without the server holds the lock is started
+    again until timeout.
+    """
+    address = socket_path(trf_home)
+    # the package may not be installed, e.g., when run from a checkout
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        x for x in (package_parent, os.environ.get('PYTHONPATH')) if x))
+    deadline = time.time() + timeout
+    process = None
+    while not is_running(address):
+        if time.time() > deadline:
+            raise RuntimeError(f"the trf server for {trf_home} did not start, "
+                               f"see {os.path.join(trf_home, 'logs', 'server.log')}")
+        if process is None or process.poll() is not None:
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'trf.server', trf_home], env=env,
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                start_new_session=True)
+        time.sleep(0.05)
+    return address
+
+
+def connect(trf_home: str, read_only: bool = False, start: bool = True):
+    """
+    Return a ClientStorage for the server of trf_home, starting the server
+    first if start.
+    """
+    try:
+        from ZEO.ClientStorage import ClientStorage
+    except ImportError:
+        raise RuntimeError("sharing the database needs ZEO, pip install 'trf-dgraham[zeo]'")
+
+    class Client(ClientStorage):
+        # the last transaction whose invalidations have been received. ZEO
+        # passes them on to the connections before lastTransaction() returns
+        # it, so a connection may briefly show a transaction after it, see
+        # TrackerStore.view_moved()
+        last_invalidated = b'\0' * 8
+
+        def invalidateTransaction(self, tid, oids):
+            self.last_invalidated = tid
+            super().invalidateTransaction(tid, oids)
+
+    address = start_server(trf_home) if start else socket_path(trf_home)
+    return Client(address, read_only=read_only, wait_timeout=START_SECONDS)
+
+
+def num_clients(server) -> int:
+    return sum(len(clients) for clients in server.zeo_storages_by_storage_id.values())
+
+
+def serve(trf_home: str, idle_seconds: float = IDLE_SECONDS) -> int:
+    """
+    Serve trf.fs in trf_home on its socket until there have been no clients
+    for idle_seconds or the process is terminated.
+    """
+    import ZODB.FileStorage
+    from ZEO.StorageServer import StorageServer
+    from zc.lockfile import LockError
+    db_path = os.path.join(trf_home, 'trf.fs')
+    try:
+        # taking the lock first means a single server per trf home
+        storage = ZODB.FileStorage.FileStorage(db_path, pack_keep_old=False)
+    except LockError:
+        logger.info(f"{db_path} is in use by another process, not serving it")
+        return 1
+    address = socket_path(trf_home)
+    if os.path.exists(address):
+        # left by a server that did not exit cleanly
+        os.remove(address)
+    server = StorageServer(address, {'1': storage})
+    server.start_thread()
+    logger.info(f"serving {db_path} on {address}")
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, lambda *args: stop.set())
+    idle_since = time.time()
+    while not stop.wait(1):
+        if num_clients(server):
+            idle_since = time.time()
+        elif time.time() - idle_since > idle_seconds:
+            logger.info(f"no clients for {idle_seconds} seconds")
+            break
+    server.close()
+    if os.path.exists(address):
+        os.remove(address)
+    logger.info(f"stopped serving {db_path}")
+    return 0
+
+
+def main():
+    trf_home = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else os.environ.get('TRFHOME', os.getcwd()))
+    log_dir = os.path.join(trf_home, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(log_dir, 'server.log'), level=logging.INFO,
+        format='--- %(asctime)s - %(levelname)s - %(name)s\n    %(message)s', datefmt="%y-%m-%d %H:%M:%S")
+    # only the warnings of ZEO, less the disconnections of the probes made
+    # by is_running(), which connect and hang up at once
+    logging.getLogger('ZEO').setLevel(logging.WARNING)
+    logging.getLogger('ZEO.asyncio.server').addFilter(
+        lambda record: not record.getMessage().startswith(('Disconnected ConnectionResetError', 'Disconnected BrokenPipeError')))
+    sys.exit(serve(trf_home))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# trf/startup.py
+"""
+Timing of the startup sequence, reported by 'trf --startup-profile'.
+
+This is imported first by trf/__main__.py so that the times are measured
+from the moment trf starts loading.
+"""
+import time
+
+
+class StartupProfile:
+    def __init__(self):
+        self.enabled = False
+        self.start = time.perf_counter()
+        self.marks = []
+
+    def mark(self, label: str):
+        """
+        Record that the startup step named label has just finished.
+        """
+        self.marks.append((label, time.perf_counter()))
+
+    def elapsed(self, label: str) -> float:
+        """
+        Seconds from the start until the step named label finished.
+        """
+        for name, t in self.marks:
+            if name == label:
+                return t - self.start
+        return None
+
+    def report(self) -> str:
+        lines = [f"startup {'step':<18} {'ms':>8} {'total ms':>9}"]
+        last = self.start
+        for label, t in self.marks:
+            lines.append(f"startup {label:<18} {1000*(t - last):8.1f} {1000*(t - self.start):9.1f}")
+            last = t
+        return "\n".join(lines)
+
+
+profile = StartupProfile()
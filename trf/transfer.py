@@ -0,0 +1,253 @@
+# trf/transfer.py
+"""
+Streaming export and import of trackers with their histories.
+
+Each tracker is one record. In JSON Lines a record is an object:
+
+    {"id": 3, "name": "oil change", "created": "2024-01-05T09:12:00",
+     "modified": "2024-06-02T17:40:00",
+     "history": [["2024-03-01T10:00:00", 0], ["2024-06-02T17:40:00", 86400]]}
+
+where each completion is its datetime and its adjustment in seconds. A CSV
+file has the columns id, name, created, modified and history, with the
+completions of the history written as "datetime seconds" and separated by
+semicolons.
+
+Exporting walks the trackers BTree and deactivates each tracker once it is
+written so only one bucket of trackers is in memory at a time. Importing
+reads a bounded number of records ahead, parses them in a pool of worker
+processes and commits them in batches. The position in the source file is
+committed in the same transaction as each batch, so an interrupted import
+resumes after the last committed batch when it is run again.
+"""
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from datetime import datetime, timedelta
+
+FORMATS = ('jsonl', 'csv')
+FIELDS = ('id', 'name', 'created', 'modified', 'history')
+
+# trackers per commit, and per chunk handed to a worker
+BATCH_SIZE = 1000
+# the root key of the position of an unfinished import
+IMPORT_STATE = 'import_state'
+
+
+def guess_format(path: str) -> str:
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def tracker_record(tracker) -> dict:
+    return {
+        'id': tracker.doc_id,
+        'name': tracker.name,
+        'created': tracker.created.isoformat(),
+        'modified': tracker.modified.isoformat(),
+        'history': [[dt.isoformat(), round(td.total_seconds())] for dt, td in tracker.history],
+    }
+
+
+def format_history(history: list) -> str:
+    return ';'.join(f"{dt} {seconds}" for dt, seconds in history)
+
+
+def export_trackers(store, out, fmt: str = 'jsonl') -> tuple[int, int]:
+    """
+    Write every tracker in store to the text file out and return the number
+    of trackers and of completions written.
+    """
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(FIELDS)
+    num_trackers = num_completions = 0
+    for tracker in store.trackers.values():
+        record = tracker_record(tracker)
+        if writer:
+            record['history'] = format_history(record['history'])
+            writer.writerow([record[field] for field in FIELDS])
+        else:
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write('\n')
+        num_trackers += 1
+        num_completions += len(tracker.history)
+        # unchanged, so this only turns the tracker back into a ghost
+        tracker._p_deactivate()
+        if num_trackers % BATCH_SIZE == 0:
+            store.connection.cacheGC()
+    return num_trackers, num_completions
+
+
+def parse_history(history) -> list[tuple[datetime, timedelta]]:
+    if isinstance(history, str):
+        history = [x.split(' ') for x in history.split(';') if x]
+    completions = [(datetime.fromisoformat(dt), timedelta(seconds=int(seconds))) for dt, seconds in history]
+    completions.sort(key=lambda x: x[0])
+    return completions
+
+
+def parse_records(fmt: str, records: list) -> list:
+    """
+    Parse raw JSON lines or CSV rows into (id, name, created, modified,
+    history) tuples. This runs in the worker processes so it only uses the
+    standard library. A record that cannot be parsed becomes an error
+    message string instead.
+    """
+    parsed = []
+    for position, record in records:
+        try:
+            if fmt == 'csv':
+                record = dict(zip(FIELDS, record))
+            else:
+                record = json.loads(record)
+            parsed.append((
+                int(record['id']),
+                record['name'],
+                datetime.fromisoformat(record['created']),
+                datetime.fromisoformat(record['modified']),
+                parse_history(record['history']),
+            ))
+        except (ValueError, KeyError, TypeError) as e:
+            parsed.append(f"record {position}: {e!r}")
+    return parsed
+
+
+def read_records(f, fmt: str):
+    """
+    Iterate over the raw records of f, a JSON line or a CSV row at a time,
+    numbered from 1.
+    """
+    if fmt == 'csv':
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is not None and tuple(header) != FIELDS:
+            raise ValueError(f"expected the CSV columns {', '.join(FIELDS)}")
+        rows = reader
+    else:
+        rows = (line for line in f if line.strip())
+    for position, row in enumerate(rows, 1):
+        yield position, row
+
+
+def read_chunks(records, skip: int, size: int):
+    """
+    Group records into lists of at most size records, leaving out the first
+    skip records.
+    """
+    chunk = []
+    for position, record in records:
+        if position <= skip:
+            continue
+        chunk.append((position, record))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def source_state(path: str) -> dict:
+    stat = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime, 'records': 0}
+
+
+def add_imported(store, parsed: list, errors: list) -> int:
+    """
+    Add the parsed trackers to store, keeping their ids unless an id is
+    already taken, and return the number of completions added.
+    """
+    from .core import Tracker
+    num_completions = 0
+    for item in parsed:
+        if isinstance(item, str):
+            errors.append(item)
+            continue
+        doc_id, name, created, modified, history = item
+        if doc_id in store.trackers or doc_id < 1:
+            doc_id = store.root['next_id']
+        store.root['next_id'] = max(store.root['next_id'], doc_id + 1)
+        tracker = Tracker(name, doc_id)
+        tracker.record_completions(history)
+        tracker.created = created
+        tracker.modified = modified
+        store.update_tracker(doc_id, tracker)
+        num_completions += len(tracker.history)
+    return num_completions
+
+
+def import_trackers(store, path: str, fmt: str = None, workers: int = None,
+                    batch_size: int = BATCH_SIZE, restart: bool = False, logger=None) -> tuple[int, int, list]:
+    """
+    Import the trackers in the file at path, or in stdin if path is '-',
+    into store and return the number of trackers and completions imported
+    together with the messages for records that could not be parsed.
+
+    At most 2 * workers chunks of batch_size records are read ahead. With
+    workers 0 the records are parsed in this process. Each chunk is added in
+    one commit together with the number of records read so far. An import
+    of the same, unchanged file that was interrupted continues from there
+    unless restart is true.
+    """
+    fmt = fmt or guess_format(path)
+    if workers is None:
+        workers = os.cpu_count() or 1
+        workers = 0 if workers < 2 else workers
+    state = None
+    skip = 0
+    if path != '-':
+        state = source_state(path)
+        previous = store.root.get(IMPORT_STATE)
+        if previous and not restart:
+            if {k: previous[k] for k in ('source', 'size', 'mtime')} != {k: state[k] for k in ('source', 'size', 'mtime')}:
+                raise ValueError(f"an import of {previous['source']} was interrupted, finish it or use --restart")
+            skip = previous['records']
+            if logger:
+                logger.info(f"resuming the import of {path} after record {skip}")
+        f = open(path, newline='' if fmt == 'csv' else None, encoding='utf-8')
+    else:
+        f = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='' if fmt == 'csv' else None)
+
+    num_trackers = num_completions = 0
+    errors = []
+
+    def commit(parsed: list):
+        nonlocal num_trackers, num_completions
+        with store.batch():
+            num_completions += add_imported(store, parsed, errors)
+            num_trackers += sum(1 for item in parsed if not isinstance(item, str))
+            if state is not None:
+                state['records'] = parsed_records
+                store.root[IMPORT_STATE] = dict(state)
+        # the imported trackers are no longer needed in memory
+        store.connection.cacheGC()
+
+    parsed_records = skip
+    chunks = read_chunks(read_records(f, fmt), skip, batch_size)
+    try:
+        if not workers:
+            for chunk in chunks:
+                parsed_records = chunk[-1][0]
+                commit(parse_records(fmt, chunk))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(workers) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append((chunk[-1][0], pool.submit(parse_records, fmt, chunk)))
+                    if len(pending) >= 2 * workers:
+                        parsed_records, future = pending.popleft()
+                        commit(future.result())
+                while pending:
+                    parsed_records, future = pending.popleft()
+                    commit(future.result())
+    finally:
+        if path != '-':
+            f.close()
+    if IMPORT_STATE in store.root:
+        del store.root[IMPORT_STATE]
+        store.save_data()
+    return num_trackers, num_completions, errors
@@ -2,7 +2,6 @@
 from typing import List, Dict, Any, Callable, Mapping
 from collections import OrderedDict
 import logging
-from logging.handlers import TimedRotatingFileHandler
 from prompt_toolkit import Application
 from prompt_toolkit.layout import Layout
 from prompt_toolkit.layout.containers import (
@@ -23,7 +22,6 @@ from prompt_toolkit.styles.named_colors import NAMED_COLORS
 from prompt_toolkit.lexers import Lexer
 from prompt_toolkit.search import start_search, SearchDirection
 from datetime import datetime, timedelta, date
-import time
 from prompt_toolkit.widgets import (
     TextArea,
     Frame,
@@ -40,10 +38,8 @@ from prompt_toolkit.key_binding.bindings.focus import (
 from prompt_toolkit.application.current import get_app
 from prompt_toolkit.key_binding import KeyBindings
 from io import StringIO
-from dateutil.parser import parse, parserinfo
 import string
 import shutil
-import threading
 import traceback
     # initialize the tracker manager as a singleton instance
 import textwrap
@@ -55,83 +51,31 @@ from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.widgets import TextArea
 from prompt_toolkit.layout import Layout, Float, FloatContainer, Window
 import logging
-from persistent import Persistent
-import pyperclip
 import importlib.resources
 import glob
-import lorem
-from lorem.text import TextLorem
 from .__version__ import version
-from . import trf_home, log_level, restore, backup_dir, db_path
-from .backup import backup_to_zip, rotate_backups, restore_from_zip
-from ruamel.yaml import YAML
-from ruamel.yaml.comments import CommentedMap
-import ZODB, ZODB.FileStorage
+from . import trf_home, log_level, restore, backup_dir, db_path, startup_profile, server
+from .startup import profile
+from .backup import backup_to_zip, rotate_backups, backup_and_pack, restore_from_zip
+from .scheduler import Scheduler
+from .due import STATES
+from .core import (
+    Tracker, TrackerStore, setup_logging, init_db, close_db, default_settings,
+    wrap, unwrap, NON_PRINTING_CHAR, PLACEHOLDER, NON_BREAKING_HYPHEN, ZWNJ,
+    PLUS_OR_MINUS, OPEN_CIRCLE, CLOSED_CIRCLE, ETA, APPROX, UP, DOWN, RIGHT,
+)
 import transaction
 
+profile.mark('import libraries')
+
 freq = 12
+# how often the changes made by other trf processes sharing the database are
+# looked for, see sync_store()
+sync_freq = 2
 mode = 'main'
 
-def setup_logging(trf_home, log_level=logging.INFO, backup_count=7):
-    """
-    Set up logging with daily rotation and a specified log level.
-
-    Args:
-        trf_home (str): The home directory for storing log files.
-        log_level (int): The log level (e.g., logging.DEBUG, logging.INFO).
-        backup_count (int): Number of backup log files to keep.
-    """
-    global db, connection, root, transaction
-    log_dir = os.path.join(trf_home, "logs")
-
-    # Ensure the logs directory exists
-    os.makedirs(log_dir, exist_ok=True)
-
-    logfile = os.path.join(log_dir, "trf.log")
-
-    # Create a TimedRotatingFileHandler for daily log rotation
-    handler = TimedRotatingFileHandler(
-        logfile, when="midnight", interval=1, backupCount=backup_count
-    )
-
-    # Set the suffix to add the date and ".log" extension to the rotated files
-    handler.suffix = "%y%m%d.log"
-
-    # Create a formatter
-    formatter = logging.Formatter(
-        fmt='--- %(asctime)s - %(levelname)s - %(module)s.%(funcName)s\n    %(message)s',
-        datefmt="%y-%m-%d %H:%M:%S"
-    )
-
-    # Set the formatter to the handler
-    handler.setFormatter(formatter)
-
-    # Define a custom namer function to change the log file naming format
-    def custom_namer(filename):
-        # Replace "tracker.log." with "tracker-" in the rotated log filename
-        return filename.replace("trf.log.", "trf")
-
-    # Set the handler's namer function
-    handler.namer = custom_namer
-
-    # Get the root logger
-    logger = logging.getLogger()
-    logger.setLevel(log_level)
-
-    # Clear any existing handlers (if needed)
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
-    # Add the TimedRotatingFileHandler to the logger
-    logger.addHandler(handler)
-
-    logger.info("Logging setup complete.")
-    logging.info(f"\n### Logging initialized at level {log_level} ###")
-
-    return logger
-
-# Set up logging
-logger = setup_logging(trf_home=trf_home, log_level=log_level, backup_count=7)
+# Logging is set up by startup()
+logger = logging.getLogger()
 
 def cleanup_old_logs():
     backup_count = 7
@@ -146,25 +90,6 @@ def cleanup_old_logs():
             logger.debug(f"Removed old log file: {log_file}")
         logger.info(f"Cleaned up {count} old log files.")
 
-def init_db(db_path):
-    """
-    Initialize the ZODB database using the specified file.
-    """
-    storage = ZODB.FileStorage.FileStorage(db_path)
-    db = ZODB.DB(storage)
-    connection = db.open()
-    root = connection.root()
-    return storage, db, connection, root, transaction
-
-
-def close_db(db, connection):
-    """
-    Close the ZODB database and its connection.
-    """
-    connection.close()
-    db.close()
-
-
 def clear_screen():
     # For Windows
     if os.name == 'nt':
@@ -173,688 +98,68 @@ def clear_screen():
     else:
         os.system('clear')
 
-# Initialize YAML object
-yaml = YAML()
-
-# Create a CommentedMap, which behaves like a Python dictionary but supports comments
-settings_map = CommentedMap({
-    'ampm': True,
-    'yearfirst': True,
-    'dayfirst': False,
-    'η': 2,
-})
-# Add comments to the dictionary
-settings_map.yaml_set_comment_before_after_key(
-    'ampm',
-    before='trf settings\n\n[ampm] Display 12-hour times with AM or PM if true, \notherwise display 24-hour times'
-    )
-settings_map.yaml_set_comment_before_after_key(
-    'yearfirst',
-    before='\n[yearfirst] When parsing ambiguous dates, assume the year is first \nif true, otherwise assume the month is first'
-    )
-settings_map.yaml_set_comment_before_after_key(
-    'dayfirst',
-    before='\n[dayfirst] When parsing ambiguous dates, assume the day is first \nif true, otherwise assume the month is first'
-    )
-settings_map.yaml_set_comment_before_after_key(
-    'η',
-    before='\n[η] Use this integer multiple of "spread" for setting the \ntimely-to-tardy next confidence interval'
-    )
-
 
-# this will be set in main() as a global variable
-# logger = None
-
-# Non-printing character
-NON_PRINTING_CHAR = '\u200B'
-# Placeholder for spaces within special tokens
-PLACEHOLDER = '\u00A0'
-# Placeholder for hyphens to prevent word breaks
-NON_BREAKING_HYPHEN = '\u2011'
-# Placeholder for zero-width non-joiner
-ZWNJ = '\u200C'
-PLUS_OR_MINUS = '±'
-
-# For showing active page in pages, e.g.,  ○ ○ ⏺ ○ = page 3 of 4 pages
-OPEN_CIRCLE = '○'
-CLOSED_CIRCLE = '⏺'
-ETA = 'η'
-APPROX = '≈'
-
-UP = '↑'
-DOWN = '↓'
-RIGHT = '→'
-
-
-def wrap(text: str, indent: int = 3, width: int = shutil.get_terminal_size()[0] - 3):
-    # Preprocess to replace spaces within specific "@\S" patterns with PLACEHOLDER
-    text = preprocess_text(text)
-    numbered_list = re.compile(r'^\d+\.\s.*')
-
-    # Split text into paragraphs
-    paragraphs = text.split('\n')
-
-    # Wrap each paragraph
-    wrapped_paragraphs = []
-    for para in paragraphs:
-        leading_whitespace = re.match(r'^\s*', para).group()
-        initial_indent = leading_whitespace
-
-        # Determine subsequent_indent based on the first non-whitespace character
-        stripped_para = para.lstrip()
-        if stripped_para.startswith(('+', '-', '*', '%', '!', '~')):
-            subsequent_indent = initial_indent + ' ' * 2
-        elif stripped_para.startswith(('@', '&')):
-            subsequent_indent = initial_indent + ' ' * 3
-        # elif stripped_para and stripped_para[0].isdigit():
-        elif stripped_para and numbered_list.match(stripped_para):
-            subsequent_indent = initial_indent + ' ' * 3
-        else:
-            subsequent_indent = initial_indent + ' ' * indent
-
-        wrapped = textwrap.fill(
-            para,
-            initial_indent='',
-            subsequent_indent=subsequent_indent,
-            width=width)
-        wrapped_paragraphs.append(wrapped)
-
-    # Join paragraphs with newline followed by non-printing character
-    wrapped_text = ('\n' + NON_PRINTING_CHAR).join(wrapped_paragraphs)
-
-    # Postprocess to replace PLACEHOLDER and NON_BREAKING_HYPHEN back with spaces and hyphens
-    wrapped_text = postprocess_text(wrapped_text)
-
-    return wrapped_text
-
-def preprocess_text(text):
-    # Regex to find "@\S" patterns and replace spaces within the pattern with PLACEHOLDER
-    text = re.sub(r'(@\S+\s\S+)', lambda m: m.group(0).replace(' ', PLACEHOLDER), text)
-    # Replace hyphens within words with NON_BREAKING_HYPHEN
-    text = re.sub(r'(\S)-(\S)', lambda m: m.group(1) + NON_BREAKING_HYPHEN + m.group(2), text)
-        # logger.debug(f"listing {self.active_page = }, {start_index = }, {end_index = }")
-    return text
-
-def postprocess_text(text):
-    text = text.replace(PLACEHOLDER, ' ')
-    text = text.replace(NON_BREAKING_HYPHEN, '-')
-    return text
-
-def unwrap(wrapped_text):
-    # Split wrapped text into paragraphs
-    paragraphs = wrapped_text.split('\n' + NON_PRINTING_CHAR)
-
-    # Replace newlines followed by spaces in each paragraph with a single space
-    unwrapped_paragraphs = []
-    for para in paragraphs:
-        unwrapped = re.sub(r'\n\s*', ' ', para)
-        unwrapped_paragraphs.append(unwrapped)
-
-    # Join paragraphs with original newlines
-    unwrapped_text = '\n'.join(unwrapped_paragraphs)
-
-    return unwrapped_text
-
-def sort_key(tracker):
-    # Sorting by None first (using doc_id as secondary sorting)
-    if tracker.next_expected_completion is None:
-        return (0, tracker.doc_id)
-    # Sorting by datetime for non-None values
-    else:
-        return (1, tracker.next_expected_completion)
-
-# this is a singleton instance initialized in main()
-class Tracker(Persistent):
-    max_history = 12 # depending on width, 6 rows of 2, 4 rows of 3, 3 rows of 4, 2 rows of 6
-
-    @classmethod
-    def format_dt(cls, dt: Any, long=False) -> str:
-        if not isinstance(dt, datetime):
-            return ""
-        if long:
-            return dt.strftime("%Y-%m-%d %H:%M")
-        return dt.strftime("%y%m%dT%H%M")
-
-    @classmethod
-    def td2seconds(cls, td: timedelta) -> str:
-        if not isinstance(td, timedelta):
-            return ""
-        return f"{round(td.total_seconds())}"
-
-    @classmethod
-    def format_td(cls, td: timedelta, short=0):
-        if not isinstance(td, timedelta):
-            return None
-        sign = '+' if td.total_seconds() >= 0 else '-'
-        total_seconds = abs(int(td.total_seconds()))
-        if total_seconds == 0:
-            # return '0 minutes '
-            return '0m' if short else '+0m'
-        total_seconds = abs(total_seconds)
-        try:
-            until = []
-            days = hours = minutes = 0
-            if total_seconds:
-                minutes = total_seconds // 60
-                if minutes >= 60:
-                    hours = minutes // 60
-                    minutes = minutes % 60
-                if hours >= 24:
-                    days = hours // 24
-                    hours = hours % 24
-            if days:
-                until.append(f'{days}d')
-            if hours:
-                until.append(f'{hours}h')
-            if minutes:
-                until.append(f'{minutes}m')
-            if not until:
-                until.append('0m')
-            if short == 1:
-                ret = ''.join(until[:2]) if short else sign + ''.join(until)
-            elif short == 2:
-                ret = f"{round(days + hours/24 + minutes/(60*24), 1)}"
-            elif short == 3:
-                ret = f"{round(days + hours/24 + minutes/(60*24), 1)}d"
-            logger.debug(f'{td = }, {short = }: {ret = }')
-            return ret
-        except Exception as e:
-            logger.error(f'{td}: {e}')
-            return ''
-
-    @classmethod
-    def format_completion(cls, completion: tuple[datetime, timedelta], long=False)->str:
-        dt, td = completion
-        return f"{cls.format_dt(dt, long=True)}, {cls.format_td(td)}"
-
-    @classmethod
-    def parse_td(cls, td:str)->tuple[bool, timedelta]:
-        """\
-        Take a period string and return a corresponding timedelta.
-        Examples:
-            parse_duration('-2w3d4h5m')= Duration(weeks=-2,days=3,hours=4,minutes=5)
-            parse_duration('1h30m') = Duration(hours=1, minutes=30)
-            parse_duration('-10m') = Duration(minutes=10)
-        where:
-            d: days
-            h: hours
-            m: minutes
-            s: seconds
-
-        >>> 3*60*60+5*60
-        11100
-        >>> parse_duration("2d-3h5m")[1]
-        Duration(days=1, hours=21, minutes=5)
-        >>> datetime(2015, 10, 15, 9, 0, tz='local') + parse_duration("-25m")[1]
-        DateTime(2015, 10, 15, 8, 35, 0, tzinfo=ZoneInfo('America/New_York'))
-        >>> datetime(2015, 10, 15, 9, 0) + parse_duration("1d")[1]
-        DateTime(2015, 10, 16, 9, 0, 0, tzinfo=ZoneInfo('UTC'))
-        >>> datetime(2015, 10, 15, 9, 0) + parse_duration("1w-2d+3h")[1]
-        DateTime(2015, 10, 20, 12, 0, 0, tzinfo=ZoneInfo('UTC'))
-        """
-
-        knms = {
-            'd': 'days',
-            'day': 'days',
-            'days': 'days',
-            'h': 'hours',
-            'hour': 'hours',
-            'hours': 'hours',
-            'm': 'minutes',
-            'minute': 'minutes',
-            'minutes': 'minutes',
-            's': 'seconds',
-            'second': 'second',
-            'seconds': 'seconds',
-        }
-
-        kwds = {
-            'days': 0,
-            'hours': 0,
-            'minutes': 0,
-            'seconds': 0,
-        }
-
-        period_regex = re.compile(r'(([+-]?)(\d+)([dhms]))+?')
-        expanded_period_regex = re.compile(r'(([+-]?)(\d+)\s(day|hour|minute|second)s?)+?')
-        # logger.debug(f"parse_td: {td}")
-        m = period_regex.findall(td)
-        if not m:
-            m = expanded_period_regex.findall(str(td))
-            if not m:
-                return False, f"Invalid period string '{td}'"
-        for g in m:
-            if g[3] not in knms:
-                return False, f'Invalid period argument: {g[3]}'
-
-            num = -int(g[2]) if g[1] == '-' else int(g[2])
-            if num:
-                kwds[knms[g[3]]] = num
-        td = timedelta(**kwds)
-        return True, td
-
-
-    @classmethod
-    def parse_dt(cls, dt: str = "") -> tuple[bool, datetime]:
-        # if isinstance(dt, datetime):
-        #     return True, dt
-        if dt.strip() == "now":
-            dt = datetime.now()
-            return True, dt
-        elif isinstance(dt, str) and dt:
-            pi = parserinfo(
-                dayfirst=False,
-                yearfirst=True)
-            try:
-                dt = parse(dt, parserinfo=pi)
-                return True, dt
-            except Exception as e:
-                msg = f"Error parsing datetime: {dt}\ne {repr(e)}"
-                return False, msg
-        else:
-            return False, "Invalid datetime"
-
-    @classmethod
-    def parse_completion(cls, completion: str) -> tuple[datetime, timedelta]:
-        parts = [x.strip() for x in re.split(r',\s+', completion)]
-        dt = parts.pop(0)
-        if parts:
-            td = parts.pop(0)
-        else:
-            td = timedelta(0)
-
-        # logger.debug(f"parts: {dt}, {td}")
-        msg = []
-        if not dt:
-            return False, ""
-        dtok, dt = cls.parse_dt(dt)
-        if not dtok:
-            msg.append(dt)
-        if td:
-            # logger.debug(f"{td = }")
-            tdok, td = cls.parse_td(td)
-            if not tdok:
-                msg.append(td)
-        else:
-            # no td specified
-            td = timedelta(0)
-            tdok = True
-        if dtok and tdok:
-            return True, (dt, td)
-        return False, "; ".join(msg)
-
-    @classmethod
-    def parse_completions(cls, completions: List[str]) -> List[tuple[datetime, timedelta]]:
-        completions = [x.strip() for x in completions.split('\n') if x.strip()]
-        output = []
-        msg = []
-        for completion in completions:
-            ok, x = cls.parse_completion(completion)
-            if ok:
-                output.append(x)
-            else:
-                msg.append(x)
-        if msg:
-            return False, "; ".join(msg)
-        return True, output
-
-
-    def __init__(self, name: str, doc_id: int) -> None:
-        self.doc_id = int(doc_id)
-        self.name = name
-        self.history = []
-        self.created = datetime.now()
-        self.modified = self.created
-        logger.info(f"Created tracker {self.name} ({self.doc_id})")
-
-
-    @property
-    def info(self):
-        # Lazy initialization with re-computation logic
-        if not hasattr(self, '_info') or self._info is None:
-            # logger.debug(f"Computing info for {self.name} ({self.doc_id})")
-            self._info = self.compute_info()
-        return self._info
-
-    def compute_info(self):
-        # Example computation based on history, returning a dict
-        result = {}
-        logger.debug(f"Computing info for {self.name} ({self.doc_id})")
-        if not self.history:
-            result = dict(
-                last_completion=None, 
-                num_completions=0, 
-                num_intervals=0, 
-                average_interval=timedelta(minutes=0), 
-                last_interval=timedelta(minutes=0), 
-                spread=timedelta(minutes=0), 
-                next_expected_completion=None,
-                early=None, 
-                timely=None, 
-                tardy=None, 
-                avg=None, 
-                plus_or_minus=f"{5*' '}~{5*' '}"
-                )
-        else:
-            result['last_completion'] = self.history[-1] if len(self.history) > 0 else None
-            result['num_completions'] = len(self.history)
-            result['intervals'] = []
-            result['num_intervals'] = 0
-            result['spread'] = timedelta(minutes=0)
-            result['last_interval'] = None
-            result['average_interval'] = None
-            result['next_expected_completion'] = None
-            result['early'] = None
-            result['timely'] = None
-            result['tardy'] = None
-            result['avg'] = None
-            result['plus_or_minus'] = f"{5*' '}~{5*' '}"
-            if result['num_completions'] > 0:
-                for i in range(len(self.history)-1):
-                    #                      x[i+1]                  y[i+1]               x[i]
-                    # logger.debug(f"{self.history[i+1]}")
-                    result['intervals'].append(self.history[i+1][0] + self.history[i+1][1] - self.history[i][0])
-                result['num_intervals'] = len(result['intervals'])
-            if result['num_intervals'] > 0:
-                # result['last_interval'] = intervals[-1]
-                if result['num_intervals'] == 1:
-                    result['average_interval'] = result['intervals'][-1]
-                else:
-                    result['average_interval'] = sum(result['intervals'], timedelta()) / result['num_intervals']
-                result['next_expected_completion'] = result['last_completion'][0] + result['average_interval']
-                result['timely'] = result['next_expected_completion'] - timedelta(days=1)
-                result['tardy'] = result['next_expected_completion'] + timedelta(days=1)
-                change = result['intervals'][-1] - result['average_interval']
-                direction = UP if change > timedelta(0) else DOWN if change < timedelta(0) else RIGHT
-                result['avg'] = f"{Tracker.format_td(result['average_interval'], 2)}{direction}"
-                # logger.debug(f"{result['avg'] = }")
-                result['plus_or_minus'] = f"{Tracker.format_td(result['average_interval'], 3): ^11}"
-            if result['num_intervals'] >= 2:
-                total = timedelta(minutes=0)
-                for interval in result['intervals']:
-                    if interval < result['average_interval']:
-                        total += result['average_interval'] - interval
-                    else:
-                        total += interval - result['average_interval']
-                result['spread'] = total / result['num_intervals']
-                result['n_x_spread'] = tracker_manager.settings['η'] * result['spread']
-                result['n_spread'] = f"{tracker_manager.settings['η']} × {Tracker.format_td(result['spread'], 3)} = {Tracker.format_td(result['n_x_spread'], 3)}"
-
-                result['plus_or_minus'] = f"{Tracker.format_td(result['average_interval'], 2): >5}{PLUS_OR_MINUS}{Tracker.format_td(result['n_x_spread'], 3): <5}"
-
-            if result['num_intervals'] >= 1:
-                result['early']  = result['next_expected_completion'] - (tracker_manager.settings['η']*2) * result['spread']
-                result['timely'] = result['next_expected_completion'] - tracker_manager.settings['η'] * result['spread']
-                result['tardy'] = result['next_expected_completion'] + tracker_manager.settings['η'] * result['spread']
-        logger.debug(f"returning {result['plus_or_minus'] = }")
-
-        self._info = result
-        self._p_changed = True
-        logger.debug(f"returning {result = }")
-
-        return result
-
-    # XXX: Just for reference
-    def add_to_history(self, new_event):
-        self.history.append(new_event)
-        self.modified = datetime.now()
-        self.invalidate_info()
-        self._p_changed = True  # Mark object as changed in ZODB
-
-    def format_history(self)->str:
-        output = []
-        for completion in self.history:
-            output.append(Tracker.format_completion(completion, long=True))
-        return '\n  '.join(output)
-
-    def invalidate_info(self):
-        # Invalidate the cached dict so it will be recomputed on next access
-        if hasattr(self, '_info'):
-            delattr(self, '_info')
-        self.compute_info()
-
-
-    def record_completion(self, completion: tuple[datetime, timedelta]):
-        ok, msg = True, ""
-        if not isinstance(completion, tuple) or len(completion) < 2:
-            completion = (completion, timedelta(0))
-        self.history.append(completion)
-        self.history.sort(key=lambda x: x[0])
-        if len(self.history) > Tracker.max_history:
-            self.history = self.history[-Tracker.max_history:]
-
-        # Notify ZODB that this object has changed
-        self.invalidate_info()
-        self.modified = datetime.now()
-        self._p_changed = True
-        return True, f"recorded completion for ..."
-
-    def rename(self, name: str):
-        original_name = self.name
-        self.name = name
-        self.invalidate_info()
-        self.modified = datetime.now()
-        self._p_changed = True
-        return True, f"renamed {self.doc_id} from {original_name} to {self.name}"
-
-    def record_completions(self, completions: list[tuple[datetime, timedelta]]):
-        logger.debug(f"starting {self.history = }")
-        self.history = []
-        for completion in completions:
-            if not isinstance(completion, tuple) or len(completion) < 2:
-                completion = (completion, timedelta(0))
-            self.history.append(completion)
-        self.history.sort(key=lambda x: x[0])
-        if len(self.history) > Tracker.max_history:
-            self.history = self.history[-Tracker.max_history:]
-        logger.debug(f"ending {self.history = }")
-        self.invalidate_info()
-        self.modified = datetime.now()
-        self._p_changed = True
-        return True, f"recorded completions for ..."
-
-    def remove_completions(self):
-        self.history = []
-        self.invalidate_info()
-        self.modified = datetime.now()
-        self._p_changed = True
-        return True, f"removed all completions for ..."
-
-
-    def edit_history(self):
-        if not self.history:
-            # logger.debug("No history to edit.")
-            return
-
-        # Display current history
-        for i, completion in enumerate(self.history):
-            logger.debug(f"{i + 1}. {self.format_completion(completion)}")
-
-        # Choose an entry to edit
-        try:
-            choice = int(input("Enter the number of the history entry to edit (or 0 to cancel): ").strip())
-            if choice == 0:
-                return
-            if choice < 1 or choice > len(self.history):
-                return
-            selected_comp = self.history[choice - 1]
-
-            # Choose what to do with the selected entry
-            action = input("Do you want to (d)elete or (r)eplace this entry? ").strip().lower()
-
-            if action == 'd':
-                self.history.pop(choice - 1)
-            elif action == 'r':
-                new_comp_str = input("Enter the replacement completion: ").strip()
-                ok, new_comp = self.parse_completion(new_comp_str)
-                if ok:
-                    self.history[choice - 1] = new_comp
-                    return True, f"Entry replaced with {self.format_completion(new_comp)}"
-                else:
-                    return False, f"{new_comp}"
-            else:
-                return False, "Invalid action."
-
-            # Sort and truncate history if necessary
-            self.history.sort()
-            if len(self.history) > self.max_history:
-                self.history = self.history[-self.max_history:]
-
-            # Notify ZODB that this object has changed
-            self.modified = datetime.now()
-            self.update_tracker_info()
-            self.invalidate_info()
-            self._p_changed = True
-
-        except ValueError:
-            logger.error("Invalid input. Please enter a number.")
-
-    def get_tracker_info(self):
-
-        if not hasattr(self, '_info') or self._info is None:
-            self._info = self.compute_info()
-        logger.debug(f"{self._info = }")
-        logger.debug(f"{self._info['avg'] = }")
-        # insert a placeholder to prevent date and time from being split across multiple lines when wrapping
-        # format_str = f"%y-%m-%d{PLACEHOLDER}%H:%M"
-        # logger.debug(f"{self.history = }")
-        history = [f"{Tracker.format_dt(x[0])} {Tracker.format_td(x[1])}" for x in self.history] if self.history else []
-        history = ', '.join(history)
-        intervals = [f"{Tracker.format_td(x, 3)}" for x in self._info['intervals']] if self._info.get('intervals') else []
-        intervals = ', '.join(intervals) if intervals else ""
-        return wrap(f"""\
- name:        {self.name}
- doc_id:      {self.doc_id}
- created:     {Tracker.format_dt(self.created)}
- modified:    {Tracker.format_dt(self.modified)}
- completions: ({self._info['num_completions']})
-    {history}
- intervals:   ({self._info['num_intervals']})
-    {intervals}
-    average:  {self._info['avg']}
-    spread:   {Tracker.format_td(self._info['spread'], 3)}
-    η spread: {self._info.get('n_spread', '?')}
- next:    {Tracker.format_dt(self._info['next_expected_completion'])}
-    early:    next - 2 × η spread = {Tracker.format_dt(self._info.get('early', '?'))}
-    timely:   next - η spread     = {Tracker.format_dt(self._info.get('timely', '?'))}
-    tardy:    next + η spread     = {Tracker.format_dt(self._info.get('tardy', '?'))}
-""", 0)
 
 def page_banner(active_page_num: int, number_of_pages: int, sort_by: str):
     return f"{active_page_num}/{number_of_pages}: {sort_by}"
 
-class TrackerManager:
-
+class TrackerManager(TrackerStore):
+    """
+    A TrackerStore together with the state of the list view: the sort
+    order, the active page and the tags and rows of the listed trackers.
+    It formats the list but leaves displaying it, and the outcome of
+    changes, to the interface.
+
+    Only the trackers of the active page and of the pages either side of
+    it are kept ready, those of the next page are loaded and formatted
+    ahead of time. The trackers of other pages are left to the cache limits
+    of the store and are released as other pages are listed.
+    """
+    # trackers per page, one for each tag
+    page_size = 26
     def __init__(self, storage, db, connection, root, transaction) -> None:
-        # Ensure that all required arguments are provided during the first initialization
-        if db is None or connection is None or root is None or transaction is None:
-            raise ValueError("db, connection, root, and transaction must be provided on the first initialization.")
-
-        # Initialize instance attributes
-        self.storage = storage
-        self.db = db
-        self.connection = connection
-        self.root = root
-        self.transaction = transaction
-        self.trackers = {}
         self.tag_to_id = {}
         self.row_to_id = {}
         self.id_to_row = {}
         self.tag_to_row = {}
         self.id_to_times = {}
+        # doc_id -> formatted list row for the listed and adjacent pages,
+        # see format_row()
+        self.row_cache = {}
         self.active_page = 0
         self.num_pages = 0
+        # the page banner for the status bar, set by list_trackers()
+        self.banner = ""
         self.selected_id = None
         self.selected_tracker = None
         self.selected_row = (None, None)
         self.sort_by = "next"
-        logger.info(f"using data from\n  {self.db}")
-        self.load_data()
-
-    def load_data(self):
-        try:
-            if 'settings' not in self.root:
-                self.root['settings'] = settings_map
-                self.transaction.commit()
-            self.settings = self.root['settings']
-            if 'trackers' not in self.root:
-                self.root['trackers'] = {}
-                self.root['next_id'] = 1  # Initialize the ID counter
-                self.transaction.commit()
-            self.trackers = self.root['trackers']
-        except Exception as e:
-            logger.error(f"Warning: could not load data from '{db_path}': {str(e)}")
-            self.trackers = {}
-
-    def restore_defaults(self):
-        self.root['settings'] = settings_map
-        self.settings = self.root['settings']
-        self.transaction.commit()
-        logger.info(f"Restored default settings:\n{self.settings}")
-        self.refresh_info()
-
-    def refresh_info(self):
-        for k, v in self.trackers.items():
-            v.compute_info()
-        logger.info("Refreshed tracker info.")
-
-    def set_setting(self, key, value):
-
-        if key in self.settings:
-            self.settings[key] = value
-            self.zodb_root[0] = self.settings  # Update the ZODB storage
-            self.transaction.commit()
-        else:
-            logger.error(f"Setting '{key}' not found.")
-
-    def get_setting(self, key):
-        return self.settings.get(key, None)
-
-    def add_tracker(self, name: str) -> None:
-        doc_id = self.root['next_id']
-        # Create a new tracker with the current doc_id
-        tracker = Tracker(name, doc_id)
-        # Add the tracker to the trackers dictionary
-        self.trackers[doc_id] = tracker
-        # Increment the next_id for the next tracker
-        self.root['next_id'] += 1
-        # Save the updated data
-        self.save_data()
-
-        logger.info(f"Tracker '{name}' added with ID {doc_id}")
-        return doc_id
-
-    def rename_tracker(self, doc_id: int, new_name: str):
-        ok, msg = self.trackers[doc_id].rename(new_name)
-        if not ok:
-            display_message(msg, 'error')
-            return
-        display_message(f"{self.trackers[doc_id].get_tracker_info()}", 'info')
+        super().__init__(storage, db, connection, root, transaction)
 
+    def delete_tracker(self, doc_id):
+        self.row_cache.pop(doc_id, None)
+        super().delete_tracker(doc_id)
 
-    def record_completion(self, doc_id: int, comp: tuple[datetime, timedelta]):
-        # dt will be a datetime
-        ok, msg = self.trackers[doc_id].record_completion(comp)
-        if not ok:
-            display_message(msg)
-            return
-        # self.trackers[doc_id].compute_info()
-        display_message(f"{self.trackers[doc_id].get_tracker_info()}", 'info')
-
-    def record_completions(self, doc_id: int, completions: list[tuple[datetime, timedelta]]):
-        ok, msg = self.trackers[doc_id].record_completions(completions)
-        if not ok:
-            display_message(msg, 'error')
-            return
-        display_message(f"{self.trackers[doc_id].get_tracker_info()}", 'info')
-
-    def remove_completions(self, doc_id: int):
-        ok, msg = self.trackers[doc_id].remove_completions()
-        if not ok:
-            display_message(msg, 'error')
-            return
-        display_message(f"{self.trackers[doc_id].get_tracker_info()}", 'info')
+    def sync(self):
+        changed = super().sync()
+        if changed is None:
+            self.row_cache.clear()
+        else:
+            for doc_id in changed:
+                self.row_cache.pop(doc_id, None)
+        return changed
 
+    def page_changed(self, changed) -> bool:
+        """
+        True if the listed page is not what list_trackers() would now show
+        after sync() returned changed: a listed tracker has changed or the
+        trackers on the page or the number of pages are different.
+        """
+        if changed is None or not changed.isdisjoint(self.id_to_row):
+            return True
+        if (self.num_trackers() + 25) // 26 != self.num_pages:
+            return True
+        return self.get_page_ids(self.active_page) != list(self.id_to_row)
 
     def get_tracker_data(self, doc_id: int = None):
         if doc_id is None:
@@ -865,45 +170,53 @@ class TrackerManager:
             logger.debug(f"data for tracker {doc_id}:")
             logger.debug(f"   {doc_id:2> }. {self.trackers[doc_id].get_tracker_data()}")
 
-    def sort_key(self, tracker):
-        forecast_dt = tracker._info.get('next_expected_completion', None) if hasattr(tracker, '_info') else None
-        last_dt = tracker._info.get('last_completion', None) if hasattr(tracker, '_info') else None
-        early_dt = tracker._info.get('timely', None) if hasattr(tracker, '_info') else None
-        if self.sort_by == "next":
-            if forecast_dt:
-                return (0, forecast_dt)
-            if last_dt:
-                return (1, last_dt)
-            return (2, tracker.doc_id)
-        if self.sort_by == "last":
-            if last_dt:
-                return (0, last_dt)
-            if forecast_dt:
-                return (1, forecast_dt)
-            return (2, tracker.doc_id)
-        if self.sort_by == "subject":
-            return (0, tracker.name)
-        if self.sort_by == "id":
-            return (1, tracker.doc_id)
-        if self.sort_by == "modified":
-            return (1, tracker.modified)
-        else: # next
-            if forecast_dt:
-                return (0, forecast_dt)
-            if last_dt:
-                return (1, last_dt)
-            return (2, tracker.doc_id)
+    def get_sort_index(self):
+        index = self.indexes.get(self.sort_by, None)
+        if index is None:
+            index = self.indexes['next']
+        # modified is listed most recent first
+        return index, self.sort_by == "modified"
+
+    def get_page_ids(self, page: int) -> list:
+        if not 0 <= page < self.num_pages:
+            return []
+        index, reverse = self.get_sort_index()
+        return index.page(page * self.page_size, self.page_size, reverse)
+
+    def get_page_trackers(self, start_index: int, count: int):
+        index, reverse = self.get_sort_index()
+        return self.get_trackers(index.page(start_index, count, reverse))
 
     def get_sorted_trackers(self):
-        # Extract the list of trackers
-        trackers = [v for k, v in self.trackers.items()]
-        # Sort the trackers
-        reverse = True if self.sort_by == "modified" else False
-        return sorted(trackers, key=self.sort_key, reverse=reverse)
+        """
+        Iterate over the trackers in sort order, releasing those beyond the
+        cache limits along the way.
+        """
+        index, reverse = self.get_sort_index()
+        for i, doc_id in enumerate(index.doc_ids(reverse), 1):
+            tracker = self.trackers[doc_id]
+            self.used_trackers.add(tracker)
+            yield tracker
+            if i % self.RELEASE_EVERY == 0:
+                self.release()
+
+    def prefetch(self, page: int, name_width: int, eta):
+        """
+        Load the trackers of page and format their rows so that listing the
+        page finds both in memory.
+        """
+        for tracker in self.get_trackers(self.get_page_ids(page)):
+            self.format_row(tracker, name_width, eta)
 
     def list_trackers(self):
         name_width = shutil.get_terminal_size()[0] - 45
-        self.num_pages = (len(self.trackers) + 25) // 26
+        self.num_pages = (self.num_trackers() + 25) // 26
+        # only the listed page is tagged
+        self.tag_to_id = {}
+        self.row_to_id = {}
+        self.id_to_row = {}
+        self.tag_to_row = {}
+        self.id_to_times = {}
 
         sort = self.sort_by + DOWN if self.sort_by == 'modified' else self.sort_by + UP
         n = self.settings.get('η', None)
@@ -913,7 +226,7 @@ class TrackerManager:
         else: #        " n=3 89%"
             interval = "interval"
 
-        set_pages(page_banner(self.active_page + 1, self.num_pages, sort))
+        self.banner = page_banner(self.active_page + 1, self.num_pages, sort)
         banner = f"{ZWNJ} tag     next      {interval}     last        subject\n"
         rows = []
 
@@ -921,54 +234,68 @@ class TrackerManager:
 
         start_index = self.active_page * 26
         end_index = start_index + 26
-        sorted_trackers = self.get_sorted_trackers()
         sigma = self.settings.get('η', 1)
         logger.debug(f"listing {self.active_page = }, {start_index = }, {end_index = }")
-        for tracker in sorted_trackers[start_index:end_index]:
-            parts = [x.strip() for x in tracker.name.split('@')]
-            tracker_name = parts[0]
-            if len(tracker_name) > name_width:
-                tracker_name = tracker_name[:name_width - 1] + "…"
-            forecast_dt = tracker._info.get('next_expected_completion', None) if hasattr(tracker, '_info') else None
-            early = tracker._info.get('early', '') if hasattr(tracker, '_info') else ''
-            timely = tracker._info.get('timely', '') if hasattr(tracker, '_info') else ''
-            tardy = tracker._info.get('tardy', '') if hasattr(tracker, '_info') else ''
-            plus_or_minus = tracker._info.get('plus_or_minus', '') if hasattr(tracker, '_info') else f"{5*' '}~{5*' '}"
-            average = tracker._info.get('average_interval', '') if hasattr(tracker, '_info') else ''
-            if tracker.history:
-                last = tracker.history[-1][0].strftime("%y-%m-%d")
-            else:
-                last = "~"
-            next = forecast_dt.strftime("%y-%m-%d") if forecast_dt else center_text("~", 8)
-            avg = tracker._info.get('avg', None) if hasattr(tracker, '_info') else None
-            interval = f"{avg: <8}" if avg else f"{'~': ^8}"
+        for tracker in self.get_page_trackers(start_index, end_index - start_index):
+            row, times = self.format_row(tracker, name_width, sigma)
             tag = tag_keys[count]
-            self.id_to_times[tracker.doc_id] = (
-                early.strftime("%y-%m-%d") if early else '',
-                timely.strftime("%y-%m-%d") if timely else '',
-                tardy.strftime("%y-%m-%d") if tardy else '')
+            self.id_to_times[tracker.doc_id] = times
             self.tag_to_id[(self.active_page, tag)] = tracker.doc_id
             self.row_to_id[(self.active_page, count+1)] = tracker.doc_id
             self.id_to_row[tracker.doc_id] =  (self.active_page, count+1)
             self.tag_to_row[(self.active_page, tag)] = (self.active_page, count+1) # count+1
             count += 1
-            # rows.append(f" {tag}{" "*4}{next}{" "*2}{last}{" "*2}{interval}{" " * 3}{tracker_name}")
-            #             1  1    4         13      2       8       2      8       3
-            this_row = f" {tag}{' '*4}{next}{' '*2}{plus_or_minus}{' '*2}{last}{' ' * 3}{tracker_name}"
-            rows.append(this_row)
-            logger.debug(f"{len(next) = }; {len(plus_or_minus) = }; {len(last) = }; {len(rows[-1]) = }")
+            rows.append(f" {tag}{' '*4}{row}")
         if self.selected_id:
-            self.selected_row = self.id_to_row[self.selected_id]
+            self.selected_row = self.id_to_row.get(self.selected_id, (self.active_page, 0))
+
+        self.prefetch(self.active_page + 1, name_width, sigma)
+        keep = set(self.get_page_ids(self.active_page - 1))
+        keep.update(self.get_page_ids(self.active_page + 1), self.id_to_row)
+        self.row_cache = {doc_id: cached for doc_id, cached in self.row_cache.items() if doc_id in keep}
+        self.release()
         return banner +"\n".join(rows)
 
+    def format_row(self, tracker, name_width: int, eta):
+        """
+        Return the part of the list row for tracker that follows the tag and
+        the (early, timely, tardy) dates used by TrackerLexer. Both are cached
+        per doc_id and reused until the tracker's info is recomputed, its
+        name changes or the name width or η changes.
+        """
+        info = tracker.info
+        cached = self.row_cache.get(tracker.doc_id, None)
+        if cached is not None and cached[0] is info and cached[1:4] == (tracker.name, name_width, eta):
+            return cached[4], cached[5]
+
+        parts = [x.strip() for x in tracker.name.split('@')]
+        tracker_name = parts[0]
+        if len(tracker_name) > name_width:
+            tracker_name = tracker_name[:name_width - 1] + "…"
+        forecast_dt = info.get('next_expected_completion', None)
+        early = info.get('early', '')
+        timely = info.get('timely', '')
+        tardy = info.get('tardy', '')
+        plus_or_minus = info.get('plus_or_minus', '')
+        if tracker.history:
+            last = tracker.history[-1][0].strftime("%y-%m-%d")
+        else:
+            last = "~"
+        next = forecast_dt.strftime("%y-%m-%d") if forecast_dt else center_text("~", 8)
+        times = (
+            early.strftime("%y-%m-%d") if early else '',
+            timely.strftime("%y-%m-%d") if timely else '',
+            tardy.strftime("%y-%m-%d") if tardy else '')
+        #       8        2        11               2        8        3
+        row = f"{next}{' '*2}{plus_or_minus}{' '*2}{last}{' ' * 3}{tracker_name}"
+        self.row_cache[tracker.doc_id] = (info, tracker.name, name_width, eta, row, times)
+        return row, times
+
     def set_active_page(self, page_num):
         logger.debug(f"set_active_page {page_num = }")
-        if 0 <= page_num < (len(self.trackers) + 25) // 26:
+        if 0 <= page_num < (self.num_trackers() + 25) // 26:
             self.active_page = page_num
             logger.debug(f"setting active page to {page_num = }, {self.active_page = }")
-            display_area.buffer.cursor_position = (
-                display_area.buffer.document.translate_row_col_to_index(0, 0)
-            )
 
     def get_active_page(self):
         return self.active_page
@@ -1000,6 +327,44 @@ class TrackerManager:
         logger.debug(f"first page: {self.selected_row = }")
 
 
+    def jump_to(self, doc_id: int) -> bool:
+        """
+        Make the page listing doc_id in the current sort order the active
+        page and select doc_id so that list_trackers() sets selected_row to
+        its row.
+        """
+        index, reverse = self.get_sort_index()
+        mode = self.sort_by if self.sort_by in self.indexes else 'next'
+        position = index.position(self.index_keys(doc_id).get(mode), reverse)
+        if position is None:
+            return False
+        self.active_page = position // self.page_size
+        self.selected_id = doc_id
+        return True
+
+    def format_agenda(self, start: datetime, end: datetime, limit: int = 200) -> str:
+        """
+        The trackers that may be due between start and end, those whose
+        early..tardy windows overlap the period, in the order expected and
+        at most limit of them.
+        """
+        due = self.due_states()
+        lines = [f"agenda {Tracker.format_dt(start)} - {Tracker.format_dt(end)}",
+                 f"  {'early':<14} {'next':<14} {'tardy':<14} subject"]
+        for count, doc_id in enumerate(self.agenda_trackers(start, end), 1):
+            if count > limit:
+                lines.append(f"  ... only the first {limit} are listed")
+                break
+            tracker = self.trackers[doc_id]
+            info = tracker.info
+            lines.append(f"  {Tracker.format_dt(info['early']):<14} {Tracker.format_dt(info['next_expected_completion']):<14} "
+                         f"{Tracker.format_dt(info['tardy']):<14} {tracker.name} ({due.state(doc_id)})")
+        else:
+            if len(lines) == 2:
+                lines.append("  none")
+        self.release()
+        return "\n".join(lines)
+
     def get_tracker_from_tag(self, tag: str):
         pagetag = (self.active_page, tag)
         if pagetag not in self.tag_to_id:
@@ -1009,8 +374,7 @@ class TrackerManager:
         self.selected_row = pagetag
         return self.trackers[self.tag_to_id[pagetag]]
 
-    def get_tracker_from_row(self):
-        row = display_area.document.cursor_position_row
+    def get_tracker_from_row(self, row: int):
         pagerow = (self.active_page, row)
         if pagerow not in self.row_to_id:
             return None
@@ -1021,24 +385,11 @@ class TrackerManager:
         logger.debug(f"returning {self.selected_tracker.doc_id = }; {self.selected_tracker.name = }")
         return self.trackers[self.row_to_id[pagerow]]
 
-    def save_data(self):
-        logger.info(f"Saving data: {self.trackers = }")
-        self.root['trackers'] = self.trackers
-        self.transaction.commit()
-
-    def update_tracker(self, doc_id, tracker):
-        self.trackers[doc_id] = tracker
-        self.save_data()
-
-    def delete_tracker(self, doc_id):
-        if doc_id in self.trackers:
-            del self.trackers[doc_id]
-            self.save_data()
-
     def edit_tracker_history(self, label: str):
         tracker = self.get_tracker_from_tag(label)
         if tracker:
             tracker.edit_history()
+            self.reindex(tracker)
             self.save_data()
         else:
             logger.error(f"No tracker found corresponding to label {label}.")
@@ -1053,28 +404,23 @@ class TrackerManager:
     def get_row_from_id(self, doc_id):
         page, row = self.id_to_row.get(doc_id, (None, None))
 
-    def close(self):
-        # Make sure to commit or abort any ongoing transaction
-        try:
-            if self.connection.transaction_manager.isDoomed():
-                logger.error("Transaction aborted.")
-                self.transaction.abort()
-            else:
-                logger.info("Transaction committed.")
-                self.transaction.commit()
-        except Exception as e:
-            logger.error(f"Error during transaction handling: {e}")
-            self.transaction.abort()
-        else:
-            logger.info("Transaction handled successfully.")
-        finally:
-            self.connection.close()
-            self.db.close()
-
-# Initialize the ZODB database
-storage, db, connection, root, transaction = init_db(db_path)
+# The database is opened and the trackers are loaded by startup() when
+# main() is called, not when this module is imported
+storage = db = connection = root = None
+tracker_manager = None
 
-tracker_manager = TrackerManager(storage, db, connection, root, transaction)
+def startup():
+    """
+    Set up logging, open the ZODB database and load the trackers.
+    """
+    global storage, db, connection, root, tracker_manager
+    setup_logging(trf_home=trf_home, log_level=log_level, backup_count=7)
+    profile.mark('logging')
+    storage, db, connection, root, _ = init_db(db_path, server=server)
+    profile.mark('open database')
+    tracker_manager = TrackerManager(storage, db, connection, root, transaction)
+    profile.mark('load trackers')
+    return tracker_manager
 
 tag_keys = list(string.ascii_lowercase)
 
@@ -1100,11 +446,6 @@ for k, v in tracker_style.items():
     # highlight_style[k] = tracker_style[k] + ' bg:#959896'
     highlight_style[k] = tracker_style[k] + ' bg:gray'
 
-def is_current_row(line_number: int):
-    cursor_row = display_area.document.cursor_position_row
-    # logger.debug(f"{line_number = }, {cursor_row = }")
-    return int(line_number) == int(cursor_row)
-
 banner_regex = re.compile(r'^\u200C')
 
 class DefaultLexer(Lexer):
@@ -1219,84 +560,108 @@ class TrackerLexer(Lexer):
     def __init__(self):
         if not hasattr(self, '_initialized'):
             self._initialized = True
-            now = datetime.now()
+            self._text = None
+            self._tokens = []
 
-    def lex_document(self, document):
-        # logger.debug("lex_document called")
+    def invalidate(self):
+        """
+        Discard the prepared tokens, e.g., when the date changes.
+        """
+        self._text = None
+
+    def prepare(self, document):
+        """
+        Compute the tokens for every line of the list once per rendered list:
+        a (normal, highlighted) pair for each line so that lex_document only
+        needs to pick one of them for each line.
+        """
         active_page = tracker_manager.active_page
-        lines = document.lines
         now = datetime.now().strftime("%y-%m-%d")
         width = shutil.get_terminal_size()[0] - 1
+        self._tokens = [
+            (
+                self.line_tokens(line, tracker_style, now, width, active_page),
+                self.line_tokens(f"{line:<{width}}", highlight_style, now, width, active_page),
+            )
+            for line in document.lines
+        ]
+        self._text = document.text
+
+    def lex_document(self, document):
+        # logger.debug("lex_document called")
+        if document.text is not self._text and document.text != self._text:
+            self.prepare(document)
+        tokens = self._tokens
+        cursor_row = document.cursor_position_row
         def get_line_tokens(line_number):
-            line = lines[line_number]
-            tokens = []
-            if is_current_row(line_number):
-                # Apply style to the whole line with a background for the current line
-                list_style = highlight_style
-                line = f"{line:<{width}}"
-            else:
-                list_style = tracker_style
-                # Apply no special style for other lines
-                # return [('class:default', line)]
-
-            if line and line[0] == ' ':  # does line start with a space
-                parts = line.split()
-                if len(parts) < 5:
-                    return [(list_style.get('default', ''), line)]
-
-                # Extract the parts of the line
-                tag, next_date, interval, last_date, tracker_name = parts[0], parts[1], parts[2], parts[3], " ".join(parts[4:])
-                tracker_name = f"   {tracker_name:<{width-44}}"
-                id = tracker_manager.tag_to_id.get((active_page, tag), None)
-                early, timely, tardy = tracker_manager.id_to_times.get(id, (None,None, None))
-                # logger.debug(f"{width = }, {tracker_name = },  ")
-
-                # Determine styles based on dates
-                if early and timely and tardy:
-                    if now < early:
-                        this_style = list_style.get('next-cold', '')
-                    if early <= now and now < timely:
-                        this_style = list_style.get('next-cool', '')
-                    elif timely <= now and now < tardy:
-                        this_style = list_style.get('next-warm', '')
-                    elif tardy <= now:
-                        this_style = list_style.get('next-hot', '')
-                elif next_date != "~" and next_date > now:
-                    this_style = list_style.get('next-cool', '')
-                else:
-                    this_style = list_style.get('default', '')
-                next_style = this_style
-                last_style = this_style
-                spread_style = this_style
-                name_style = this_style
-                # logger.debug(f"{early = }, {timely = }, {tardy = }: {this_style = }")
-
-                # Format each part with fixed width
-                tag_formatted = f"  {tag}  "          # 7 spaces for tag
-                next_formatted = f"  {next_date: ^8}"  # 10 spaces for next date
-                if "±" in interval:
-                    iparts = interval.split("±")
-                    spread_formatted = f"  {iparts[0]: >5}±{iparts[1]: <5}"
-                else:
-                    spread_formatted = f"  {interval: ^11}"
-                last_formatted = f"  {last_date: ^8}"
-                # Add the styled parts to the tokens list
-                tokens.append((list_style.get('tag', ''), tag_formatted))
-                tokens.append((next_style, next_formatted))
-                tokens.append((spread_style, spread_formatted))
-                tokens.append((last_style, last_formatted))
-                tokens.append((name_style, tracker_name))
-            elif banner_regex.match(line):
-                # use tracker style to avoid the highlight or list style to apply the highlight
-                tokens.append((tracker_style.get('banner', ''), line))
-                # tokens.append((list_style.get('banner', ''), line))
-            else:
-                tokens.append((list_style.get('default', ''), line))
-            # logger.debug(f"tokens: {tokens}")
-            return tokens
+            if line_number >= len(tokens):
+                return []
+            return tokens[line_number][line_number == cursor_row]
 
         return get_line_tokens
 
+    @staticmethod
+    def line_tokens(line: str, list_style: dict, now: str, width: int, active_page: int):
+        tokens = []
+        if line and line[0] == ' ':  # does line start with a space
+            parts = line.split()
+            if len(parts) < 5:
+                return [(list_style.get('default', ''), line)]
+
+            # Extract the parts of the line
+            tag, next_date, interval, last_date, tracker_name = parts[0], parts[1], parts[2], parts[3], " ".join(parts[4:])
+            tracker_name = f"   {tracker_name:<{width-44}}"
+            id = tracker_manager.tag_to_id.get((active_page, tag), None)
+            early, timely, tardy = tracker_manager.id_to_times.get(id, (None,None, None))
+            state = tracker_manager.due.state(id) if tracker_manager.due is not None and id is not None else None
+            # logger.debug(f"{width = }, {tracker_name = },  ")
+
+            # Determine styles based on the due state or else the dates
+            if state:
+                this_style = list_style.get(f'next-{state}', '')
+            elif early and timely and tardy:
+                if now < early:
+                    this_style = list_style.get('next-cold', '')
+                if early <= now and now < timely:
+                    this_style = list_style.get('next-cool', '')
+                elif timely <= now and now < tardy:
+                    this_style = list_style.get('next-warm', '')
+                elif tardy <= now:
+                    this_style = list_style.get('next-hot', '')
+            elif next_date != "~" and next_date > now:
+                this_style = list_style.get('next-cool', '')
+            else:
+                this_style = list_style.get('default', '')
+            next_style = this_style
+            last_style = this_style
+            spread_style = this_style
+            name_style = this_style
+            # logger.debug(f"{early = }, {timely = }, {tardy = }: {this_style = }")
+
+            # Format each part with fixed width
+            tag_formatted = f"  {tag}  "          # 7 spaces for tag
+            next_formatted = f"  {next_date: ^8}"  # 10 spaces for next date
+            if "±" in interval:
+                iparts = interval.split("±")
+                spread_formatted = f"  {iparts[0]: >5}±{iparts[1]: <5}"
+            else:
+                spread_formatted = f"  {interval: ^11}"
+            last_formatted = f"  {last_date: ^8}"
+            # Add the styled parts to the tokens list
+            tokens.append((list_style.get('tag', ''), tag_formatted))
+            tokens.append((next_style, next_formatted))
+            tokens.append((spread_style, spread_formatted))
+            tokens.append((last_style, last_formatted))
+            tokens.append((name_style, tracker_name))
+        elif banner_regex.match(line):
+            # use tracker style to avoid the highlight or list style to apply the highlight
+            tokens.append((tracker_style.get('banner', ''), line))
+            # tokens.append((list_style.get('banner', ''), line))
+        else:
+            tokens.append((list_style.get('default', ''), line))
+        # logger.debug(f"tokens: {tokens}")
+        return tokens
+
     @staticmethod
     def _parse_date(date_str):
         return datetime.strptime(date_str, "%y-%m-%d")
@@ -1336,29 +701,130 @@ style = Style.from_dict({
     'status-window': f'bg:#396060 {NAMED_COLORS["White"]}',
 })
 
+def daily_maintenance():
+    """
+    Clean up the logs and back up the database, packing it first when a
+    full backup is due, see backup_and_pack().
+    """
+    try:
+        cleanup_old_logs()
+        backup_and_pack(
+            db, trf_home, logger, storage,
+            tracker_manager.settings.get('backup_compression', 'deflate'),
+            tracker_manager.settings.get('backup_level', 6),
+            tracker_manager.settings.get('full_backup_days', 7),
+            tracker_manager.settings.get('pack_days', 7),
+            )
+    except Exception as e:
+        logger.error(f"Error during daily maintenance: {e}")
+
+def start_daily_maintenance():
+    """
+    Run daily_maintenance in the scheduler's worker thread so that the UI is
+    not blocked. It is skipped if the previous run has not finished.
+    """
+    scheduler.run_in_executor(daily_maintenance, name='daily maintenance')
+
+# the day of the last check, yesterday at first so that the maintenance
+# runs when trf starts unless it has already been run today, see
+# TrackerStore.start_maintenance()
+today = [(datetime.now()-timedelta(days=1)).strftime("%y-%m-%d")]
+
 def check_alarms():
     """Periodic task to check alarms."""
-    today = (datetime.now()-timedelta(days=1)).strftime("%y-%m-%d")
-    while True:
-        f = freq  # Interval (e.g., 6, 12, 30, 60 seconds)
-        s = int(datetime.now().second)
-        n = s % f
-        w = f if n == 0 else f - n
-        time.sleep(w)  # Wait for the next interval
-        ct = datetime.now()
-        current_time = format_statustime(ct, freq)
-        message = f"{current_time}"
-        update_status(message)
-        newday = ct.strftime("%y-%m-%d")
-        if newday != today:
-            logger.info(f"new day: {newday}")
-            today = newday
-            cleanup_old_logs()
-            rotate_backups(trf_home, logger)
+    ct = datetime.now()
+    current_time = format_statustime(ct, freq)
+    message = f"{current_time}"
+    update_status(message)
+    newday = ct.strftime("%y-%m-%d")
+    if newday != today[0]:
+        logger.info(f"new day: {newday}")
+        today[0] = newday
+        # the hot/warm/cool/cold styles depend on the date
+        tracker_lexer.invalidate()
+        if tracker_manager.start_maintenance(ct.date()):
+            start_daily_maintenance()
+    if tracker_manager.due is not None:
+        # in case the loop's clock stopped, e.g., while the computer slept
+        advance_due()
+
+def sync_store():
+    """
+    Show the changes committed by the other trf processes sharing the
+    database. This runs every sync_freq seconds and costs next to nothing
+    when there are none. Otherwise the due counts are updated and the list,
+    if it is displayed, is relisted only if the page shown has changed.
+    """
+    changed = tracker_manager.sync()
+    if changed is not None and not changed:
+        return
+    update_status(format_statustime(datetime.now(), freq))
+    if mode == 'main' and display_area.lexer is tracker_lexer and tracker_manager.page_changed(changed):
+        list_trackers()
 
 def start_periodic_checks():
-    """Start the periodic check for alarms in a separate thread."""
-    threading.Thread(target=check_alarms, daemon=True).start()
+    """
+    Check the alarms every freq seconds (e.g., 6, 12, 30, 60) on the
+    application's event loop once it is running, and build the due states
+    once it has started. With a shared database, look for the changes of
+    the other trf processes every sync_freq seconds as well.
+    """
+    scheduler.call_every(freq, check_alarms, name='check alarms')
+    if tracker_manager.shared:
+        scheduler.call_every(sync_freq, sync_store, name='sync store')
+    scheduler.call_later(0, start_due_states, name='due states')
+
+# the time advance_due() is scheduled for
+due_wake = [None]
+
+def start_due_states():
+    due = tracker_manager.due_states()
+    due.on_tardy = on_tardy
+    due.on_next = wake_due
+    advance_due()
+
+def on_tardy(doc_id: int):
+    tracker = tracker_manager.trackers.get(doc_id)
+    logger.info(f"now tardy: {tracker.name if tracker is not None else doc_id} ({doc_id})")
+
+def advance_due():
+    """
+    Move the trackers whose bounds have been crossed to their new due
+    states, restyle the list if any of them are listed and schedule the
+    next run for the next crossing.
+    """
+    due = tracker_manager.due_states()
+    changes = due.advance()
+    if changes:
+        if any(doc_id in tracker_manager.id_to_row for doc_id, _, _ in changes):
+            tracker_lexer.invalidate()
+        update_status(format_statustime(datetime.now(), freq))
+    # this run may have been the one scheduled
+    due_wake[0] = None
+    wake_due(due.next_crossing())
+
+def wake_due(when: datetime):
+    """
+    Run advance_due() at when, the next crossing, instead of when it was
+    scheduled for.
+    """
+    if when == due_wake[0]:
+        return
+    due_wake[0] = when
+    scheduler.cancel('due states')
+    if when is not None:
+        seconds = max((when - datetime.now()).total_seconds(), 0)
+        scheduler.call_later(seconds, advance_due, name='due states')
+
+def due_counts() -> list:
+    """
+    The number of hot, warm, cool and cold trackers for the status bar,
+    each in the style of its state.
+    """
+    due = tracker_manager.due
+    if due is None:
+        return []
+    return [(tracker_style[f'next-{state}'], f" {count}") for state, count in zip(reversed(STATES), reversed(due.counts))]
 
 def center_text(text, width: int = shutil.get_terminal_size()[0] - 2):
     if len(text) >= width:
@@ -1387,8 +853,8 @@ search_field = SearchToolbar(
     )
 
 def update_status(new_message):
-    status_control.text = new_message
-    app.invalidate()  # Request a UI refresh
+    status_control.text = [('', new_message)] + due_counts()
+    scheduler.invalidate()  # Request a UI refresh
 
 tracker_lexer = TrackerLexer()
 info_lexer = InfoLexer()
@@ -1587,7 +1053,7 @@ def toggle_shortcuts(event=None):
     float_visible[0] = not float_visible[0]
 
     # Force the app to refresh the layout to apply the visibility change
-    app.invalidate()
+    scheduler.invalidate()
 
 
 def clear_search(*event):
@@ -1654,7 +1120,7 @@ def display_info(msg: str, doc_type: str = 'info'):
 
 
 def do_about(*event):
-    display_info('about track ...')
+    display_info(f"about track ...\n\n{tracker_manager.format_cache_stats()}\n\nscheduler:\n{scheduler.report()}")
 
 
 def do_commands(*event):
@@ -1685,6 +1151,7 @@ def list_trackers(*event):
     """List trackers."""
     set_mode('main')
     display_message(tracker_manager.list_trackers(), 'list')
+    set_pages(tracker_manager.banner)
     logger.debug(f"in list_trackers: {tracker_manager.get_tracker_from_id(tracker_manager.selected_id)= }")
     logger.debug(f"in list_trackers: {tracker_manager.get_row_from_id(tracker_manager.selected_id)= }")
     page, row = tracker_manager.selected_row
@@ -1694,18 +1161,18 @@ def list_trackers(*event):
             display_area.buffer.document.translate_row_col_to_index(row, 0)
             )
     app.layout.focus(display_area)
-    app.invalidate()
+    scheduler.invalidate()
 
 def toggle_inspect(*event):
     logger.debug("inspect tracker")
     if mode == 'main':
-        tracker = tracker_manager.get_tracker_from_row()
+        tracker = tracker_manager.get_tracker_from_row(display_area.document.cursor_position_row)
         if not tracker:
             return
         set_mode('inspect')
         display_message(f"{tracker.get_tracker_info()}", 'info')
         app.layout.focus(display_area)
-        app.invalidate()
+        scheduler.invalidate()
     elif mode == 'inspect':
         list_trackers()
 
@@ -1721,6 +1188,7 @@ def do_restore_defaults(*event):
 def save_to_clipboard(*event):
     # Access the content of the TextArea
     if display_area.text:
+        import pyperclip
         pyperclip.copy(display_area.text)
         display_info('display copied to system clipboard', 'info')
 
@@ -1741,9 +1209,11 @@ def cancel(event=None):
     close_dialog(event, False)
 
 def settings(event=None):
+    from ruamel.yaml import YAML
     if mode == 'main':
         message_control.text = "Editing settings. \nPress 'ctrl-s' to save changes or 'escape' to cancel"
         settings_map = tracker_manager.settings
+        yaml = YAML()
         yaml_string = StringIO()
         # Step 2: Dump the CommentedMap into the StringIO object
         yaml.dump(settings_map, yaml_string)
@@ -1757,12 +1227,9 @@ def settings(event=None):
         changed = False
         if yaml_string:
             yaml_input = StringIO(yaml_string)
-            updated_settings = yaml.load(yaml_input)
-            tracker_manager.settings.update(updated_settings)
-            transaction.commit()
-            tracker_manager.save_data()
+            updated_settings = YAML().load(yaml_input)
+            tracker_manager.update_settings(updated_settings)
             logger.debug(f"updated settings:\n{yaml_string}")
-            tracker_manager.refresh_info()
             changed = True
         close_dialog(changed=changed)
 
@@ -1795,7 +1262,7 @@ Enter the subject of the new tracker. Optionally append a comma and the datetime
                     msg.append(dt)
                 else:
                     # add an initial completion at dt
-                    tracker_manager.record_completion(doc_id, (dt, timedelta(0)))
+                    display_result(doc_id, tracker_manager.record_completion(doc_id, (dt, timedelta(0))), 'list')
                     changed = True
             if interval and not msg:
                 tdok, td = Tracker.parse_td(interval)
@@ -1803,7 +1270,7 @@ Enter the subject of the new tracker. Optionally append a comma and the datetime
                     msg.append(td)
                 else:
                     # add a fictitious completion at td before dt
-                    tracker_manager.record_completion(doc_id, (dt-td, timedelta(0)))
+                    display_result(doc_id, tracker_manager.record_completion(doc_id, (dt-td, timedelta(0))), 'list')
                     changed = True
             close_dialog(changed=changed)
     else:
@@ -1812,7 +1279,7 @@ Enter the subject of the new tracker. Optionally append a comma and the datetime
 
 def delete(event=None):
     if mode == 'main':
-        tracker = tracker_manager.get_tracker_from_row()
+        tracker = tracker_manager.get_tracker_from_row(display_area.document.cursor_position_row)
         if not tracker:
             return
         set_mode('delete')
@@ -1834,7 +1301,7 @@ def delete(event=None):
 
 def complete(event=None):
     if mode == 'main':
-        tracker = tracker_manager.get_tracker_from_row()
+        tracker = tracker_manager.get_tracker_from_row(display_area.document.cursor_position_row)
         if not tracker:
             return
         message_control.text = wrap(f'Adding a new completion datetime for [{tracker.doc_id}] {tracker.name}.\nPress "Ctrl-S" to save changes or "escape" to cancel.', 0)
@@ -1849,7 +1316,7 @@ def complete(event=None):
             logger.debug(f"got completion_str: '{completion_str}'; {completion = } for {selected_id}")
             if ok:
                 logger.debug(f"recording completion_dt: '{completion}' for {selected_id}")
-                tracker_manager.record_completion(tracker_manager.selected_id, completion)
+                display_result(tracker_manager.selected_id, tracker_manager.record_completion(tracker_manager.selected_id, completion), 'list')
                 changed = True
         close_dialog(changed=changed)
     else:
@@ -1858,7 +1325,7 @@ def complete(event=None):
 
 def rename(event=None):
     if mode == 'main':
-        tracker = tracker_manager.get_tracker_from_row()
+        tracker = tracker_manager.get_tracker_from_row(display_area.document.cursor_position_row)
         if not tracker:
             return
         set_mode('rename')
@@ -1871,7 +1338,7 @@ def rename(event=None):
         name = input_area.text.strip()
         if name:
             logger.debug(f"got name: '{name}' for {selected_id}")
-            tracker_manager.rename_tracker(tracker_manager.selected_id, name)
+            display_result(tracker_manager.selected_id, tracker_manager.rename_tracker(tracker_manager.selected_id, name))
             changed = True
         close_dialog(changed=changed)
     else:
@@ -1879,7 +1346,7 @@ def rename(event=None):
 
 def history(event=None):
     if mode == 'main':
-        tracker = tracker_manager.get_tracker_from_row()
+        tracker = tracker_manager.get_tracker_from_row(display_area.document.cursor_position_row)
         if not tracker:
             return
         set_mode('history')
@@ -1898,10 +1365,10 @@ def history(event=None):
                 logger.debug(f"back from parse_completions: {ok = }, {completions = }")
                 if ok:
                     logger.debug(f"recording '{completions}' for {selected_id}")
-                    tracker_manager.record_completions(
+                    display_result(tracker_manager.selected_id, tracker_manager.record_completions(
                         tracker_manager.selected_id,
                         completions
-                        )
+                        ))
                     close_dialog(changed=True)
                 else:
                     display_message(f"Invalid history: '{completions}'", 'error')
@@ -1909,12 +1376,79 @@ def history(event=None):
                 display_message(f"Invalid history: '{history}': {e}", 'error')
         else:
             logger.debug(f"removing all completions for {selected_id}")
-            tracker_manager.remove_completions(tracker_manager.selected_id)
+            display_result(tracker_manager.selected_id, tracker_manager.remove_completions(tracker_manager.selected_id))
             close_dialog(changed=True)
     else:
         return
 
 
+# the doc_ids found for the jump prompt and the position of the chosen one
+jump_results = []
+jump_choice = [0]
+
+def jump_message() -> str:
+    lines = [wrap("Type part of the name of a tracker on any page. Press 'enter' to jump to the chosen tracker, 'up' or 'down' to choose another or 'escape' to cancel.", 0)]
+    for i, doc_id in enumerate(jump_results):
+        marker = '>' if i == jump_choice[0] else ' '
+        lines.append(f" {marker} {tracker_manager.trackers[doc_id].name}")
+    return "\n".join(lines)
+
+def update_jump(buffer):
+    if mode != 'jump':
+        return
+    jump_results[:] = tracker_manager.search_trackers(buffer.text, len(tag_keys) // 2)
+    jump_choice[0] = 0
+    message_control.text = jump_message()
+
+def choose_result(event=None):
+    if not jump_results:
+        return
+    step = -1 if event and event.key_sequence[0].key == Keys.Up else 1
+    jump_choice[0] = (jump_choice[0] + step) % len(jump_results)
+    message_control.text = jump_message()
+
+def jump(event=None):
+    if mode == 'main':
+        jump_results.clear()
+        jump_choice[0] = 0
+        set_mode('jump')
+        input_area.text = ''
+        message_control.text = jump_message()
+        app.layout.focus(input_area)
+    elif mode == 'jump':
+        changed = False
+        if jump_results:
+            changed = tracker_manager.jump_to(jump_results[jump_choice[0]])
+        input_area.text = ''
+        close_dialog(changed=changed)
+    else:
+        return
+
+input_area.buffer.on_text_changed += update_jump
+
+def agenda(event=None):
+    if mode == 'main':
+        set_mode('agenda')
+        message_control.text = wrap("List the trackers that may be due within a period such as '3d' or '72h' from now, or from a datetime given first, e.g., 'mon 9a, 2d'. Press 'enter' to list them or 'escape' to cancel.", 0)
+        input_area.text = '7d'
+        app.layout.focus(input_area)
+    elif mode == 'agenda':
+        period = input_area.text.strip()
+        if ',' in period:
+            ok, result = Tracker.parse_completion(period)
+            start, within = result if ok else (None, None)
+        else:
+            start = datetime.now()
+            ok, within = Tracker.parse_td(period)
+            result = within
+        close_dialog()
+        if ok:
+            display_info(tracker_manager.format_agenda(start, start + within))
+        else:
+            display_message(f"Could not parse '{period}': {result}", 'error')
+    else:
+        return
+
 def move_to_page(event):
     page = event.key_sequence[0].key if event else None
     if not page and page in range(1, 10):
@@ -1955,6 +1489,8 @@ def set_mode_bindings():
             ('R', rename),
             ('H', history),
             ('D', delete),
+            ('J', jump),
+            ('A', agenda),
             ('space', toggle_inspect),
             ('left', previous_page),
             ('right', next_page),
@@ -1992,6 +1528,13 @@ def set_mode_bindings():
             'c-s': history,
             # '.': toggle_shortcuts,
             },
+        'jump': {
+            'enter': jump,
+            ('up', 'down'): choose_result,
+            },
+        'agenda': {
+            'enter': agenda,
+            },
         'settings': {
             'c-s': settings,
             # '.': toggle_shortcuts,
@@ -2041,7 +1584,7 @@ def set_bindings():
 
 
 
-    for current_mode in ['new', 'complete', 'rename', 'history', 'handle_sort', 'delete', 'settings']:
+    for current_mode in ['new', 'complete', 'rename', 'history', 'handle_sort', 'delete', 'settings', 'jump', 'agenda']:
         kb.add('escape', filter=Condition(lambda m=current_mode: is_active_mode(m)), eager=True)(cancel)
 
     # log_key_bindings(kb)
@@ -2079,7 +1622,7 @@ def set_mode(active_mode):
     float_visible[0] = False
     right_control.text = f"{mode} "
     dialog_visible[0] = (
-        mode in ['new', 'complete', 'rename', 'history', 'new', 'settings']
+        mode in ['new', 'complete', 'rename', 'history', 'new', 'settings', 'jump', 'agenda']
         )
     message_visible[0] = (
         mode in ['delete', 'delete', 'sort', 'handle_sort']
@@ -2116,7 +1659,7 @@ def set_mode(active_mode):
     logger.debug(f"dialog_visible: {dialog_visible}; message_visible: {message_visible}")
     # log_key_bindings(kb)
 
-@kb.add('/', filter=Condition(lambda: mode not in ['new', 'complete', 'rename', 'history', 'settings']))
+@kb.add('/', filter=Condition(lambda: mode not in ['new', 'complete', 'rename', 'history', 'settings', 'jump', 'agenda']))
 def search_forward(event):
     # Your custom logic to set search mode
     logger.debug("setting search mode")
@@ -2124,7 +1667,7 @@ def search_forward(event):
     start_search(display_area.control)
 
 # @kb.add('?')
-@kb.add('?', filter=Condition(lambda: mode not in ['new', 'complete', 'rename', 'history', 'settings']))
+@kb.add('?', filter=Condition(lambda: mode not in ['new', 'complete', 'rename', 'history', 'settings', 'jump', 'agenda']))
 def search_backward(event):
     # Your custom logic to set search mode
     logger.debug("setting search mode")
@@ -2150,7 +1693,18 @@ def display_message(message: str, document_type: str = 'list'):
     set_lexer(document_type)
     display_area.text = message
     # message_control.text = ""
-    app.invalidate()  # Refresh the UI
+    scheduler.invalidate()  # Refresh the UI
+
+def display_result(doc_id: int, result: tuple, error_type: str = 'error'):
+    """
+    Display the outcome (ok, msg) of a change to tracker doc_id: the info
+    of the tracker if it succeeded and otherwise msg.
+    """
+    ok, msg = result
+    if not ok:
+        display_message(msg, error_type)
+        return
+    display_message(f"{tracker_manager.trackers[doc_id].get_tracker_info()}", 'info')
 
 def display_notice(message: str, seconds: int = 2):
     original_message = display_area.text
@@ -2160,55 +1714,53 @@ def display_notice(message: str, seconds: int = 2):
     display_area.text = message
     # display_message(message, 'info')
     # app.invalidate()  # Refresh the UI
-    # logger.debug("starting thread")
-    threading.Thread(target=display_message_after_delay, args=(original_message, seconds,)).start()
-    # app.invalidate()
+    display_message_after_delay(original_message, seconds)
 
 def display_message_after_delay(message: str, seconds: int = 2):
-    # Sleep for 3 seconds without blocking the main thread
-    # logger.debug("about to sleep")
-    time.sleep(seconds)
-    # logger.debug("back from sleep")
-    display_area.text = message
-    return True
-    # app.invalidate()
+    # restore the message on the event loop without blocking it
+    def restore():
+        display_area.text = message
+        scheduler.invalidate()
+    scheduler.call_later(seconds, restore, name='notice')
 
 
 @kb.add('c-e')
 def add_example_trackers(*event):
     del_example_trackers()
+    from lorem.text import TextLorem
     lm = TextLorem(srange=(2,3))
     import random
     today = datetime.now().replace(microsecond=0,second=0,minute=0,hour=0)
-    for i in range(1,49): # create 48 trackers
-        name = f"{lm.sentence()[:-1]}"
-        doc_id = 1000 + i # make sure id's don't conflict with existing trackers
-        tracker = Tracker(name, doc_id)
-        # Add the tracker to the trackers dictionary
-        tracker_manager.trackers[doc_id] = tracker
-        # intervals
-        due = today - timedelta(days=random.choice([-5, 0, 5, 10]))
-        avg =timedelta(days=random.choice([7, 10, 14]), hours=random.choice([8, 12, 16, 20]))
-        mad = avg / random.choice([12, 8, 6])
-        if i < 41:
-            completions = [due-2*avg, due-avg-mad, due]
-        elif i < 44:
-            completions = [due-avg-mad, due]
-        elif i < 47:
-            completions = [due]
-        else:
-            completions = []
-
-        for comp in completions:
-            hours = random.choice([0, 0, 0, 0, 0, 0, 12, 24, 36])
-            sign = random.choice([-1, 1])
-            if hours != 0:
-                orig_comp = comp
-                comp = (comp + timedelta(hours=hours), -timedelta(hours=hours)) if sign == 1 else (comp - timedelta(hours=hours), timedelta(hours=hours))
-                logger.debug(f"comp: {comp}; orig_comp: {orig_comp}; sign: {sign}; hours: {hours}")
-            tracker_manager.trackers[doc_id].record_completion(comp)
-        tracker_manager.save_data()
-        tracker_manager.trackers[doc_id].compute_info()
+    with tracker_manager.batch():
+        for i in range(1,49): # create 48 trackers
+            name = f"{lm.sentence()[:-1]}"
+            doc_id = 1000 + i # make sure id's don't conflict with existing trackers
+            tracker = Tracker(name, doc_id)
+            # Add the tracker to the trackers dictionary
+            tracker_manager.trackers[doc_id] = tracker
+            # intervals
+            due = today - timedelta(days=random.choice([-5, 0, 5, 10]))
+            avg =timedelta(days=random.choice([7, 10, 14]), hours=random.choice([8, 12, 16, 20]))
+            mad = avg / random.choice([12, 8, 6])
+            if i < 41:
+                completions = [due-2*avg, due-avg-mad, due]
+            elif i < 44:
+                completions = [due-avg-mad, due]
+            elif i < 47:
+                completions = [due]
+            else:
+                completions = []
+
+            for comp in completions:
+                hours = random.choice([0, 0, 0, 0, 0, 0, 12, 24, 36])
+                sign = random.choice([-1, 1])
+                if hours != 0:
+                    orig_comp = comp
+                    comp = (comp + timedelta(hours=hours), -timedelta(hours=hours)) if sign == 1 else (comp - timedelta(hours=hours), timedelta(hours=hours))
+                    logger.debug(f"comp: {comp}; orig_comp: {orig_comp}; sign: {sign}; hours: {hours}")
+                tracker_manager.trackers[doc_id].record_completion(comp)
+            tracker_manager.trackers[doc_id].compute_info()
+            tracker_manager.update_tracker(doc_id, tracker)
     list_trackers()
 
 
@@ -2235,35 +1787,36 @@ other_replacements = {
         'zero completions': [0, 0]
         }
     doc_id = 1000
-    for name in names.keys(): # create 6 trackers
-        doc_id += 1
-        tracker = Tracker(name, doc_id)
-        # Add the tracker to the trackers dictionary
-        tracker_manager.trackers[doc_id] = tracker
-        days, completions = names[name]
-        # intervals
-        due = today - timedelta(days=days)
-        avg = timedelta(days=random.choice([6, 7]), hours=random.choice([8, 12, 16, 20]))
-        mad = timedelta(days = 1, hours = random.choice([4, 8, 12]))
-        if completions == 3:
-            completions = [due-2*avg, due-avg-mad, due]
-        elif completions == 2:
-            completions = [due-avg-mad, due]
-        elif completions == 1:
-            completions = [due]
-        else:
-            completions = []
-
-        for comp in completions:
-            hours = random.choice([0, 0, 0, 0, 0, 6, 9, 12])
-            sign = random.choice([-1, 1])
-            if hours != 0:
-                orig_comp = comp
-                comp = (comp + timedelta(hours=hours), -timedelta(hours=hours)) if sign == 1 else (comp - timedelta(hours=hours), timedelta(hours=hours))
-                logger.debug(f"comp: {comp}; orig_comp: {orig_comp}; sign: {sign}; hours: {hours}")
-            tracker_manager.trackers[doc_id].record_completion(comp)
-        tracker_manager.save_data()
-        tracker_manager.trackers[doc_id].compute_info()
+    with tracker_manager.batch():
+        for name in names.keys(): # create 6 trackers
+            doc_id += 1
+            tracker = Tracker(name, doc_id)
+            # Add the tracker to the trackers dictionary
+            tracker_manager.trackers[doc_id] = tracker
+            days, completions = names[name]
+            # intervals
+            due = today - timedelta(days=days)
+            avg = timedelta(days=random.choice([6, 7]), hours=random.choice([8, 12, 16, 20]))
+            mad = timedelta(days = 1, hours = random.choice([4, 8, 12]))
+            if completions == 3:
+                completions = [due-2*avg, due-avg-mad, due]
+            elif completions == 2:
+                completions = [due-avg-mad, due]
+            elif completions == 1:
+                completions = [due]
+            else:
+                completions = []
+
+            for comp in completions:
+                hours = random.choice([0, 0, 0, 0, 0, 6, 9, 12])
+                sign = random.choice([-1, 1])
+                if hours != 0:
+                    orig_comp = comp
+                    comp = (comp + timedelta(hours=hours), -timedelta(hours=hours)) if sign == 1 else (comp - timedelta(hours=hours), timedelta(hours=hours))
+                    logger.debug(f"comp: {comp}; orig_comp: {orig_comp}; sign: {sign}; hours: {hours}")
+                tracker_manager.trackers[doc_id].record_completion(comp)
+            tracker_manager.trackers[doc_id].compute_info()
+            tracker_manager.update_tracker(doc_id, tracker)
     list_trackers()
 
 
@@ -2274,8 +1827,9 @@ def del_example_trackers(*event):
         # if tracker.name.startswith('#'):
         if tracker.doc_id >= 1000:
             remove.append(id)
-    for id in remove:
-        tracker_manager.delete_tracker(id)
+    with tracker_manager.batch():
+        for id in remove:
+            tracker_manager.delete_tracker(id)
     list_trackers()
 
 
@@ -2296,16 +1850,57 @@ layout = Layout(root_container)
 
 app = Application(layout=layout, key_bindings=kb, full_screen=True, mouse_support=True, style=style)
 
+# the timed and background jobs, started on the application's event loop
+scheduler = Scheduler(invalidate=app.invalidate, logger=logger)
+
 app.layout.focus(root_container.body)
 
+def first_frame(app):
+    app.after_render -= first_frame
+    profile.mark('first frame')
+    if profile.enabled:
+        app.exit()
+
+app.after_render += first_frame
+
+profile.mark('build interface')
+
+
+def restore_command():
+    """
+    trf restore: rebuild the database from a backup and exit. This is
+    refused while a server is running for the database, see server.py,
+    since the server would go on using the file that was replaced.
+    """
+    from .server import is_running, socket_path, IDLE_SECONDS
+    if is_running(socket_path(trf_home)):
+        print(f"{db_path} is in use by a trf server. Close the other trf processes and restore once "
+              f"the server has exited, {IDLE_SECONDS // 60} minutes after the last one closes.")
+        return
+    startup()
+    # the database must be closed before its files are replaced
+    tracker_manager.close()
+    clear_screen()
+    ok, msg = restore_from_zip(trf_home, logger)
+    print(msg)
 
 def main():
+    profile.enabled = startup_profile
+    if restore:
+        restore_command()
+        return
+    startup()
     try:
         logger.info(f"Started TrackerManager with database file {db_path}")
         display_text = tracker_manager.list_trackers()
         display_message(display_text)
+        set_pages(tracker_manager.banner)
+        profile.mark('list trackers')
         start_periodic_checks()  # Start the periodic checks
-        app.run()
+        app.run(pre_run=scheduler.start)
+        scheduler.stop()
+        if profile.enabled:
+            print(profile.report())
     except Exception as e:
         logger.error(f"exception raised:\n{e}")
     else: